@@ -1,5 +1,6 @@
 # app/crud.py
 from __future__ import annotations
+from collections import Counter
 from typing import List, Optional
 from uuid import UUID
 from datetime import timedelta, datetime, timezone
@@ -7,10 +8,23 @@ import random
 import string
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, text
 
 from . import models, schemas
 from .security import get_password_hash
+from .services.contadores_publicacion import registrar_publicacion_contadores
+from .services.contadores_referidos import registrar_usuarios_nuevos_referidos
+from .services.eliminacion_viajes import condicion_no_eliminado_sql
+from .services.indice_empresas import indice_empresas
+from .services.normalizacion import normalizar_email
+from .services.resumen_dashboard import (
+    ajustar_resumen_diario,
+    contribucion_cargas,
+    fecha_local_sql,
+    registrar_cambio_resumen,
+    registrar_vencimientos_resumen,
+)
+from .services.rutas_carga import guardar_ruta_normalizada
 
 # =====================================================
 # Helpers internos
@@ -27,7 +41,7 @@ def _expire_if_needed(db: Session, items: List[models.Cargo]) -> None:
         return
 
     now = datetime.now(timezone.utc)
-    changed = False
+    vencidas: List[models.Cargo] = []
 
     for c in items:
         # si ya está inactivo, no hacemos nada
@@ -47,12 +61,39 @@ def _expire_if_needed(db: Session, items: List[models.Cargo]) -> None:
 
         expires_at = created_utc + duration
         if expires_at <= now:
-            # solo cambiamos 'activo'
-            c.activo = False
-            changed = True
+            vencidas.append(c)
 
-    if changed:
-        db.commit()
+    if not vencidas:
+        return
+
+    # Solo cambiamos 'activo'. La condicion activo IS TRUE hace que, si dos
+    # listados vencen la misma carga a la vez, solo uno la devuelva y ajuste
+    # el resumen.
+    filas = db.execute(
+        text(
+            f"""
+            UPDATE conexion_carga.carga c
+            SET activo = FALSE
+            WHERE c.id = ANY(CAST(:ids AS uuid[]))
+              AND c.activo IS TRUE
+            RETURNING
+                {fecha_local_sql('c.created_at')} AS dia_publicacion,
+                c.estado = 'publicado' AND {condicion_no_eliminado_sql(db, 'c')} AS cuenta_en_resumen
+            """
+        ),
+        {'ids': [str(c.id) for c in vencidas]},
+    ).mappings().all()
+
+    if not filas:
+        for c in vencidas:
+            db.expire(c, ['activo'])
+        return
+
+    registrar_vencimientos_resumen(
+        db,
+        [fila['dia_publicacion'] for fila in filas if fila['cuenta_en_resumen']],
+    )
+    db.commit()
 
 
 # =====================================================
@@ -75,9 +116,10 @@ def get_user(db: Session, user_id: UUID) -> Optional[models.User]:
 
 
 def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
+    # Usa ux_users_email_lower (scripts_sql/11_users_email_normalizado.sql).
     return (
         db.query(models.User)
-        .filter(func.lower(models.User.email) == func.lower(email.strip()))
+        .filter(func.lower(models.User.email) == normalizar_email(email))
         .first()
     )
 
@@ -89,7 +131,7 @@ def create_user(
     referred_by_id: Optional[UUID] = None,
 ) -> models.User:
     u = models.User(
-        email=user_in.email.strip(),
+        email=normalizar_email(user_in.email),
         first_name=user_in.first_name,
         last_name=user_in.last_name,
         phone=user_in.phone,
@@ -101,8 +143,11 @@ def create_user(
         referred_by_id=referred_by_id,
     )
     db.add(u)
+    db.flush()
+    registrar_usuarios_nuevos_referidos(db, [u.id])
     db.commit()
     db.refresh(u)
+    indice_empresas.registrar_usuario(u.id, u.company_name)
     return u
 
 
@@ -116,6 +161,8 @@ def update_user(
         val = getattr(user_in, attr, None)
         if val is not None:
             setattr(u, attr, val)
+    if user_in.email is not None:
+        u.email = normalizar_email(user_in.email)
     if user_in.is_company is False:
         u.company_name = None
     if user_in.password:
@@ -123,6 +170,7 @@ def update_user(
     db.add(u)
     db.commit()
     db.refresh(u)
+    indice_empresas.registrar_usuario(u.id, u.company_name)
     return u
 
 
@@ -191,6 +239,10 @@ def create_cargo(db: Session, data: schemas.CargoCreate, current_user: models.Us
     )
 
     db.add(obj)
+    db.flush()
+    guardar_ruta_normalizada(db, obj.id, obj.origen, obj.destino)
+    ajustar_resumen_diario(db, Counter(), contribucion_cargas(db, [obj.id]))
+    registrar_publicacion_contadores(db, obj.id)
     db.commit()
     db.refresh(obj)
     return obj
@@ -258,8 +310,9 @@ def expire_cargo(db: Session, cargo_id: UUID, owner_id: UUID) -> Optional[models
     c = get_cargo(db, cargo_id)
     if not c or c.comercial_id != owner_id:
         return None
-    c.activo = False
-    db.add(c)
+    with registrar_cambio_resumen(db, [c.id]):
+        c.activo = False
+        db.add(c)
     db.commit()
     db.refresh(c)
     return c
@@ -276,6 +329,8 @@ def reactivate_cargo(
     if not c or c.comercial_id != owner_id:
         return None
 
+    resumen_antes = contribucion_cargas(db, [c.id])
+
     # actualizar campos si vienen en el payload
     for attr in (
         "empresa_id",
@@ -304,6 +359,9 @@ def reactivate_cargo(
     c.updated_at = now
 
     db.add(c)
+    db.flush()
+    guardar_ruta_normalizada(db, c.id, c.origen, c.destino)
+    ajustar_resumen_diario(db, resumen_antes, contribucion_cargas(db, [c.id]))
     db.commit()
     db.refresh(c)
     return c
@@ -23,7 +23,22 @@ from app.routers import (
     profile_me,
     viajes_admin,
     usuarios_admin,
+    exportaciones_admin,
 )  # 👈 router admin agregado sin tocar contratos existentes
+from app.services.auditoria_puntos import sumidero_auditoria_puntos
+from app.services.contadores_publicacion import tarea_reconciliacion_contadores_publicacion
+from app.services.contadores_referidos import tarea_reconciliacion_contadores_referidos
+from app.services.eliminacion_viajes import tarea_consistencia_eliminados
+from app.services.eventos_dashboard import difusor_dashboard
+from app.services.exportaciones import detener_exportaciones, limpiar_exportaciones_vencidas
+from app.services.importacion_usuarios import detener_importaciones
+from app.services.libro_puntos import tarea_mantenimiento_libro_puntos
+from app.services.resumen_dashboard import tarea_reconciliacion_resumen_diario
+from app.services.tareas_periodicas import (
+    detener_tareas_periodicas,
+    iniciar_tareas_periodicas,
+    registrar_tarea,
+)
 
 # Inicializar tablas
 Base.metadata.create_all(bind=engine)
@@ -45,9 +60,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cache-Age"],
 )
 
 
+@app.on_event("startup")
+def iniciar_tareas_en_segundo_plano():
+    registrar_tarea("limpieza_exportaciones", 15 * 60, limpiar_exportaciones_vencidas)
+    registrar_tarea("consistencia_eliminados", 60 * 60, tarea_consistencia_eliminados)
+    registrar_tarea(
+        "reconciliacion_resumen_dashboard",
+        60 * 60,
+        tarea_reconciliacion_resumen_diario,
+        ejecutar_al_iniciar=True,
+    )
+    registrar_tarea(
+        "reconciliacion_contadores_publicacion",
+        60 * 60,
+        tarea_reconciliacion_contadores_publicacion,
+    )
+    registrar_tarea(
+        "reconciliacion_contadores_referidos",
+        60 * 60,
+        tarea_reconciliacion_contadores_referidos,
+    )
+    registrar_tarea(
+        "mantenimiento_libro_puntos",
+        6 * 60 * 60,
+        tarea_mantenimiento_libro_puntos,
+    )
+    iniciar_tareas_periodicas()
+
+
+@app.on_event("shutdown")
+def detener_tareas_en_segundo_plano():
+    detener_tareas_periodicas()
+    detener_exportaciones()
+    detener_importaciones()
+    dashboard_admin.detener_widgets_dashboard()
+    difusor_dashboard.detener()
+    sumidero_auditoria_puntos.detener()
+
+
 @app.get("/health")
 def health():
     return {"ok": True, "message": "API running"}
@@ -66,3 +120,4 @@ app.include_router(dashboard_admin.router)  # 👈 endpoints admin dashboard (ad
 app.include_router(puntos_admin.router)  # 👈 endpoints admin puntos por referidos (add-only)
 app.include_router(viajes_admin.router)  # 👈 endpoints admin viajes (add-only)
 app.include_router(usuarios_admin.router)  # 👈 endpoints admin usuarios (add-only)
+app.include_router(exportaciones_admin.router)  # 👈 exportaciones admin asincronas (add-only)
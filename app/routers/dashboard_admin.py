@@ -1,27 +1,63 @@
 from __future__ import annotations
 
+import asyncio
 import calendar
+import logging
 import os
-from datetime import datetime, timedelta, timezone
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta, timezone
 from decimal import Decimal
-from typing import Literal, Optional
+from typing import Callable, Literal, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func, text
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from jose import JWTError, jwt
+from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from app import models
-from app.db import get_db
+from app import crud, models
+from app.db import SessionLocal, get_db
 from app.schemas_dashboard import (
+    DeltasTarjetasDashboardOut,
+    ErrorWidgetDashboardOut,
+    GranularidadSerieDashboard,
+    InicioDashboardOut,
     PuntoSerieDashboardOut,
+    PuntoSerieRangoDashboardOut,
     ResumenDashboardOut,
+    SerieRangoDashboardOut,
+    SuscripcionDashboardEnVivoOut,
     TopHistoricoDashboardOut,
     TarjetasResumenOut,
     UltimoViajePublicadoOut,
 )
-from app.security import get_current_user
+from app.security import ALGORITHM, SECRET_KEY, get_current_user
+from app.services.cache_resultados import CacheResultados
+from app.services.contadores_publicacion import contadores_publicacion_disponibles
+from app.services.eliminacion_viajes import condicion_no_eliminado_sql
+from app.services.eventos_dashboard import difusor_dashboard
+from app.services.resumen_dashboard import (
+    DASHBOARD_ZONA_HORARIA,
+    ZONA_DASHBOARD,
+    fecha_local_sql,
+    inicio_dia_utc,
+    resumen_diario_disponible,
+)
+from app.services.rutas_carga import rutas_normalizadas_disponibles
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix='/api/admin/dashboard', tags=['Admin Dashboard'])
 
@@ -36,6 +72,38 @@ MESES_CORTOS = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', '
 EstadoDashboard = Literal['publicados', 'activos', 'inactivos', 'eliminados']
 PeriodoDashboard = Literal['mes', 'semana', 'anual']
 
+MAXIMO_DIAS_SERIE_RANGO = 3 * 366
+
+DASHBOARD_WIDGET_TIMEOUT_SEGUNDOS = float(os.getenv('DASHBOARD_WIDGET_TIMEOUT_SEGUNDOS', '5'))
+# Cada hilo usa a lo sumo una conexion: debe quedar por debajo del pool de
+# app.db (5 + 10 de overflow) para no dejar sin conexiones al resto de la API.
+_ejecutor_widgets = ThreadPoolExecutor(
+    max_workers=int(os.getenv('DASHBOARD_WIDGETS_MAX_HILOS', '4')),
+    thread_name_prefix='dashboard-widget',
+)
+
+DASHBOARD_WS_INTERVALO_SEGUNDOS = float(os.getenv('DASHBOARD_WS_INTERVALO_SEGUNDOS', '1'))
+# Codigo de cierre WebSocket para politicas incumplidas (RFC 6455).
+WS_CIERRE_POLITICA = 1008
+
+ENCABEZADO_EDAD_CACHE = 'X-Cache-Age'
+
+
+def _limitar_tiempo_sesion(db: Session) -> None:
+    # Acota el trabajo en BD aunque el hilo que espera el resultado ya no este.
+    db.execute(
+        text("SELECT set_config('statement_timeout', :ms, true)"),
+        {'ms': str(int(DASHBOARD_WIDGET_TIMEOUT_SEGUNDOS * 1000))},
+    )
+
+
+_cache_dashboard = CacheResultados(
+    'dashboard',
+    ttl_segundos=int(os.getenv('DASHBOARD_CACHE_TTL_SEGUNDOS', '60')),
+    stale_segundos=int(os.getenv('DASHBOARD_CACHE_STALE_SEGUNDOS', '300')),
+    configurar_sesion=_limitar_tiempo_sesion,
+)
+
 
 def _normalizar_email(email: str) -> str:
     return (email or '').strip().lower()
@@ -131,254 +199,182 @@ def _asegurar_usuario_admin(
     return current
 
 
-def _normalizar_bucket_fecha(bucket: datetime) -> datetime:
-    if bucket.tzinfo is None:
-        return bucket.replace(tzinfo=timezone.utc)
-    return bucket.astimezone(timezone.utc)
-
-
 def _obtener_rango_periodo(
     periodo: PeriodoDashboard,
-    ahora_utc: datetime,
-) -> tuple[datetime, datetime]:
+    hoy: date,
+) -> tuple[date, date]:
     if periodo == 'semana':
-        inicio = (ahora_utc - timedelta(days=ahora_utc.weekday())).replace(
-            hour=0,
-            minute=0,
-            second=0,
-            microsecond=0,
-        )
-        fin = inicio + timedelta(days=7)
-        return inicio, fin
+        inicio = hoy - timedelta(days=hoy.weekday())
+        return inicio, inicio + timedelta(days=7)
 
     if periodo == 'mes':
-        inicio = ahora_utc.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if inicio.month == 12:
-            fin = inicio.replace(year=inicio.year + 1, month=1)
-        else:
-            fin = inicio.replace(month=inicio.month + 1)
-        return inicio, fin
-
-    inicio = ahora_utc.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    fin = inicio.replace(year=inicio.year + 1)
-    return inicio, fin
-
-
-def _filtro_no_eliminado() -> object:
-    return text(
-        """
-        NOT EXISTS (
-            SELECT 1
-            FROM conexion_carga.carga_eliminada ce
-            WHERE ce.carga_id = conexion_carga.carga.id
-        )
-        """
-    )
+        inicio = hoy.replace(day=1)
+        return inicio, _sumar_meses(inicio, 1)
 
+    inicio = hoy.replace(month=1, day=1)
+    return inicio, inicio.replace(year=inicio.year + 1)
 
-def _filtros_carga_dashboard(
-    estado: EstadoDashboard,
-    inicio: datetime,
-    fin: datetime,
-) -> list:
-    filtros = [
-        models.Cargo.estado == 'publicado',
-        models.Cargo.created_at >= inicio,
-        models.Cargo.created_at < fin,
-        _filtro_no_eliminado(),
-    ]
 
-    if estado == 'activos':
-        filtros.append(models.Cargo.activo.is_(True))
-    elif estado == 'inactivos':
-        filtros.append(models.Cargo.activo.is_(False))
+def _sumar_meses(fecha: date, meses: int) -> date:
+    indice = fecha.year * 12 + (fecha.month - 1) + meses
+    return date(indice // 12, indice % 12 + 1, 1)
 
-    return filtros
 
+def _inicio_bucket(dia: date, granularidad: GranularidadSerieDashboard) -> date:
+    if granularidad == 'mes':
+        return dia.replace(day=1)
+    if granularidad == 'semana':
+        return dia - timedelta(days=dia.weekday())
+    return dia
 
-def _contar_carga_dashboard(
-    db: Session,
-    inicio: datetime,
-    fin: datetime,
-    estado: EstadoDashboard,
-) -> int:
-    filtros = _filtros_carga_dashboard(estado=estado, inicio=inicio, fin=fin)
-    total = db.query(func.count(models.Cargo.id)).filter(*filtros).scalar() or 0
-    return int(total)
 
+def _siguiente_bucket(bucket: date, granularidad: GranularidadSerieDashboard) -> date:
+    if granularidad == 'mes':
+        return _sumar_meses(bucket, 1)
+    if granularidad == 'semana':
+        return bucket + timedelta(days=7)
+    return bucket + timedelta(days=1)
 
-def _contar_eliminados_dashboard(
-    db: Session,
-    inicio: datetime,
-    fin: datetime,
-) -> int:
-    total = db.execute(
-        text(
-            """
-            SELECT COUNT(DISTINCT ce.carga_id) AS total
-            FROM conexion_carga.carga_eliminada ce
-            WHERE ce.eliminado_en >= :inicio
-              AND ce.eliminado_en < :fin
-            """
-        ),
-        {'inicio': inicio, 'fin': fin},
-    ).scalar()
 
-    return int(total or 0)
+def _filtro_no_eliminado(db: Session) -> object:
+    return text(condicion_no_eliminado_sql(db))
 
 
-def _obtener_mapa_serie_carga(
-    db: Session,
-    inicio: datetime,
-    fin: datetime,
-    estado: EstadoDashboard,
-    granularidad: Literal['dia', 'mes'],
-) -> dict[datetime, int]:
-    bucket_expr = (
-        func.date_trunc('month', models.Cargo.created_at)
-        if granularidad == 'mes'
-        else func.date_trunc('day', models.Cargo.created_at)
-    )
-    filtros = _filtros_carga_dashboard(estado=estado, inicio=inicio, fin=fin)
+# Conteos por inicio de bucket (fecha local de DASHBOARD_ZONA_HORARIA).
+ConteosDashboard = dict[date, dict[str, int]]
+COLUMNAS_CONTEO = ('activos', 'inactivos', 'eliminados')
+UNIDADES_SQL_GRANULARIDAD = {'dia': 'day', 'semana': 'week', 'mes': 'month'}
 
-    filas = (
-        db.query(bucket_expr.label('bucket'), func.count(models.Cargo.id).label('total'))
-        .filter(*filtros)
-        .group_by(bucket_expr)
-        .all()
-    )
 
-    mapa: dict[datetime, int] = {}
-    for fila in filas:
-        bucket = _normalizar_bucket_fecha(fila.bucket)
-        mapa[bucket] = int(fila.total or 0)
+def _acumular_conteo(conteos: ConteosDashboard, bucket: date, fila) -> None:
+    conteo = conteos.setdefault(bucket, dict.fromkeys(COLUMNAS_CONTEO, 0))
+    for columna in COLUMNAS_CONTEO:
+        conteo[columna] += int(fila[columna] or 0)
 
-    return mapa
 
+def _valor_conteo(conteo: dict[str, int], estado: EstadoDashboard) -> int:
+    if estado == 'activos':
+        return conteo['activos']
+    if estado == 'inactivos':
+        return conteo['inactivos']
+    if estado == 'eliminados':
+        return conteo['eliminados']
+    return conteo['activos'] + conteo['inactivos'] + conteo['eliminados']
 
-def _obtener_mapa_serie_eliminados(
+
+def _obtener_conteos_resumen_diario(
     db: Session,
-    inicio: datetime,
-    fin: datetime,
-    granularidad: Literal['dia', 'mes'],
-) -> dict[datetime, int]:
-    if granularidad == 'mes':
-        consulta = text(
-            """
-            SELECT
-                date_trunc('month', ce.eliminado_en) AS bucket,
-                COUNT(DISTINCT ce.carga_id) AS total
-            FROM conexion_carga.carga_eliminada ce
-            WHERE ce.eliminado_en >= :inicio
-              AND ce.eliminado_en < :fin
-            GROUP BY 1
-            """
-        )
-    else:
-        consulta = text(
-            """
-            SELECT
-                date_trunc('day', ce.eliminado_en) AS bucket,
-                COUNT(DISTINCT ce.carga_id) AS total
-            FROM conexion_carga.carga_eliminada ce
-            WHERE ce.eliminado_en >= :inicio
-              AND ce.eliminado_en < :fin
-            GROUP BY 1
-            """
-        )
+    desde: date,
+    hasta: date,
+    granularidad: GranularidadSerieDashboard,
+) -> Optional[ConteosDashboard]:
+    if not resumen_diario_disponible(db):
+        return None
 
     filas = db.execute(
-        consulta,
-        {'inicio': inicio, 'fin': fin},
+        text(
+            """
+            SELECT dia, activos, inactivos, eliminados
+            FROM conexion_carga.dashboard_resumen_diario
+            WHERE dia >= :desde
+              AND dia < :hasta
+            """
+        ),
+        {'desde': desde, 'hasta': hasta},
     ).mappings().all()
 
-    mapa: dict[datetime, int] = {}
+    conteos: ConteosDashboard = {}
     for fila in filas:
-        bucket = fila['bucket']
-        if not bucket:
-            continue
-        bucket_normalizado = _normalizar_bucket_fecha(bucket)
-        mapa[bucket_normalizado] = int(fila['total'] or 0)
+        _acumular_conteo(conteos, _inicio_bucket(fila['dia'], granularidad), fila)
 
-    return mapa
+    return conteos
 
 
-def _sumar_mapas_series(*mapas: dict[datetime, int]) -> dict[datetime, int]:
-    acumulado: dict[datetime, int] = {}
-    for mapa in mapas:
-        for bucket, valor in mapa.items():
-            acumulado[bucket] = int(acumulado.get(bucket, 0)) + int(valor or 0)
-    return acumulado
+def _obtener_conteos_tablas_base(
+    db: Session,
+    desde: date,
+    hasta: date,
+    granularidad: GranularidadSerieDashboard,
+) -> ConteosDashboard:
+    unidad = UNIDADES_SQL_GRANULARIDAD[granularidad]
 
+    # Una sola sentencia: un recorrido de carga y uno de carga_eliminada.
+    filas = db.execute(
+        text(
+            f"""
+            WITH publicadas AS (
+                SELECT
+                    {fecha_local_sql('c.created_at', unidad)} AS bucket,
+                    COUNT(*) FILTER (WHERE c.activo IS TRUE) AS activos,
+                    COUNT(*) FILTER (WHERE c.activo IS FALSE) AS inactivos
+                FROM conexion_carga.carga c
+                WHERE c.estado = 'publicado'
+                  AND c.created_at >= :inicio
+                  AND c.created_at < :fin
+                  AND {condicion_no_eliminado_sql(db, 'c')}
+                GROUP BY 1
+            ),
+            eliminadas AS (
+                SELECT
+                    {fecha_local_sql('ce.eliminado_en', unidad)} AS bucket,
+                    COUNT(DISTINCT ce.carga_id) AS eliminados
+                FROM conexion_carga.carga_eliminada ce
+                WHERE ce.eliminado_en >= :inicio
+                  AND ce.eliminado_en < :fin
+                GROUP BY 1
+            )
+            SELECT
+                COALESCE(p.bucket, e.bucket) AS bucket,
+                COALESCE(p.activos, 0) AS activos,
+                COALESCE(p.inactivos, 0) AS inactivos,
+                COALESCE(e.eliminados, 0) AS eliminados
+            FROM publicadas p
+            FULL JOIN eliminadas e
+              ON e.bucket = p.bucket
+            """
+        ),
+        {
+            'inicio': inicio_dia_utc(desde),
+            'fin': inicio_dia_utc(hasta),
+        },
+    ).mappings().all()
 
-def _obtener_mapa_serie_dashboard(
-    db: Session,
-    inicio: datetime,
-    fin: datetime,
-    estado: EstadoDashboard,
-    granularidad: Literal['dia', 'mes'],
-) -> dict[datetime, int]:
-    if estado == 'activos':
-        return _obtener_mapa_serie_carga(
-            db=db,
-            inicio=inicio,
-            fin=fin,
-            estado='activos',
-            granularidad=granularidad,
-        )
+    conteos: ConteosDashboard = {}
+    for fila in filas:
+        if not fila['bucket']:
+            continue
+        _acumular_conteo(conteos, fila['bucket'], fila)
 
-    if estado == 'inactivos':
-        return _obtener_mapa_serie_carga(
-            db=db,
-            inicio=inicio,
-            fin=fin,
-            estado='inactivos',
-            granularidad=granularidad,
-        )
+    return conteos
 
-    if estado == 'eliminados':
-        return _obtener_mapa_serie_eliminados(
-            db=db,
-            inicio=inicio,
-            fin=fin,
-            granularidad=granularidad,
-        )
 
-    mapa_publicados_carga = _obtener_mapa_serie_carga(
+def _obtener_conteos_dashboard(
+    db: Session,
+    desde: date,
+    hasta: date,
+    granularidad: GranularidadSerieDashboard,
+) -> ConteosDashboard:
+    conteos = _obtener_conteos_resumen_diario(
         db=db,
-        inicio=inicio,
-        fin=fin,
-        estado='publicados',
+        desde=desde,
+        hasta=hasta,
         granularidad=granularidad,
     )
-    mapa_eliminados = _obtener_mapa_serie_eliminados(
+    if conteos is not None:
+        return conteos
+
+    return _obtener_conteos_tablas_base(
         db=db,
-        inicio=inicio,
-        fin=fin,
+        desde=desde,
+        hasta=hasta,
         granularidad=granularidad,
     )
 
-    return _sumar_mapas_series(mapa_publicados_carga, mapa_eliminados)
-
 
-def _obtener_tarjetas_resumen(
-    db: Session,
-    inicio: datetime,
-    fin: datetime,
-) -> TarjetasResumenOut:
-    viajes_activos = _contar_carga_dashboard(
-        db=db,
-        inicio=inicio,
-        fin=fin,
-        estado='activos',
-    )
-    viajes_inactivos = _contar_carga_dashboard(
-        db=db,
-        inicio=inicio,
-        fin=fin,
-        estado='inactivos',
-    )
-    viajes_eliminados = _contar_eliminados_dashboard(db=db, inicio=inicio, fin=fin)
+def _obtener_tarjetas_resumen(conteos: ConteosDashboard) -> TarjetasResumenOut:
+    viajes_activos = sum(conteo['activos'] for conteo in conteos.values())
+    viajes_inactivos = sum(conteo['inactivos'] for conteo in conteos.values())
+    viajes_eliminados = sum(conteo['eliminados'] for conteo in conteos.values())
     viajes_publicados = viajes_activos + viajes_inactivos + viajes_eliminados
 
     return TarjetasResumenOut(
@@ -394,30 +390,16 @@ def _serie_ceros(labels: list[str]) -> list[PuntoSerieDashboardOut]:
 
 
 def _obtener_serie_semana(
-    db: Session,
-    ahora_utc: datetime,
-    estado: EstadoDashboard,
+    mapa_buckets: dict[date, int],
+    inicio: date,
 ) -> list[PuntoSerieDashboardOut]:
-    inicio, fin = _obtener_rango_periodo('semana', ahora_utc)
-    mapa_buckets = _obtener_mapa_serie_dashboard(
-        db=db,
-        inicio=inicio,
-        fin=fin,
-        estado=estado,
-        granularidad='dia',
-    )
-
-    mapa: dict[datetime.date, int] = {}
-    for bucket, total in mapa_buckets.items():
-        mapa[bucket.date()] = int(total or 0)
-
     serie: list[PuntoSerieDashboardOut] = []
     for i in range(7):
         fecha = inicio + timedelta(days=i)
         serie.append(
             PuntoSerieDashboardOut(
                 label=DIAS_SEMANA_CORTOS[i],
-                value=mapa.get(fecha.date(), 0),
+                value=int(mapa_buckets.get(fecha, 0)),
             )
         )
 
@@ -425,21 +407,11 @@ def _obtener_serie_semana(
 
 
 def _obtener_serie_mes(
-    db: Session,
-    ahora_utc: datetime,
-    estado: EstadoDashboard,
+    mapa_buckets: dict[date, int],
+    inicio: date,
 ) -> list[PuntoSerieDashboardOut]:
-    inicio, fin = _obtener_rango_periodo('mes', ahora_utc)
     dias_mes = calendar.monthrange(inicio.year, inicio.month)[1]
 
-    mapa_buckets = _obtener_mapa_serie_dashboard(
-        db=db,
-        inicio=inicio,
-        fin=fin,
-        estado=estado,
-        granularidad='dia',
-    )
-
     mapa: dict[int, int] = {}
     for bucket, total in mapa_buckets.items():
         mapa[bucket.day] = int(total or 0)
@@ -457,19 +429,8 @@ def _obtener_serie_mes(
 
 
 def _obtener_serie_anual(
-    db: Session,
-    ahora_utc: datetime,
-    estado: EstadoDashboard,
+    mapa_buckets: dict[date, int],
 ) -> list[PuntoSerieDashboardOut]:
-    inicio, fin = _obtener_rango_periodo('anual', ahora_utc)
-    mapa_buckets = _obtener_mapa_serie_dashboard(
-        db=db,
-        inicio=inicio,
-        fin=fin,
-        estado=estado,
-        granularidad='mes',
-    )
-
     mapa: dict[int, int] = {}
     for bucket, total in mapa_buckets.items():
         mapa[bucket.month] = int(total or 0)
@@ -486,6 +447,33 @@ def _obtener_serie_anual(
     return serie
 
 
+def _label_bucket(bucket: date, granularidad: GranularidadSerieDashboard) -> str:
+    if granularidad == 'mes':
+        return f'{MESES_CORTOS[bucket.month - 1]} {bucket.year}'
+    return bucket.strftime('%d/%m/%Y')
+
+
+def _obtener_serie_rango(
+    mapa_buckets: dict[date, int],
+    desde: date,
+    hasta: date,
+    granularidad: GranularidadSerieDashboard,
+) -> list[PuntoSerieRangoDashboardOut]:
+    serie: list[PuntoSerieRangoDashboardOut] = []
+    bucket = _inicio_bucket(desde, granularidad)
+    while bucket < hasta:
+        serie.append(
+            PuntoSerieRangoDashboardOut(
+                inicio=bucket,
+                label=_label_bucket(bucket, granularidad),
+                value=int(mapa_buckets.get(bucket, 0)),
+            )
+        )
+        bucket = _siguiente_bucket(bucket, granularidad)
+
+    return serie
+
+
 def _obtener_valor_entero(valor: object) -> int:
     if valor is None:
         return 0
@@ -513,8 +501,26 @@ def _obtener_top_usuarios_publicadores(
     db: Session,
     limit: int,
 ) -> list[TopHistoricoDashboardOut]:
-    filas = db.execute(
-        text(
+    if contadores_publicacion_disponibles(db):
+        consulta = text(
+            """
+            SELECT
+                COALESCE(
+                    NULLIF(CONCAT_WS(' ', u.first_name, u.last_name), ''),
+                    u.email
+                ) AS label,
+                COALESCE(NULLIF(TRIM(u.company_name), ''), u.email) AS secondary_label,
+                p.total
+            FROM conexion_carga.dashboard_publicaciones_usuario p
+            JOIN conexion_carga.users u
+              ON u.id = p.usuario_id
+            WHERE p.total > 0
+            ORDER BY p.total DESC, p.primera_publicacion ASC
+            LIMIT :limit
+            """
+        )
+    else:
+        consulta = text(
             """
             SELECT
                 COALESCE(
@@ -531,9 +537,9 @@ def _obtener_top_usuarios_publicadores(
             ORDER BY COUNT(c.id) DESC, MIN(c.created_at) ASC
             LIMIT :limit
             """
-        ),
-        {'limit': limit},
-    ).mappings().all()
+        )
+
+    filas = db.execute(consulta, {'limit': limit}).mappings().all()
 
     return [
         TopHistoricoDashboardOut(
@@ -545,12 +551,28 @@ def _obtener_top_usuarios_publicadores(
     ]
 
 
+
 def _obtener_top_rutas_publicadas(
     db: Session,
     limit: int,
 ) -> list[TopHistoricoDashboardOut]:
-    filas = db.execute(
-        text(
+    if rutas_normalizadas_disponibles(db):
+        consulta = text(
+            """
+            SELECT
+                INITCAP(LOWER(c.origen_norm)) || ' -> ' || INITCAP(LOWER(c.destino_norm)) AS label,
+                COUNT(*) AS total
+            FROM conexion_carga.carga c
+            WHERE c.estado = 'publicado'
+              AND c.origen_norm <> ''
+              AND c.destino_norm <> ''
+            GROUP BY c.origen_norm, c.destino_norm
+            ORDER BY COUNT(*) DESC, MIN(c.created_at) ASC
+            LIMIT :limit
+            """
+        )
+    else:
+        consulta = text(
             """
             WITH rutas_normalizadas AS (
                 SELECT
@@ -598,9 +620,9 @@ def _obtener_top_rutas_publicadas(
             ORDER BY COUNT(*) DESC, MIN(created_at) ASC
             LIMIT :limit
             """
-        ),
-        {'limit': limit},
-    ).mappings().all()
+        )
+
+    filas = db.execute(consulta, {'limit': limit}).mappings().all()
 
     return [
         TopHistoricoDashboardOut(
@@ -616,8 +638,20 @@ def _obtener_top_empresas_publicadoras(
     db: Session,
     limit: int,
 ) -> list[TopHistoricoDashboardOut]:
-    filas = db.execute(
-        text(
+    if contadores_publicacion_disponibles(db):
+        consulta = text(
+            """
+            SELECT
+                p.empresa AS label,
+                p.total
+            FROM conexion_carga.dashboard_publicaciones_empresa p
+            WHERE p.total > 0
+            ORDER BY p.total DESC, p.primera_publicacion ASC
+            LIMIT :limit
+            """
+        )
+    else:
+        consulta = text(
             """
             SELECT
                 COALESCE(
@@ -640,9 +674,9 @@ def _obtener_top_empresas_publicadoras(
             ORDER BY COUNT(c.id) DESC, MIN(c.created_at) ASC
             LIMIT :limit
             """
-        ),
-        {'limit': limit},
-    ).mappings().all()
+        )
+
+    filas = db.execute(consulta, {'limit': limit}).mappings().all()
 
     return [
         TopHistoricoDashboardOut(
@@ -654,27 +688,32 @@ def _obtener_top_empresas_publicadoras(
     ]
 
 
-@router.get('/resumen', response_model=ResumenDashboardOut)
-def obtener_resumen_dashboard(
-    periodo: PeriodoDashboard = Query(default='mes', pattern='^(mes|semana|anual)$'),
-    estado: EstadoDashboard = Query(
-        default='publicados',
-        pattern='^(publicados|activos|inactivos|eliminados)$',
-    ),
-    db: Session = Depends(get_db),
-    _: models.User = Depends(_asegurar_usuario_admin),
-):
-    ahora_utc = datetime.now(timezone.utc)
-    inicio, fin = _obtener_rango_periodo(periodo, ahora_utc)
+def _calcular_resumen_dashboard(
+    db: Session,
+    periodo: PeriodoDashboard,
+    estado: EstadoDashboard,
+    inicio: date,
+    fin: date,
+) -> ResumenDashboardOut:
+    conteos = _obtener_conteos_dashboard(
+        db=db,
+        desde=inicio,
+        hasta=fin,
+        granularidad='mes' if periodo == 'anual' else 'dia',
+    )
+    mapa_buckets = {
+        bucket: _valor_conteo(conteo, estado)
+        for bucket, conteo in conteos.items()
+    }
 
     if periodo == 'semana':
-        serie = _obtener_serie_semana(db, ahora_utc, estado)
+        serie = _obtener_serie_semana(mapa_buckets, inicio)
     elif periodo == 'anual':
-        serie = _obtener_serie_anual(db, ahora_utc, estado)
+        serie = _obtener_serie_anual(mapa_buckets)
     else:
-        serie = _obtener_serie_mes(db, ahora_utc, estado)
+        serie = _obtener_serie_mes(mapa_buckets, inicio)
 
-    tarjetas = _obtener_tarjetas_resumen(db, inicio=inicio, fin=fin)
+    tarjetas = _obtener_tarjetas_resumen(conteos)
 
     return ResumenDashboardOut(
         periodo=periodo,
@@ -684,12 +723,39 @@ def obtener_resumen_dashboard(
     )
 
 
-@router.get('/ultimos-viajes', response_model=list[UltimoViajePublicadoOut])
-def obtener_ultimos_viajes_publicados(
-    limit: int = Query(default=8, ge=1, le=20),
-    db: Session = Depends(get_db),
-    _: models.User = Depends(_asegurar_usuario_admin),
-):
+def _calcular_serie_rango_dashboard(
+    db: Session,
+    desde: date,
+    hasta: date,
+    granularidad: GranularidadSerieDashboard,
+    estado: EstadoDashboard,
+) -> SerieRangoDashboardOut:
+    conteos = _obtener_conteos_dashboard(
+        db=db,
+        desde=desde,
+        hasta=hasta,
+        granularidad=granularidad,
+    )
+    mapa_buckets = {
+        bucket: _valor_conteo(conteo, estado)
+        for bucket, conteo in conteos.items()
+    }
+
+    return SerieRangoDashboardOut(
+        desde=desde,
+        hasta=hasta,
+        granularidad=granularidad,
+        estado=estado,
+        zona_horaria=DASHBOARD_ZONA_HORARIA,
+        tarjetas=_obtener_tarjetas_resumen(conteos),
+        serie=_obtener_serie_rango(mapa_buckets, desde, hasta, granularidad),
+    )
+
+
+def _obtener_ultimos_viajes_publicados(
+    db: Session,
+    limit: int,
+) -> list[UltimoViajePublicadoOut]:
     cargas = (
         db.query(models.Cargo)
         .filter(models.Cargo.estado == 'publicado')
@@ -718,16 +784,114 @@ def obtener_ultimos_viajes_publicados(
     return resultados
 
 
+def _responder_desde_cache(
+    response: Response,
+    db: Session,
+    clave: tuple,
+    calcular: Callable[[Session], object],
+):
+    valor, edad = _cache_dashboard.obtener(db, clave, calcular)
+    response.headers[ENCABEZADO_EDAD_CACHE] = str(int(edad))
+    return valor
+
+
+@router.get('/resumen', response_model=ResumenDashboardOut)
+def obtener_resumen_dashboard(
+    response: Response,
+    periodo: PeriodoDashboard = Query(default='mes', pattern='^(mes|semana|anual)$'),
+    estado: EstadoDashboard = Query(
+        default='publicados',
+        pattern='^(publicados|activos|inactivos|eliminados)$',
+    ),
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    hoy = datetime.now(ZONA_DASHBOARD).date()
+    inicio, fin = _obtener_rango_periodo(periodo, hoy)
+
+    # El inicio del periodo forma parte de la clave: al cambiar de semana/mes/anio
+    # no se sirve el resumen del periodo anterior.
+    return _responder_desde_cache(
+        response,
+        db,
+        ('resumen', periodo, estado, inicio.isoformat()),
+        lambda sesion: _calcular_resumen_dashboard(sesion, periodo, estado, inicio, fin),
+    )
+
+
+@router.get('/serie', response_model=SerieRangoDashboardOut)
+def obtener_serie_rango_dashboard(
+    response: Response,
+    fecha_desde: date = Query(...),
+    fecha_hasta: date = Query(..., description='Fecha final exclusiva.'),
+    granularidad: GranularidadSerieDashboard = Query(
+        default='dia',
+        pattern='^(dia|semana|mes)$',
+    ),
+    estado: EstadoDashboard = Query(
+        default='publicados',
+        pattern='^(publicados|activos|inactivos|eliminados)$',
+    ),
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    if fecha_hasta <= fecha_desde:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail='La fecha final debe ser posterior a la fecha inicial.',
+        )
+
+    if (fecha_hasta - fecha_desde).days > MAXIMO_DIAS_SERIE_RANGO:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f'El rango maximo permitido es de {MAXIMO_DIAS_SERIE_RANGO} dias.',
+        )
+
+    return _responder_desde_cache(
+        response,
+        db,
+        ('serie', fecha_desde.isoformat(), fecha_hasta.isoformat(), granularidad, estado),
+        lambda sesion: _calcular_serie_rango_dashboard(
+            sesion,
+            fecha_desde,
+            fecha_hasta,
+            granularidad,
+            estado,
+        ),
+    )
+
+
+@router.get('/ultimos-viajes', response_model=list[UltimoViajePublicadoOut])
+def obtener_ultimos_viajes_publicados(
+    response: Response,
+    limit: int = Query(default=8, ge=1, le=20),
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    return _responder_desde_cache(
+        response,
+        db,
+        ('ultimos-viajes', limit),
+        lambda sesion: _obtener_ultimos_viajes_publicados(db=sesion, limit=limit),
+    )
+
+
 @router.get(
     '/top-usuarios-publicadores',
     response_model=list[TopHistoricoDashboardOut],
 )
 def obtener_top_usuarios_publicadores(
+    response: Response,
     limit: int = Query(default=10, ge=1, le=20),
     db: Session = Depends(get_db),
     _: models.User = Depends(_asegurar_usuario_admin),
 ):
-    return _obtener_top_usuarios_publicadores(db=db, limit=limit)
+    return _responder_desde_cache(
+        response,
+        db,
+        ('top-usuarios-publicadores', limit),
+        lambda sesion: _obtener_top_usuarios_publicadores(db=sesion, limit=limit),
+    )
 
 
 @router.get(
@@ -735,11 +899,17 @@ def obtener_top_usuarios_publicadores(
     response_model=list[TopHistoricoDashboardOut],
 )
 def obtener_top_rutas_publicadas(
+    response: Response,
     limit: int = Query(default=10, ge=1, le=20),
     db: Session = Depends(get_db),
     _: models.User = Depends(_asegurar_usuario_admin),
 ):
-    return _obtener_top_rutas_publicadas(db=db, limit=limit)
+    return _responder_desde_cache(
+        response,
+        db,
+        ('top-rutas-publicadas', limit),
+        lambda sesion: _obtener_top_rutas_publicadas(db=sesion, limit=limit),
+    )
 
 
 @router.get(
@@ -747,8 +917,241 @@ def obtener_top_rutas_publicadas(
     response_model=list[TopHistoricoDashboardOut],
 )
 def obtener_top_empresas_publicadoras(
+    response: Response,
     limit: int = Query(default=10, ge=1, le=20),
     db: Session = Depends(get_db),
     _: models.User = Depends(_asegurar_usuario_admin),
 ):
-    return _obtener_top_empresas_publicadoras(db=db, limit=limit)
+    return _responder_desde_cache(
+        response,
+        db,
+        ('top-empresas-publicadoras', limit),
+        lambda sesion: _obtener_top_empresas_publicadoras(db=sesion, limit=limit),
+    )
+
+
+def _ejecutar_widget(
+    clave: tuple,
+    calcular: Callable[[Session], object],
+    inicios: dict[str, float],
+    nombre: str,
+):
+    inicios[nombre] = time.monotonic()
+    # Sin sesion propia: la cache abre una (con statement_timeout) solo si el
+    # widget no esta cacheado, y no espera a otra peticion mas que el timeout.
+    valor, _ = _cache_dashboard.obtener(
+        None,
+        clave,
+        calcular,
+        espera_maxima_segundos=DASHBOARD_WIDGET_TIMEOUT_SEGUNDOS,
+    )
+    return valor
+
+
+def _esperar_widgets(futuros: dict[Future, str], inicios: dict[str, float]) -> set[Future]:
+    """
+    Espera los widgets hasta que terminen o venzan. Cada widget tiene
+    DASHBOARD_WIDGET_TIMEOUT_SEGUNDOS desde que empieza, y como maximo ese
+    mismo tiempo esperando en la cola del ejecutor compartido.
+    """
+    encolados_en = time.monotonic()
+
+    def _limite(futuro: Future) -> float:
+        return inicios.get(futuros[futuro], encolados_en) + DASHBOARD_WIDGET_TIMEOUT_SEGUNDOS
+
+    completados: set[Future] = set()
+    pendientes = set(futuros)
+    while pendientes:
+        ahora = time.monotonic()
+        pendientes = {futuro for futuro in pendientes if _limite(futuro) > ahora}
+        if not pendientes:
+            break
+        hechos, pendientes = wait(
+            pendientes,
+            timeout=min(_limite(futuro) for futuro in pendientes) - ahora,
+            return_when=FIRST_COMPLETED,
+        )
+        completados |= hechos
+    return completados
+
+
+@router.get('/inicio', response_model=InicioDashboardOut)
+def obtener_inicio_dashboard(
+    periodo: PeriodoDashboard = Query(default='mes', pattern='^(mes|semana|anual)$'),
+    estado: EstadoDashboard = Query(
+        default='publicados',
+        pattern='^(publicados|activos|inactivos|eliminados)$',
+    ),
+    limit_ultimos: int = Query(default=8, ge=1, le=20),
+    limit_top: int = Query(default=10, ge=1, le=20),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    """
+    Todos los widgets de la pagina de inicio en una sola llamada. Los widgets
+    corren en paralelo en el ejecutor compartido; si fallan o superan
+    DASHBOARD_WIDGET_TIMEOUT_SEGUNDOS se devuelven en `errores` y el resto de
+    la respuesta se entrega igual.
+    """
+    hoy = datetime.now(ZONA_DASHBOARD).date()
+    inicio, fin = _obtener_rango_periodo(periodo, hoy)
+
+    widgets: dict[str, tuple[tuple, Callable[[Session], object]]] = {
+        'resumen': (
+            ('resumen', periodo, estado, inicio.isoformat()),
+            lambda sesion: _calcular_resumen_dashboard(sesion, periodo, estado, inicio, fin),
+        ),
+        'ultimos_viajes': (
+            ('ultimos-viajes', limit_ultimos),
+            lambda sesion: _obtener_ultimos_viajes_publicados(db=sesion, limit=limit_ultimos),
+        ),
+        'top_usuarios_publicadores': (
+            ('top-usuarios-publicadores', limit_top),
+            lambda sesion: _obtener_top_usuarios_publicadores(db=sesion, limit=limit_top),
+        ),
+        'top_rutas_publicadas': (
+            ('top-rutas-publicadas', limit_top),
+            lambda sesion: _obtener_top_rutas_publicadas(db=sesion, limit=limit_top),
+        ),
+        'top_empresas_publicadoras': (
+            ('top-empresas-publicadoras', limit_top),
+            lambda sesion: _obtener_top_empresas_publicadoras(db=sesion, limit=limit_top),
+        ),
+    }
+
+    inicios: dict[str, float] = {}
+    futuros = {
+        _ejecutor_widgets.submit(_ejecutar_widget, clave, calcular, inicios, nombre): nombre
+        for nombre, (clave, calcular) in widgets.items()
+    }
+    completados = _esperar_widgets(futuros, inicios)
+    pendientes = set(futuros) - completados
+
+    resultado = InicioDashboardOut()
+    for futuro in completados:
+        nombre = futuros[futuro]
+        try:
+            setattr(resultado, nombre, futuro.result())
+        except Exception:
+            logger.exception('Fallo el widget %s del dashboard', nombre)
+            resultado.errores.append(
+                ErrorWidgetDashboardOut(widget=nombre, detalle='No fue posible calcular el widget.')
+            )
+
+    for futuro in pendientes:
+        futuro.cancel()
+        resultado.errores.append(
+            ErrorWidgetDashboardOut(
+                widget=futuros[futuro],
+                detalle='El widget supero el tiempo maximo de respuesta.',
+            )
+        )
+
+    return resultado
+
+
+def _token_es_de_admin(token: str) -> bool:
+    """Misma validacion que `_asegurar_usuario_admin` para el token del WebSocket."""
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = UUID(str(payload.get('sub')))
+    except (JWTError, ValueError):
+        return False
+
+    db = SessionLocal()
+    try:
+        user = crud.get_user(db, user_id)
+        if not user or not bool(getattr(user, 'active', False)):
+            return False
+        return _usuario_es_admin(db=db, email=str(user.email), user_id=user.id)
+    finally:
+        db.close()
+
+
+def _rango_en_vivo(
+    periodo: PeriodoDashboard,
+    fecha_desde: Optional[date],
+    fecha_hasta: Optional[date],
+) -> tuple[date, date]:
+    if fecha_desde and fecha_hasta:
+        return fecha_desde, fecha_hasta
+    # Se recalcula en cada envio: el periodo avanza con el reloj local.
+    return _obtener_rango_periodo(periodo, datetime.now(ZONA_DASHBOARD).date())
+
+
+@router.websocket('/ws')
+async def dashboard_en_vivo(
+    websocket: WebSocket,
+    token: str = Query(...),
+    periodo: PeriodoDashboard = Query(default='mes', pattern='^(mes|semana|anual)$'),
+    fecha_desde: Optional[date] = Query(default=None),
+    fecha_hasta: Optional[date] = Query(default=None, description='Fecha final exclusiva.'),
+):
+    """
+    Envia deltas de las tarjetas del resumen para el periodo (o rango) indicado.
+    Los cambios se agrupan y se envian como maximo una vez por intervalo; el
+    cliente los suma a los valores de `TarjetasResumenOut` que ya tiene.
+    """
+    if not await run_in_threadpool(_token_es_de_admin, token):
+        await websocket.close(code=WS_CIERRE_POLITICA)
+        return
+
+    if (fecha_desde is None) != (fecha_hasta is None) or (
+        fecha_desde and fecha_hasta and fecha_hasta <= fecha_desde
+    ):
+        await websocket.close(code=WS_CIERRE_POLITICA, reason='Rango de fechas invalido.')
+        return
+
+    await websocket.accept()
+    suscripcion = difusor_dashboard.suscribir()
+
+    async def _esperar_cierre() -> None:
+        # Los mensajes del cliente (texto o binarios) se ignoran; solo
+        # interesa detectar el cierre.
+        while True:
+            mensaje = await websocket.receive()
+            if mensaje['type'] == 'websocket.disconnect':
+                return
+
+    receptor = asyncio.create_task(_esperar_cierre())
+    try:
+        desde, hasta = _rango_en_vivo(periodo, fecha_desde, fecha_hasta)
+        await websocket.send_json(
+            SuscripcionDashboardEnVivoOut(
+                desde=desde,
+                hasta=hasta,
+                zona_horaria=DASHBOARD_ZONA_HORARIA,
+            ).model_dump(mode='json')
+        )
+
+        while not receptor.done():
+            await asyncio.wait({receptor}, timeout=DASHBOARD_WS_INTERVALO_SEGUNDOS)
+            pendientes = suscripcion.tomar()
+            if not pendientes or receptor.done():
+                continue
+
+            desde, hasta = _rango_en_vivo(periodo, fecha_desde, fecha_hasta)
+            conteos = {dia: conteo for dia, conteo in pendientes.items() if desde <= dia < hasta}
+            tarjetas = _obtener_tarjetas_resumen(conteos)
+            if not any(tarjetas.model_dump().values()):
+                continue
+
+            await websocket.send_json(
+                DeltasTarjetasDashboardOut(
+                    desde=desde,
+                    hasta=hasta,
+                    tarjetas=tarjetas,
+                ).model_dump(mode='json')
+            )
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        difusor_dashboard.desuscribir(suscripcion)
+        receptor.cancel()
+        try:
+            await receptor
+        except (asyncio.CancelledError, WebSocketDisconnect, RuntimeError):
+            pass
+
+
+def detener_widgets_dashboard() -> None:
+    _ejecutor_widgets.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from functools import partial
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from app import models
+from app.db import get_db
+from app.routers.dashboard_admin import _asegurar_usuario_admin
+from app.routers.usuarios_admin import _iterar_exportacion_usuarios, _validar_rango_fechas
+from app.routers.viajes_admin import _asegurar_tablas_eliminacion, _iterar_exportacion_viajes
+from app.schemas_exportacion_admin import (
+    TrabajoExportacionOut,
+    TrabajoExportacionUsuariosIn,
+    TrabajoExportacionViajesIn,
+)
+from app.services import exportaciones
+
+router = APIRouter(prefix='/api/admin/exportaciones', tags=['Admin Exportaciones'])
+
+
+def _serializar_trabajo(trabajo: dict[str, Any]) -> TrabajoExportacionOut:
+    descarga_url = None
+    if trabajo.get('estado') == 'completado':
+        descarga_url = f"{router.prefix}/{trabajo['id']}/descarga"
+
+    return TrabajoExportacionOut(
+        id=str(trabajo['id']),
+        tipo=trabajo['tipo'],
+        filtros=trabajo.get('filtros') or {},
+        estado=trabajo['estado'],
+        progreso=int(trabajo.get('progreso') or 0),
+        filas_procesadas=int(trabajo.get('filas_procesadas') or 0),
+        total_filas=trabajo.get('total_filas'),
+        creado_en=trabajo['creado_en'],
+        actualizado_en=trabajo.get('actualizado_en'),
+        finalizado_en=trabajo.get('finalizado_en'),
+        error=trabajo.get('error'),
+        descarga_url=descarga_url,
+    )
+
+
+def _crear_trabajo(
+    *,
+    tipo: str,
+    filtros: dict[str, Any],
+    current: models.User,
+    productor: exportaciones.ProductorExportacion,
+) -> TrabajoExportacionOut:
+    try:
+        trabajo = exportaciones.crear_trabajo(
+            tipo=tipo,
+            filtros=filtros,
+            creado_por=str(current.id),
+            productor=productor,
+        )
+    except exportaciones.LimiteExportacionesError:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail='Hay demasiadas exportaciones en curso. Inténtalo nuevamente en unos minutos.',
+        )
+
+    return _serializar_trabajo(trabajo)
+
+
+def _obtener_trabajo_o_404(trabajo_id: str) -> dict[str, Any]:
+    trabajo = exportaciones.obtener_trabajo(trabajo_id)
+    if not trabajo:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Exportación no encontrada o vencida.',
+        )
+    return trabajo
+
+
+@router.post(
+    '/viajes',
+    response_model=TrabajoExportacionOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def crear_exportacion_viajes(
+    payload: TrabajoExportacionViajesIn,
+    db: Session = Depends(get_db),
+    current: models.User = Depends(_asegurar_usuario_admin),
+):
+    _asegurar_tablas_eliminacion(db)
+
+    return _crear_trabajo(
+        tipo='viajes',
+        filtros=payload.model_dump(mode='json'),
+        current=current,
+        productor=partial(
+            _iterar_exportacion_viajes,
+            q=payload.q,
+            estado=payload.estado,
+        ),
+    )
+
+
+@router.post(
+    '/usuarios',
+    response_model=TrabajoExportacionOut,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+def crear_exportacion_usuarios(
+    payload: TrabajoExportacionUsuariosIn,
+    current: models.User = Depends(_asegurar_usuario_admin),
+):
+    _validar_rango_fechas(payload.fecha_desde, payload.fecha_hasta)
+
+    return _crear_trabajo(
+        tipo='usuarios',
+        filtros=payload.model_dump(mode='json'),
+        current=current,
+        productor=partial(
+            _iterar_exportacion_usuarios,
+            q=payload.q,
+            estado=payload.estado,
+            tipo=payload.tipo,
+            fecha_desde=payload.fecha_desde,
+            fecha_hasta=payload.fecha_hasta,
+        ),
+    )
+
+
+@router.get('/{trabajo_id}', response_model=TrabajoExportacionOut)
+def obtener_exportacion(
+    trabajo_id: str,
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    return _serializar_trabajo(_obtener_trabajo_o_404(trabajo_id))
+
+
+@router.get('/{trabajo_id}/descarga')
+def descargar_exportacion(
+    trabajo_id: str,
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    trabajo = _obtener_trabajo_o_404(trabajo_id)
+    if trabajo.get('estado') != 'completado':
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail='La exportación aún no está lista para descargar.',
+        )
+
+    ruta = exportaciones.ruta_archivo(str(trabajo['id']))
+    if not ruta.exists():
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='El archivo de la exportación ya no está disponible.',
+        )
+
+    return FileResponse(
+        path=str(ruta),
+        media_type='application/gzip',
+        filename=f"exportacion_{trabajo['tipo']}_{trabajo['id']}.csv.gz",
+    )
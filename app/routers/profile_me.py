@@ -17,6 +17,7 @@ from app.schemas_profile import (
     PerfilActualOut,
 )
 from app.security import get_current_user, get_password_hash, verify_password
+from app.services.indice_empresas import indice_empresas
 
 router = APIRouter(prefix='/api/me/profile', tags=['Mi Perfil'])
 
@@ -232,6 +233,7 @@ def actualizar_mi_perfil(
 
     db.add(current)
     db.commit()
+    indice_empresas.registrar_usuario(current.id, current.company_name)
 
     return _obtener_perfil_actual(db, str(current.id))
 
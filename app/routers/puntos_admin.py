@@ -1,9 +1,23 @@
 from __future__ import annotations
 
+import os
+from datetime import datetime, timezone
 from decimal import Decimal
+from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Form,
+    HTTPException,
+    Query,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
@@ -11,17 +25,65 @@ from app import models
 from app.db import get_db
 from app.routers.dashboard_admin import _asegurar_usuario_admin
 from app.schemas_puntos_admin import (
+    AjustePuntosMasivoIn,
+    AjustePuntosMasivoOut,
     ActualizarPuntosAdminIn,
     ActualizarPuntosAdminOut,
+    HistorialPuntosOut,
     ListaUsuariosPuntosAdminOut,
     ListaReferidosAdminOut,
+    MetricasAuditoriaPuntosOut,
+    MovimientoPuntosOut,
     QuitarReferidoAdminOut,
+    ResumenArbolReferidosOut,
+    SaldoPuntosOut,
     UsuarioPuntosAdminOut,
     UsuarioReferidoAdminOut,
 )
+from app.services.ajuste_puntos_masivo import (
+    AjustePuntosInvalidoError,
+    FilaAjustePuntos,
+    ModoAjustePuntos,
+    aplicar_ajuste_puntos,
+    leer_csv_ajuste,
+    validar_filas,
+)
+from app.services.arbol_referidos import (
+    ARBOL_REFERIDOS_NODOS_MAXIMOS,
+    ARBOL_REFERIDOS_PROFUNDIDAD_MAXIMA,
+    iterar_arbol_ndjson,
+    obtener_resumen_arbol,
+)
+from app.services.auditoria_puntos import sumidero_auditoria_puntos
+from app.services.busqueda_usuarios import filtro_busqueda_usuarios
+from app.services.cache_resultados import CacheResultados
+from app.services.contadores_referidos import (
+    contadores_referidos_disponibles,
+    registrar_cambio_referidos,
+)
+from app.services.libro_puntos import (
+    fijar_puntos,
+    historial_puntos,
+    libro_puntos_disponible,
+    saldo_en_fecha,
+    sumar_puntos,
+)
+from app.services.paginacion_keyset import (
+    CursorInvalidoError,
+    codificar_cursor,
+    decodificar_cursor,
+    fecha_hora_cursor,
+)
 
 router = APIRouter(prefix='/api/admin/puntos', tags=['Admin Puntos'])
 
+# El total de la busqueda se cachea: contarlo en cada pagina recorre la tabla.
+_cache_total_ranking = CacheResultados(
+    'ranking_puntos_total',
+    ttl_segundos=int(os.getenv('PUNTOS_RANKING_TOTAL_CACHE_TTL_SEGUNDOS', '30')),
+    stale_segundos=int(os.getenv('PUNTOS_RANKING_TOTAL_CACHE_STALE_SEGUNDOS', '120')),
+)
+
 
 def _normalizar_texto(valor: object) -> str | None:
     if valor is None:
@@ -69,10 +131,32 @@ def _serializar_usuario_referido(row) -> UsuarioReferidoAdminOut:
     )
 
 
+def _referidos_sql(db: Session) -> tuple[str, str]:
+    """Columna y JOIN para referred_count: contador mantenido o conteo sobre users."""
+    if contadores_referidos_disponibles(db):
+        return 'u.referred_count', ''
+
+    return (
+        'COALESCE(refs.referred_count, 0)',
+        """
+            LEFT JOIN (
+                SELECT
+                    referred_by_id,
+                    COUNT(*) AS referred_count
+                FROM conexion_carga.users
+                WHERE referred_by_id IS NOT NULL
+                GROUP BY referred_by_id
+            ) refs
+                ON refs.referred_by_id = u.id
+        """,
+    )
+
+
 def _obtener_usuario_por_id(db: Session, user_id: UUID | str):
+    columna_referidos, join_referidos = _referidos_sql(db)
     return db.execute(
         text(
-            """
+            f"""
             SELECT
                 u.id,
                 u.email,
@@ -83,17 +167,9 @@ def _obtener_usuario_por_id(db: Session, user_id: UUID | str):
                 u.active,
                 u.created_at,
                 u.points,
-                COALESCE(refs.referred_count, 0) AS referred_count
+                {columna_referidos} AS referred_count
             FROM conexion_carga.users u
-            LEFT JOIN (
-                SELECT
-                    referred_by_id,
-                    COUNT(*) AS referred_count
-                FROM conexion_carga.users
-                WHERE referred_by_id IS NOT NULL
-                GROUP BY referred_by_id
-            ) refs
-                ON refs.referred_by_id = u.id
+            {join_referidos}
             WHERE u.id = CAST(:user_id AS uuid)
             LIMIT 1
             """
@@ -102,18 +178,6 @@ def _obtener_usuario_por_id(db: Session, user_id: UUID | str):
     ).mappings().first()
 
 
-def _tabla_auditoria_existe(db: Session) -> bool:
-    return bool(
-        db.execute(
-            text(
-                """
-                SELECT to_regclass('conexion_carga.auditoria_puntos_referidos') IS NOT NULL
-                """
-            )
-        ).scalar()
-    )
-
-
 def _registrar_auditoria_puntos(
     db: Session,
     *,
@@ -124,85 +188,96 @@ def _registrar_auditoria_puntos(
     puntos_nuevos: int,
     detalle: str | None,
 ) -> None:
-    if not _tabla_auditoria_existe(db):
-        return
-
-    db.execute(
-        text(
-            """
-            INSERT INTO conexion_carga.auditoria_puntos_referidos (
-                user_id,
-                admin_user_id,
-                accion,
-                puntos_anteriores,
-                puntos_nuevos,
-                detalle
-            )
-            VALUES (
-                CAST(:user_id AS uuid),
-                CAST(:admin_user_id AS uuid),
-                :accion,
-                :puntos_anteriores,
-                :puntos_nuevos,
-                :detalle
-            )
-            """
-        ),
-        {
-            'user_id': str(user_id),
-            'admin_user_id': str(admin_user_id) if admin_user_id else None,
-            'accion': accion,
-            'puntos_anteriores': puntos_anteriores,
-            'puntos_nuevos': puntos_nuevos,
-            'detalle': detalle,
-        },
+    sumidero_auditoria_puntos.registrar(
+        db,
+        user_id=user_id,
+        admin_user_id=admin_user_id,
+        accion=accion,
+        puntos_anteriores=puntos_anteriores,
+        puntos_nuevos=puntos_nuevos,
+        detalle=detalle,
     )
 
 
+@router.get('/auditoria/metricas', response_model=MetricasAuditoriaPuntosOut)
+def obtener_metricas_auditoria_puntos(
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    return MetricasAuditoriaPuntosOut(**sumidero_auditoria_puntos.metricas())
+
+
 @router.get('', response_model=ListaUsuariosPuntosAdminOut)
 def obtener_ranking_puntos(
     q: str = Query(default='', max_length=255),
     page: int = Query(default=1, ge=1),
     page_size: int = Query(default=12, ge=1, le=100),
+    cursor: Optional[str] = Query(
+        default=None,
+        max_length=512,
+        description='`next_cursor` de la pagina anterior; si se envia, se ignora `page`.',
+    ),
     db: Session = Depends(get_db),
     _: models.User = Depends(_asegurar_usuario_admin),
 ):
     termino = (q or '').strip()
 
     filtros: list[str] = []
-    params: dict[str, object] = {
-        'limit': page_size,
-        'offset': (page - 1) * page_size,
-    }
+    params: dict[str, object] = {}
 
     if termino:
-        filtros.append(
-            """
-            (
-                COALESCE(u.email, '') ILIKE :q_like
-                OR COALESCE(u.first_name, '') ILIKE :q_like
-                OR COALESCE(u.last_name, '') ILIKE :q_like
-                OR COALESCE(u.phone, '') ILIKE :q_like
-                OR COALESCE(u.company_name, '') ILIKE :q_like
-                OR COALESCE(u.first_name || ' ' || u.last_name, '') ILIKE :q_like
-            )
-            """
-        )
-        params['q_like'] = f'%{termino}%'
+        filtro_busqueda, params_busqueda = filtro_busqueda_usuarios(db, termino)
+        filtros.append(filtro_busqueda)
+        params.update(params_busqueda)
 
     where_clause = f"WHERE {' AND '.join(filtros)}" if filtros else ''
+    columna_referidos, join_referidos = _referidos_sql(db)
 
-    total = db.execute(
-        text(
-            f"""
-            SELECT COUNT(*)
-            FROM conexion_carga.users u
-            {where_clause}
+    total, _edad = _cache_total_ranking.obtener(
+        db,
+        termino.lower(),
+        lambda sesion: sesion.execute(
+            text(
+                f"""
+                SELECT COUNT(*)
+                FROM conexion_carga.users u
+                {where_clause}
+                """
+            ),
+            params,
+        ).scalar(),
+    )
+
+    params_pagina: dict[str, object] = {**params, 'limit': page_size + 1, 'offset': 0}
+    filtros_pagina = list(filtros)
+    if cursor:
+        try:
+            puntos, creado, email, usuario_id = decodificar_cursor(cursor, 4)
+            params_pagina.update(
+                {
+                    'c_orden_puntos': int(puntos),
+                    'c_created_at': fecha_hora_cursor(creado),
+                    'c_email': str(email),
+                    'c_id': str(UUID(str(usuario_id))),
+                }
+            )
+        except (CursorInvalidoError, TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='El cursor de paginación no es válido.',
+            )
+        filtros_pagina.append(
             """
-        ),
-        params,
-    ).scalar()
+            (-COALESCE(u.points, 0), u.created_at, LOWER(u.email), u.id)
+                > (:c_orden_puntos, :c_created_at, :c_email, CAST(:c_id AS uuid))
+            """
+        )
+    else:
+        params_pagina['offset'] = (page - 1) * page_size
+
+    where_pagina = f"WHERE {' AND '.join(filtros_pagina)}" if filtros_pagina else ''
 
+    # Orden equivalente a COALESCE(points, 0) DESC, created_at, LOWER(email),
+    # en un solo sentido para que el cursor y el indice keyset coincidan.
     filas = db.execute(
         text(
             f"""
@@ -216,31 +291,34 @@ def obtener_ranking_puntos(
                 u.active,
                 u.created_at,
                 u.points,
-                COALESCE(refs.referred_count, 0) AS referred_count
+                {columna_referidos} AS referred_count,
+                -COALESCE(u.points, 0) AS orden_puntos,
+                LOWER(u.email) AS orden_email
             FROM conexion_carga.users u
-            LEFT JOIN (
-                SELECT
-                    referred_by_id,
-                    COUNT(*) AS referred_count
-                FROM conexion_carga.users
-                WHERE referred_by_id IS NOT NULL
-                GROUP BY referred_by_id
-            ) refs
-                ON refs.referred_by_id = u.id
-            {where_clause}
-            ORDER BY COALESCE(u.points, 0) DESC, u.created_at ASC, LOWER(u.email) ASC
+            {join_referidos}
+            {where_pagina}
+            ORDER BY -COALESCE(u.points, 0) ASC, u.created_at ASC, LOWER(u.email) ASC, u.id ASC
             OFFSET :offset
             LIMIT :limit
             """
         ),
-        params,
+        params_pagina,
     ).mappings().all()
 
+    next_cursor = None
+    if len(filas) > page_size:
+        filas = filas[:page_size]
+        ultima = filas[-1]
+        next_cursor = codificar_cursor(
+            [ultima['orden_puntos'], ultima['created_at'], ultima['orden_email'], ultima['id']]
+        )
+
     return ListaUsuariosPuntosAdminOut(
         total=int(total or 0),
         page=page,
         page_size=page_size,
         items=[_serializar_usuario_puntos(fila) for fila in filas],
+        next_cursor=next_cursor,
     )
 
 
@@ -283,6 +361,182 @@ def obtener_referidos_usuario(
     )
 
 
+def _asegurar_usuario_existe(db: Session, user_id: UUID) -> None:
+    if not _obtener_usuario_por_id(db=db, user_id=user_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail='Usuario no encontrado.',
+        )
+
+
+@router.get('/{user_id}/referidos/arbol/resumen', response_model=ResumenArbolReferidosOut)
+def obtener_resumen_arbol_referidos(
+    user_id: UUID,
+    response: Response,
+    profundidad: int = Query(default=5, ge=1, le=ARBOL_REFERIDOS_PROFUNDIDAD_MAXIMA),
+    limite: int = Query(default=1000, ge=1, le=ARBOL_REFERIDOS_NODOS_MAXIMOS),
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    _asegurar_usuario_existe(db, user_id)
+    resumen, edad = obtener_resumen_arbol(db, user_id, profundidad, limite)
+    response.headers['X-Cache-Age'] = str(int(edad))
+    return ResumenArbolReferidosOut(**resumen)
+
+
+@router.get('/{user_id}/referidos/arbol')
+def obtener_arbol_referidos(
+    user_id: UUID,
+    profundidad: int = Query(default=5, ge=1, le=ARBOL_REFERIDOS_PROFUNDIDAD_MAXIMA),
+    limite: int = Query(default=1000, ge=1, le=ARBOL_REFERIDOS_NODOS_MAXIMOS),
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    """
+    Subarbol completo de referidos en NDJSON: una linea `resumen` (tamano por
+    nivel), una linea `nodo` por referido con su `parent_id` y `nivel`, y una
+    linea `fin`.
+    """
+    _asegurar_usuario_existe(db, user_id)
+    resumen, _edad = obtener_resumen_arbol(db, user_id, profundidad, limite)
+    return StreamingResponse(
+        iterar_arbol_ndjson(user_id, profundidad, limite, resumen),
+        media_type='application/x-ndjson',
+    )
+
+
+def _responder_ajuste_masivo(
+    db: Session,
+    filas: list[FilaAjustePuntos],
+    modo: ModoAjustePuntos,
+    detalle: str | None,
+    admin_user_id: UUID,
+) -> AjustePuntosMasivoOut:
+    resumen = aplicar_ajuste_puntos(
+        db,
+        filas,
+        modo,
+        admin_user_id=admin_user_id,
+        detalle=_normalizar_texto(detalle) or 'Ajuste masivo de puntos desde el panel administrativo.',
+    )
+    return AjustePuntosMasivoOut(
+        ok=True,
+        message=f"Se actualizaron los puntos de {resumen['actualizados']} usuarios.",
+        **resumen,
+    )
+
+
+def _error_ajuste_masivo(exc: AjustePuntosInvalidoError) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail=exc.errores,
+    )
+
+
+@router.post('/masivo', response_model=AjustePuntosMasivoOut)
+def ajustar_puntos_masivo(
+    payload: AjustePuntosMasivoIn,
+    db: Session = Depends(get_db),
+    current: models.User = Depends(_asegurar_usuario_admin),
+):
+    try:
+        filas = validar_filas(
+            (
+                (numero, item.user_id, item.email, item.points)
+                for numero, item in enumerate(payload.items, start=1)
+            ),
+            payload.modo,
+        )
+    except AjustePuntosInvalidoError as exc:
+        raise _error_ajuste_masivo(exc)
+
+    return _responder_ajuste_masivo(db, filas, payload.modo, payload.detalle, current.id)
+
+
+@router.post('/masivo/csv', response_model=AjustePuntosMasivoOut)
+def ajustar_puntos_masivo_csv(
+    archivo: UploadFile = File(...),
+    modo: ModoAjustePuntos = Form(default='fijar'),
+    detalle: Optional[str] = Form(default=None, max_length=500),
+    db: Session = Depends(get_db),
+    current: models.User = Depends(_asegurar_usuario_admin),
+):
+    """CSV con encabezado `points` y `user_id` y/o `email`."""
+    try:
+        filas = leer_csv_ajuste(archivo.file.read(), modo)
+    except AjustePuntosInvalidoError as exc:
+        raise _error_ajuste_masivo(exc)
+
+    return _responder_ajuste_masivo(db, filas, modo, detalle, current.id)
+
+
+def _asegurar_libro_puntos(db: Session) -> None:
+    if not libro_puntos_disponible(db):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail='El libro de puntos no está habilitado (scripts_sql/09_libro_puntos.sql).',
+        )
+
+
+@router.get('/{user_id}/historial', response_model=HistorialPuntosOut)
+def obtener_historial_puntos(
+    user_id: UUID,
+    limit: int = Query(default=50, ge=1, le=500),
+    antes_de: Optional[int] = Query(
+        default=None,
+        ge=1,
+        description='`next_cursor` de la página anterior.',
+    ),
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    _asegurar_libro_puntos(db)
+    _asegurar_usuario_existe(db, user_id)
+
+    movimientos = historial_puntos(db, user_id, limit + 1, antes_de)
+    next_cursor = None
+    if len(movimientos) > limit:
+        movimientos = movimientos[:limit]
+        next_cursor = int(movimientos[-1]['id'])
+
+    return HistorialPuntosOut(
+        user_id=str(user_id),
+        items=[
+            MovimientoPuntosOut(
+                id=int(movimiento['id']),
+                delta=int(movimiento['delta']),
+                saldo=int(movimiento['saldo']),
+                origen=str(movimiento['origen']),
+                admin_user_id=str(movimiento['admin_user_id']) if movimiento['admin_user_id'] else None,
+                detalle=_normalizar_texto(movimiento['detalle']),
+                creado_en=movimiento['creado_en'],
+            )
+            for movimiento in movimientos
+        ],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get('/{user_id}/saldo', response_model=SaldoPuntosOut)
+def obtener_saldo_puntos_en_fecha(
+    user_id: UUID,
+    fecha: datetime = Query(..., description='Fecha y hora (UTC) del saldo.'),
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    _asegurar_libro_puntos(db)
+    _asegurar_usuario_existe(db, user_id)
+
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return SaldoPuntosOut(
+        user_id=str(user_id),
+        fecha=fecha,
+        saldo=saldo_en_fecha(db, user_id, fecha),
+    )
+
+
 @router.patch('/{user_id}', response_model=ActualizarPuntosAdminOut)
 def actualizar_puntos_usuario(
     user_id: UUID,
@@ -297,22 +551,15 @@ def actualizar_puntos_usuario(
             detail='Usuario no encontrado.',
         )
 
-    puntos_anteriores = _obtener_entero(fila_actual.get('points'))
-    puntos_nuevos = int(payload.points)
-
-    db.execute(
-        text(
-            """
-            UPDATE conexion_carga.users
-            SET points = :points
-            WHERE id = CAST(:user_id AS uuid)
-            """
-        ),
-        {
-            'user_id': str(user_id),
-            'points': puntos_nuevos,
-        },
-    )
+    detalle = 'Actualización manual de puntos desde el panel administrativo.'
+    puntos_anteriores, puntos_nuevos = fijar_puntos(
+        db,
+        user_id,
+        int(payload.points),
+        origen='actualizacion_manual',
+        admin_user_id=current.id,
+        detalle=detalle,
+    ) or (_obtener_entero(fila_actual.get('points')), int(payload.points))
 
     _registrar_auditoria_puntos(
         db,
@@ -321,7 +568,7 @@ def actualizar_puntos_usuario(
         accion='actualizacion_manual',
         puntos_anteriores=puntos_anteriores,
         puntos_nuevos=puntos_nuevos,
-        detalle='Actualización manual de puntos desde el panel administrativo.',
+        detalle=detalle,
     )
 
     db.commit()
@@ -353,18 +600,15 @@ def quitar_usuario_del_ranking(
             detail='Usuario no encontrado.',
         )
 
-    puntos_anteriores = _obtener_entero(fila_actual.get('points'))
-
-    db.execute(
-        text(
-            """
-            UPDATE conexion_carga.users
-            SET points = 0
-            WHERE id = CAST(:user_id AS uuid)
-            """
-        ),
-        {'user_id': str(user_id)},
-    )
+    detalle = 'Reinicio de puntos a cero desde el panel administrativo.'
+    puntos_anteriores, puntos_nuevos = fijar_puntos(
+        db,
+        user_id,
+        0,
+        origen='quitar_del_ranking',
+        admin_user_id=current.id,
+        detalle=detalle,
+    ) or (_obtener_entero(fila_actual.get('points')), 0)
 
     _registrar_auditoria_puntos(
         db,
@@ -372,8 +616,8 @@ def quitar_usuario_del_ranking(
         admin_user_id=current.id,
         accion='quitar_del_ranking',
         puntos_anteriores=puntos_anteriores,
-        puntos_nuevos=0,
-        detalle='Reinicio de puntos a cero desde el panel administrativo.',
+        puntos_nuevos=puntos_nuevos,
+        detalle=detalle,
     )
 
     db.commit()
@@ -448,20 +692,21 @@ def quitar_referido_usuario(
     )
 
     try:
-        resultado_retiro = db.execute(
-            text(
-                """
-                UPDATE conexion_carga.users
-                SET referred_by_id = NULL
-                WHERE id = CAST(:referred_user_id AS uuid)
-                  AND referred_by_id = CAST(:user_id AS uuid)
-                """
-            ),
-            {
-                'referred_user_id': str(referred_user_id),
-                'user_id': str(user_id),
-            },
-        )
+        with registrar_cambio_referidos(db, [referred_user_id]):
+            resultado_retiro = db.execute(
+                text(
+                    """
+                    UPDATE conexion_carga.users
+                    SET referred_by_id = NULL
+                    WHERE id = CAST(:referred_user_id AS uuid)
+                      AND referred_by_id = CAST(:user_id AS uuid)
+                    """
+                ),
+                {
+                    'referred_user_id': str(referred_user_id),
+                    'user_id': str(user_id),
+                },
+            )
 
         if (resultado_retiro.rowcount or 0) <= 0:
             raise HTTPException(
@@ -469,19 +714,14 @@ def quitar_referido_usuario(
                 detail='La relación del referido cambió antes de completar la operación.',
             )
 
-        db.execute(
-            text(
-                """
-                UPDATE conexion_carga.users
-                SET points = :points
-                WHERE id = CAST(:user_id AS uuid)
-                """
-            ),
-            {
-                'user_id': str(user_id),
-                'points': puntos_nuevos,
-            },
-        )
+        puntos_anteriores, puntos_nuevos = sumar_puntos(
+            db,
+            user_id,
+            -1,
+            origen='quitar_referido',
+            admin_user_id=current.id,
+            detalle=detalle,
+        ) or (puntos_anteriores, puntos_nuevos)
 
         _registrar_auditoria_puntos(
             db,
@@ -6,24 +6,42 @@ Rutas de usuarios:
 - Verificación de email
 - Perfil /me
 - Actualización de usuario
+- Leaderboard de referidos
 """
 
 from __future__ import annotations
-from typing import Dict
+import os
+from typing import Dict, Optional
 from uuid import UUID
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from pydantic import BaseModel, EmailStr, Field
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app import crud, schemas, models
 from app.db import get_db
 from app.security import get_password_hash, get_current_user
+from app.services.cache_resultados import CacheResultados
+from app.services.contadores_referidos import (
+    contadores_referidos_disponibles,
+    registrar_cambio_referidos,
+)
 from app.services.emailer import send_email
+from app.services.libro_puntos import sumar_puntos
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
+# El leaderboard puede servirse con hasta TTL + stale segundos de antiguedad
+# (120 s por defecto); la edad real va en la cabecera X-Cache-Age.
+_cache_leaderboard = CacheResultados(
+    "leaderboard",
+    ttl_segundos=int(os.getenv("LEADERBOARD_CACHE_TTL_SEGUNDOS", "60")),
+    stale_segundos=int(os.getenv("LEADERBOARD_CACHE_STALE_SEGUNDOS", "60")),
+)
+
 
 # ==========================
 #   Esquemas internos
@@ -76,7 +94,12 @@ def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
     # 4) Crear usuario con hash y referidor
     pw_hash = get_password_hash(user.password)
-    created = crud.create_user(db, user, pw_hash, referred_by_id=ref_id)
+    try:
+        created = crud.create_user(db, user, pw_hash, referred_by_id=ref_id)
+    except IntegrityError:
+        # Registro concurrente con el mismo correo (ux_users_email_lower).
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Correo ya registrado")
     created.active = False
     db.add(created)
     db.commit()
@@ -184,18 +207,23 @@ def verify_user(
     # marcar código como usado y activar usuario
     verif.used = True
     was_active = bool(user.active)
-    user.active = True
-
-    # premiar referidor si aplica y aún no fue premiado
-    if not was_active and user.referred_by_id and not getattr(user, "referral_rewarded", False):
-        ref = db.query(models.User).get(user.referred_by_id)
-        if ref:
-            ref.points = int(ref.points or 0) + 1
-            user.referral_rewarded = True
-            db.add(ref)
-
-    db.add(user)
-    db.add(verif)
+    with registrar_cambio_referidos(db, [user.id]):
+        user.active = True
+
+        # premiar referidor si aplica y aún no fue premiado
+        if not was_active and user.referred_by_id and not getattr(user, "referral_rewarded", False):
+            premiado = sumar_puntos(
+                db,
+                user.referred_by_id,
+                1,
+                origen="referido_verificado",
+                detalle=f"Referido verificado: {user.email}",
+            )
+            if premiado:
+                user.referral_rewarded = True
+
+        db.add(user)
+        db.add(verif)
     db.commit()
     db.refresh(user)
 
@@ -225,37 +253,75 @@ def update_user(user_id: UUID, user: schemas.UserUpdate, db: Session = Depends(g
         existing = crud.get_user_by_email(db, user.email)
         if existing and existing.id != user_id:
             raise HTTPException(status_code=400, detail="Correo en uso")
-    updated = crud.update_user(db, user_id, user)
+    try:
+        updated = crud.update_user(db, user_id, user)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Correo en uso")
     if not updated:
         raise HTTPException(status_code=404, detail="User not found")
     return updated
 
+def _calcular_leaderboard(db: Session, limit: Optional[int], skip: int) -> list[dict]:
+    """Una sola consulta: usa users.referred_active_count o un GROUP BY de referidos activos."""
+    if contadores_referidos_disponibles(db):
+        columna_puntos = "u.referred_active_count"
+        join_referidos = ""
+    else:
+        columna_puntos = "COALESCE(refs.activos, 0)"
+        join_referidos = """
+            LEFT JOIN (
+                SELECT referred_by_id, COUNT(*) AS activos
+                FROM conexion_carga.users
+                WHERE referred_by_id IS NOT NULL
+                  AND active IS TRUE
+                GROUP BY referred_by_id
+            ) refs
+              ON refs.referred_by_id = u.id
+        """
+
+    filas = db.execute(
+        text(
+            f"""
+            SELECT
+                u.email,
+                u.phone,
+                {columna_puntos} AS points
+            FROM conexion_carga.users u
+            {join_referidos}
+            ORDER BY points DESC, u.created_at ASC, u.id ASC
+            OFFSET :skip
+            LIMIT :limit
+            """
+        ),
+        {"skip": skip, "limit": limit},
+    ).mappings().all()
+
+    return [
+        {"email": fila["email"], "phone": fila["phone"], "points": int(fila["points"] or 0)}
+        for fila in filas
+    ]
+
+
 @router.get("/leaderboard")
-def leaderboard(db: Session = Depends(get_db)):
+def leaderboard(
+    response: Response,
+    limit: Optional[int] = Query(default=None, ge=1, le=1000, description="Top N; sin valor, todos."),
+    skip: int = Query(default=0, ge=0),
+    db: Session = Depends(get_db),
+):
     """
-    Retorna lista de usuarios + puntos calculados dinámicamente:
+    Retorna lista de usuarios + puntos:
     puntos = cantidad de usuarios activos cuyo referred_by_id = id del usuario
-    """
-    users = db.query(models.User).all()
-
-    rows = []
-    for u in users:
-        pts = (
-            db.query(models.User)
-            .filter(
-                models.User.referred_by_id == u.id,
-                models.User.active == True   # Solo cuenta referidos ACTIVOS
-            )
-            .count()
-        )
 
-        rows.append({
-            "email": u.email,
-            "phone": u.phone,
-            "points": pts,
-        })
-
-    # ordenar por puntos desc
-    rows.sort(key=lambda x: x["points"], reverse=True)
-
-    return rows
+    El resultado se cachea: puede tener hasta LEADERBOARD_CACHE_TTL_SEGUNDOS +
+    LEADERBOARD_CACHE_STALE_SEGUNDOS de antiguedad (120 s por defecto).
+    La cabecera X-Cache-Age indica la edad en segundos.
+    """
+    filas, edad = _cache_leaderboard.obtener(
+        db,
+        ("leaderboard", limit, skip),
+        lambda sesion: _calcular_leaderboard(sesion, limit, skip),
+    )
+    response.headers["X-Cache-Age"] = str(int(edad))
+    return filas
@@ -2,9 +2,11 @@ from __future__ import annotations
 
 from datetime import date
 from decimal import Decimal
+from typing import Iterator
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
@@ -17,6 +19,9 @@ from app.schemas_usuarios_admin import (
     ActualizarUsuarioAdminIn,
     CambiarEstadoUsuarioAdminIn,
     CambiarEstadoUsuarioAdminOut,
+    CambiarEstadoUsuariosLoteIn,
+    CambiarRolUsuariosLoteIn,
+    CambioUsuariosLoteOut,
     CrearUsuarioAdminIn,
     EstadoFiltroUsuarioAdmin,
     ListaUsuariosAdminOut,
@@ -24,9 +29,28 @@ from app.schemas_usuarios_admin import (
     UsuarioAdminOut,
 )
 from app.security import get_password_hash
+from app.services.busqueda_usuarios import filtro_busqueda_usuarios
+from app.services.contadores_referidos import (
+    registrar_cambio_referidos,
+    registrar_usuarios_nuevos_referidos,
+)
+from app.services.importacion_usuarios import (
+    ImportacionUsuariosInvalidaError,
+    abrir_csv_importacion,
+    iterar_importacion_ndjson,
+)
+from app.services.indice_empresas import indice_empresas
+from app.services.normalizacion import normalizar_email
+from app.services.paginacion_keyset import (
+    CursorInvalidoError,
+    codificar_cursor,
+    decodificar_cursor,
+    fecha_hora_cursor,
+)
 
 router = APIRouter(prefix='/api/admin/usuarios', tags=['Admin Usuarios'])
 ROL_ADMINISTRADOR_NOMBRE = 'Administrador'
+FILAS_LOTE_EXPORTACION = 500
 
 
 def _normalizar_texto(valor: object) -> str | None:
@@ -37,10 +61,6 @@ def _normalizar_texto(valor: object) -> str | None:
     return texto or None
 
 
-def _normalizar_email(email: object) -> str:
-    return str(email or '').strip().lower()
-
-
 def _obtener_entero(valor: object) -> int:
     if valor is None:
         return 0
@@ -147,32 +167,24 @@ def _obtener_tipo_usuario_exportacion(row: dict[str, object]) -> str:
 
 
 def _construir_consulta_usuarios_admin(
+    db: Session,
     *,
     q: str,
     estado: EstadoFiltroUsuarioAdmin,
     tipo: TipoFiltroUsuarioAdmin,
     fecha_desde: date | None,
     fecha_hasta: date | None,
-) -> tuple[str, str, dict[str, object]]:
+) -> tuple[list[str], dict[str, object]]:
+    """Filtros sobre `users u`; no requieren joins."""
     termino = (q or '').strip()
 
     filtros: list[str] = []
     params: dict[str, object] = {}
 
     if termino:
-        filtros.append(
-            """
-            (
-                COALESCE(u.email, '') ILIKE :q_like
-                OR COALESCE(u.first_name, '') ILIKE :q_like
-                OR COALESCE(u.last_name, '') ILIKE :q_like
-                OR COALESCE(u.phone, '') ILIKE :q_like
-                OR COALESCE(u.company_name, '') ILIKE :q_like
-                OR COALESCE(u.first_name || ' ' || u.last_name, '') ILIKE :q_like
-            )
-            """
-        )
-        params['q_like'] = f'%{termino}%'
+        filtro_busqueda, params_busqueda = filtro_busqueda_usuarios(db, termino)
+        filtros.append(filtro_busqueda)
+        params.update(params_busqueda)
 
     if estado == 'habilitado':
         filtros.append('u.active = TRUE')
@@ -202,16 +214,19 @@ def _construir_consulta_usuarios_admin(
         filtros.append("u.created_at < CAST(:fecha_hasta AS date) + INTERVAL '1 day'")
         params['fecha_hasta'] = fecha_hasta
 
-    where_clause = f"WHERE {' AND '.join(filtros)}" if filtros else ''
-    from_clause = """
-        FROM conexion_carga.users u
-        LEFT JOIN conexion_carga.rol r
-          ON r.id = u.rol_id
-        LEFT JOIN conexion_carga.users ref
-          ON ref.id = u.referred_by_id
-    """
+    return filtros, params
 
-    return from_clause, where_clause, params
+
+def _clausula_where(filtros: list[str]) -> str:
+    return f"WHERE {' AND '.join(filtros)}" if filtros else ''
+
+
+def _validar_rango_fechas(fecha_desde: date | None, fecha_hasta: date | None) -> None:
+    if fecha_desde and fecha_hasta and fecha_desde > fecha_hasta:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail='La fecha desde no puede ser mayor que la fecha hasta.',
+        )
 
 
 @router.get('', response_model=ListaUsuariosAdminOut)
@@ -229,40 +244,58 @@ def obtener_usuarios_admin(
     fecha_hasta: date | None = Query(default=None),
     page: int = Query(default=1, ge=1),
     page_size: int = Query(default=12, ge=1, le=100),
+    cursor: str | None = Query(
+        default=None,
+        max_length=512,
+        description='`next_cursor` de la pagina anterior; si se envia, se ignora `page`.',
+    ),
     db: Session = Depends(get_db),
     _: models.User = Depends(_asegurar_usuario_admin),
 ):
-    if fecha_desde and fecha_hasta and fecha_desde > fecha_hasta:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail='La fecha desde no puede ser mayor que la fecha hasta.',
-        )
+    _validar_rango_fechas(fecha_desde, fecha_hasta)
 
-    from_clause, where_clause, params = _construir_consulta_usuarios_admin(
+    filtros, params = _construir_consulta_usuarios_admin(
+        db,
         q=q,
         estado=estado,
         tipo=tipo,
         fecha_desde=fecha_desde,
         fecha_hasta=fecha_hasta,
     )
-    params.update(
-        {
-            'limit': page_size,
-            'offset': (page - 1) * page_size,
-        }
-    )
 
     total = db.execute(
         text(
             f"""
             SELECT COUNT(*)
-            {from_clause}
-            {where_clause}
+            FROM conexion_carga.users u
+            {_clausula_where(filtros)}
             """
         ),
         params,
     ).scalar()
 
+    params_pagina: dict[str, object] = {**params, 'limit': page_size + 1, 'offset': 0}
+    filtros_pagina = list(filtros)
+    if cursor:
+        try:
+            creado, usuario_id = decodificar_cursor(cursor, 2)
+            params_pagina.update(
+                {
+                    'c_created_at': fecha_hora_cursor(creado),
+                    'c_id': str(UUID(str(usuario_id))),
+                }
+            )
+        except (CursorInvalidoError, TypeError, ValueError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='El cursor de paginación no es válido.',
+            )
+        filtros_pagina.append('(u.created_at, u.id) < (:c_created_at, CAST(:c_id AS uuid))')
+    else:
+        params_pagina['offset'] = (page - 1) * page_size
+
+    # Se pagina solo sobre users (indices de scripts_sql/12_users_listado_admin.sql)
+    # y el rol y el referidor se resuelven para las filas de la pagina.
     filas = db.execute(
         text(
             f"""
@@ -283,47 +316,51 @@ def obtener_usuarios_admin(
                 r.nombre AS rol_nombre,
                 u.referred_by_id,
                 ref.email AS referred_by_email
-            {from_clause}
-            {where_clause}
-            ORDER BY u.created_at DESC
-            OFFSET :offset
-            LIMIT :limit
+            FROM (
+                SELECT u.*
+                FROM conexion_carga.users u
+                {_clausula_where(filtros_pagina)}
+                ORDER BY u.created_at DESC, u.id DESC
+                OFFSET :offset
+                LIMIT :limit
+            ) u
+            LEFT JOIN conexion_carga.rol r
+              ON r.id = u.rol_id
+            LEFT JOIN conexion_carga.users ref
+              ON ref.id = u.referred_by_id
+            ORDER BY u.created_at DESC, u.id DESC
             """
         ),
-        params,
+        params_pagina,
     ).mappings().all()
 
+    next_cursor = None
+    if len(filas) > page_size:
+        filas = filas[:page_size]
+        ultima = filas[-1]
+        next_cursor = codificar_cursor([ultima['created_at'], ultima['id']])
+
     return ListaUsuariosAdminOut(
         total=int(total or 0),
         page=page,
         page_size=page_size,
         items=[_serializar_usuario(fila) for fila in filas],
+        next_cursor=next_cursor,
     )
 
 
-@router.get('/exportacion', response_model=list[UsuarioAdminExportOut])
-def exportar_usuarios_admin(
-    q: str = Query(default='', max_length=255),
-    estado: EstadoFiltroUsuarioAdmin = Query(
-        default='todos',
-        pattern='^(todos|habilitado|inhabilitado)$',
-    ),
-    tipo: TipoFiltroUsuarioAdmin = Query(
-        default='todos',
-        pattern='^(todos|usuario|empresa|conductor|premium)$',
-    ),
-    fecha_desde: date | None = Query(default=None),
-    fecha_hasta: date | None = Query(default=None),
-    db: Session = Depends(get_db),
-    _: models.User = Depends(_asegurar_usuario_admin),
-):
-    if fecha_desde and fecha_hasta and fecha_desde > fecha_hasta:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail='La fecha desde no puede ser mayor que la fecha hasta.',
-        )
-
-    from_clause, where_clause, params = _construir_consulta_usuarios_admin(
+def _iterar_exportacion_usuarios(
+    db: Session,
+    *,
+    q: str,
+    estado: EstadoFiltroUsuarioAdmin,
+    tipo: TipoFiltroUsuarioAdmin,
+    fecha_desde: date | None,
+    fecha_hasta: date | None,
+) -> Iterator[UsuarioAdminExportOut]:
+    """Filas de la exportacion leidas por lotes con un cursor del servidor."""
+    filtros, params = _construir_consulta_usuarios_admin(
+        db,
         q=q,
         estado=estado,
         tipo=tipo,
@@ -347,16 +384,17 @@ def exportar_usuarios_admin(
                 u.points,
                 u.is_premium,
                 u.is_driver
-            {from_clause}
-            {where_clause}
-            ORDER BY u.created_at DESC
+            FROM conexion_carga.users u
+            {_clausula_where(filtros)}
+            ORDER BY u.created_at DESC, u.id DESC
             """
         ),
         params,
-    ).mappings().all()
+        execution_options={'stream_results': True, 'yield_per': FILAS_LOTE_EXPORTACION},
+    ).mappings()
 
-    return [
-        UsuarioAdminExportOut(
+    for fila in filas:
+        yield UsuarioAdminExportOut(
             id=str(fila['id']),
             nombre_completo=' '.join(
                 parte
@@ -375,8 +413,176 @@ def exportar_usuarios_admin(
             puntos=_obtener_entero(fila.get('points')),
             fecha_creacion=fila['created_at'],
         )
-        for fila in filas
-    ]
+
+
+def _obtener_exportacion_usuarios(
+    db: Session,
+    *,
+    q: str,
+    estado: EstadoFiltroUsuarioAdmin,
+    tipo: TipoFiltroUsuarioAdmin,
+    fecha_desde: date | None,
+    fecha_hasta: date | None,
+) -> list[UsuarioAdminExportOut]:
+    return list(
+        _iterar_exportacion_usuarios(
+            db,
+            q=q,
+            estado=estado,
+            tipo=tipo,
+            fecha_desde=fecha_desde,
+            fecha_hasta=fecha_hasta,
+        )
+    )
+
+
+@router.get('/exportacion', response_model=list[UsuarioAdminExportOut])
+def exportar_usuarios_admin(
+    q: str = Query(default='', max_length=255),
+    estado: EstadoFiltroUsuarioAdmin = Query(
+        default='todos',
+        pattern='^(todos|habilitado|inhabilitado)$',
+    ),
+    tipo: TipoFiltroUsuarioAdmin = Query(
+        default='todos',
+        pattern='^(todos|usuario|empresa|conductor|premium)$',
+    ),
+    fecha_desde: date | None = Query(default=None),
+    fecha_hasta: date | None = Query(default=None),
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    _validar_rango_fechas(fecha_desde, fecha_hasta)
+
+    return _obtener_exportacion_usuarios(
+        db,
+        q=q,
+        estado=estado,
+        tipo=tipo,
+        fecha_desde=fecha_desde,
+        fecha_hasta=fecha_hasta,
+    )
+
+
+def _actualizar_usuarios_lote(
+    db: Session,
+    ids: list[str],
+    columna: str,
+    valor_sql: str,
+    params: dict[str, object],
+) -> tuple[list[str], list[str], list[str]]:
+    """
+    UPDATE de `columna` para los usuarios `ids` (sin commit). Devuelve
+    (actualizados, sin cambios, no encontrados) en el orden recibido.
+    """
+    filas = db.execute(
+        text(
+            f"""
+            WITH actualizados AS (
+                UPDATE conexion_carga.users u
+                SET {columna} = {valor_sql}
+                WHERE u.id = ANY(CAST(:ids AS uuid[]))
+                  AND u.{columna} IS DISTINCT FROM {valor_sql}
+                RETURNING u.id
+            )
+            SELECT u.id, a.id IS NOT NULL AS actualizado
+            FROM conexion_carga.users u
+            LEFT JOIN actualizados a
+              ON a.id = u.id
+            WHERE u.id = ANY(CAST(:ids AS uuid[]))
+            """
+        ),
+        {**params, 'ids': ids},
+    ).all()
+
+    estado = {str(fila[0]): bool(fila[1]) for fila in filas}
+    actualizados = [usuario_id for usuario_id in ids if estado.get(usuario_id) is True]
+    sin_cambios = [usuario_id for usuario_id in ids if estado.get(usuario_id) is False]
+    no_encontrados = [usuario_id for usuario_id in ids if usuario_id not in estado]
+    return actualizados, sin_cambios, no_encontrados
+
+
+def _respuesta_lote(
+    ids: list[str],
+    resultado: tuple[list[str], list[str], list[str]],
+    accion: str,
+) -> CambioUsuariosLoteOut:
+    actualizados, sin_cambios, no_encontrados = resultado
+    return CambioUsuariosLoteOut(
+        ok=True,
+        message=f'{len(actualizados)} usuario(s) {accion} correctamente.',
+        solicitados=len(ids),
+        actualizados=actualizados,
+        sin_cambios=sin_cambios,
+        no_encontrados=no_encontrados,
+    )
+
+
+@router.patch('/lote/estado', response_model=CambioUsuariosLoteOut)
+def cambiar_estado_usuarios_lote(
+    payload: CambiarEstadoUsuariosLoteIn,
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    ids = list(dict.fromkeys(str(usuario_id) for usuario_id in payload.ids))
+
+    with registrar_cambio_referidos(db, ids):
+        resultado = _actualizar_usuarios_lote(
+            db,
+            ids,
+            'active',
+            'CAST(:active AS boolean)',
+            {'active': bool(payload.active)},
+        )
+    db.commit()
+
+    return _respuesta_lote(ids, resultado, 'habilitado(s)' if payload.active else 'inhabilitado(s)')
+
+
+@router.patch('/lote/rol', response_model=CambioUsuariosLoteOut)
+def cambiar_rol_usuarios_lote(
+    payload: CambiarRolUsuariosLoteIn,
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    ids = list(dict.fromkeys(str(usuario_id) for usuario_id in payload.ids))
+    rol_id = _obtener_rol_admin_id(db) if payload.is_admin else None
+
+    resultado = _actualizar_usuarios_lote(
+        db,
+        ids,
+        'rol_id',
+        'CAST(:rol_id AS integer)',
+        {'rol_id': rol_id},
+    )
+    db.commit()
+
+    accion = 'asignado(s) como Administrador' if payload.is_admin else 'sin rol de Administrador'
+    return _respuesta_lote(ids, resultado, accion)
+
+
+@router.post('/importacion')
+def importar_usuarios_admin(
+    archivo: UploadFile = File(...),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    """
+    CSV con encabezado `email`, `first_name`, `last_name`, `password` y
+    opcionalmente `phone`, `is_company`, `company_name`, `is_driver`,
+    `is_premium` y `active`. Responde NDJSON con el avance por lote.
+    """
+    try:
+        lector = abrir_csv_importacion(archivo.file)
+    except ImportacionUsuariosInvalidaError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(exc),
+        )
+
+    return StreamingResponse(
+        iterar_importacion_ndjson(lector),
+        media_type='application/x-ndjson',
+    )
 
 
 @router.get('/{usuario_id}', response_model=UsuarioAdminOut)
@@ -401,7 +607,7 @@ def crear_usuario_admin(
     db: Session = Depends(get_db),
     _: models.User = Depends(_asegurar_usuario_admin),
 ):
-    email = _normalizar_email(payload.email)
+    email = normalizar_email(payload.email)
     if not email:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -419,7 +625,7 @@ def crear_usuario_admin(
             """
             SELECT id
             FROM conexion_carga.users
-            WHERE LOWER(email) = LOWER(:email)
+            WHERE LOWER(email) = :email
             LIMIT 1
             """
         ),
@@ -509,6 +715,7 @@ def crear_usuario_admin(
                 'rol_id': rol_id,
             },
         ).scalar()
+        registrar_usuarios_nuevos_referidos(db, [nuevo_id])
         db.commit()
     except IntegrityError:
         db.rollback()
@@ -524,6 +731,7 @@ def crear_usuario_admin(
             detail='No fue posible recuperar el usuario creado.',
         )
 
+    indice_empresas.registrar_usuario(fila['id'], fila['company_name'])
     return _serializar_usuario(fila)
 
 
@@ -549,7 +757,7 @@ def actualizar_usuario_admin(
         cambios.pop('confirm_password', None)
 
     if 'email' in cambios:
-        nuevo_email = _normalizar_email(cambios['email'])
+        nuevo_email = normalizar_email(cambios['email'])
         if not nuevo_email:
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -561,7 +769,7 @@ def actualizar_usuario_admin(
                 """
                 SELECT id
                 FROM conexion_carga.users
-                WHERE LOWER(email) = LOWER(:email)
+                WHERE LOWER(email) = :email
                   AND id <> CAST(:usuario_id AS uuid)
                 LIMIT 1
                 """
@@ -700,16 +908,17 @@ def actualizar_usuario_admin(
         return _serializar_usuario(actual)
 
     try:
-        db.execute(
-            text(
-                f"""
-                UPDATE conexion_carga.users
-                SET {', '.join(set_clauses)}
-                WHERE id = CAST(:usuario_id AS uuid)
-                """
-            ),
-            params,
-        )
+        with registrar_cambio_referidos(db, [usuario_id]):
+            db.execute(
+                text(
+                    f"""
+                    UPDATE conexion_carga.users
+                    SET {', '.join(set_clauses)}
+                    WHERE id = CAST(:usuario_id AS uuid)
+                    """
+                ),
+                params,
+            )
         db.commit()
     except IntegrityError:
         db.rollback()
@@ -725,6 +934,7 @@ def actualizar_usuario_admin(
             detail='No fue posible recuperar el usuario actualizado.',
         )
 
+    indice_empresas.registrar_usuario(actualizado['id'], actualizado['company_name'])
     return _serializar_usuario(actualizado)
 
 
@@ -742,19 +952,20 @@ def cambiar_estado_usuario_admin(
             detail='Usuario no encontrado.',
         )
 
-    db.execute(
-        text(
-            """
-            UPDATE conexion_carga.users
-            SET active = :active
-            WHERE id = CAST(:usuario_id AS uuid)
-            """
-        ),
-        {
-            'active': bool(payload.active),
-            'usuario_id': str(usuario_id),
-        },
-    )
+    with registrar_cambio_referidos(db, [usuario_id]):
+        db.execute(
+            text(
+                """
+                UPDATE conexion_carga.users
+                SET active = :active
+                WHERE id = CAST(:usuario_id AS uuid)
+                """
+            ),
+            {
+                'active': bool(payload.active),
+                'usuario_id': str(usuario_id),
+            },
+        )
     db.commit()
 
     actualizado = _obtener_usuario_por_id(db=db, usuario_id=usuario_id)
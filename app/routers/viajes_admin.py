@@ -2,18 +2,19 @@ from __future__ import annotations
 
 import json
 from datetime import date, datetime, timedelta, timezone
+from itertools import islice
 from decimal import Decimal
-from typing import Any
+from typing import Any, Iterator
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import String, cast, or_, text
+from sqlalchemy import String, cast, literal_column, or_, text
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from app import crud, models, schemas
 from app.db import get_db
-from app.routers.dashboard_admin import _asegurar_usuario_admin
+from app.routers.dashboard_admin import _asegurar_usuario_admin, _filtro_no_eliminado
 from app.schemas_exportacion_admin import (
     ViajeAdminExportOut,
     ViajeEliminadoAdminExportOut,
@@ -21,20 +22,81 @@ from app.schemas_exportacion_admin import (
 from app.schemas_viajes_admin import (
     ActualizarViajeAdminIn,
     CausalEliminacionOut,
+    ConsistenciaEliminadosOut,
     EliminarViajeAdminIn,
     EliminarViajeAdminOut,
+    EliminarViajesLoteAdminIn,
+    EliminarViajesLoteAdminOut,
     FiltroEstadoViajeAdmin,
     ListaViajesAdminOut,
     ListaViajesEliminadosOut,
+    ResultadoEliminacionViajeOut,
     ViajeAdminOut,
     ViajeEliminadoDetalleOut,
     ViajeEliminadoOut,
 )
+from app.services.eliminacion_viajes import (
+    condicion_no_eliminado_sql,
+    marca_eliminado_disponible,
+    marcar_cargas_eliminadas,
+    verificar_consistencia_eliminados,
+)
+from app.services.indice_empresas import indice_empresas
+from app.services.resumen_dashboard import (
+    ajustar_resumen_diario,
+    contribucion_cargas,
+    fecha_local_sql,
+    registrar_cambio_resumen,
+    registrar_vencimientos_resumen,
+)
+from app.services.rutas_carga import guardar_ruta_normalizada
 
 router = APIRouter(prefix='/api/admin', tags=['Admin Viajes'])
 
 MINIMO_OBSERVACION_OTRO = 8
 MAXIMO_OBSERVACION = 2000
+FILAS_LOTE_EXPORTACION = 500
+
+# Proyeccion en SQL de los campos del snapshot que usan listados y exportaciones,
+# con respaldo en la carga original. Evita traer y decodificar snapshot_json por
+# fila; el snapshot completo solo se carga en el detalle. `valor` acepta numeros
+# JSON y textos numericos; la expresion regular evita que un texto invalido
+# haga fallar el CAST de toda la consulta.
+_PROYECCION_SNAPSHOT_ELIMINADO = r"""
+    COALESCE(
+        NULLIF(TRIM(ce.snapshot_json->>'origen'), ''),
+        NULLIF(TRIM(c.origen), '')
+    ) AS origen,
+    COALESCE(
+        NULLIF(TRIM(ce.snapshot_json->>'destino'), ''),
+        NULLIF(TRIM(c.destino), '')
+    ) AS destino,
+    COALESCE(
+        NULLIF(TRIM(ce.snapshot_json->>'tipo_carga'), ''),
+        NULLIF(TRIM(c.tipo_carga), '')
+    ) AS tipo_carga,
+    COALESCE(
+        NULLIF(
+            CASE
+                WHEN jsonb_typeof(ce.snapshot_json->'valor') = 'number'
+                    THEN CAST(ce.snapshot_json->>'valor' AS numeric)
+                WHEN jsonb_typeof(ce.snapshot_json->'valor') = 'string'
+                 AND ce.snapshot_json->>'valor'
+                     ~ '^\s*[+-]?(\d+(\.\d*)?|\.\d+)([eE][+-]?\d{1,3})?\s*$'
+                    THEN CAST(TRIM(ce.snapshot_json->>'valor') AS numeric)
+            END,
+            0
+        ),
+        c.valor,
+        0
+    ) AS valor,
+    NULLIF(TRIM(ce.snapshot_json->>'estado'), '') AS snapshot_estado,
+    c.activo AS carga_activo,
+    c.estado AS carga_estado,
+    ce.snapshot_json->>'fecha_publicacion' AS snapshot_fecha_publicacion,
+    ce.snapshot_json->>'created_at' AS snapshot_created_at,
+    c.created_at AS carga_created_at
+"""
 
 
 def _normalizar_nombre_causal(nombre: str | None) -> str:
@@ -244,9 +306,9 @@ def _asegurar_tablas_eliminacion(db: Session) -> None:
 
 
 def _sincronizar_vigencia_publicaciones(db: Session) -> None:
-    actualizados = db.execute(
+    vencidos = db.execute(
         text(
-            """
+            f"""
             UPDATE conexion_carga.carga c
             SET
                 activo = FALSE,
@@ -256,11 +318,18 @@ def _sincronizar_vigencia_publicaciones(db: Session) -> None:
               AND c.created_at IS NOT NULL
               AND c.duracion_publicacion IS NOT NULL
               AND (c.created_at + c.duracion_publicacion) <= NOW()
+            RETURNING
+                {fecha_local_sql('c.created_at')} AS dia_publicacion,
+                {condicion_no_eliminado_sql(db, 'c')} AS cuenta_en_resumen
             """
         )
-    ).rowcount
+    ).mappings().all()
 
-    if actualizados and int(actualizados) > 0:
+    if vencidos:
+        registrar_vencimientos_resumen(
+            db,
+            [fila['dia_publicacion'] for fila in vencidos if fila['cuenta_en_resumen']],
+        )
         db.commit()
 
 
@@ -305,30 +374,6 @@ def _serializar_viaje_eliminado_desde_fila(
     *,
     incluir_snapshot: bool = False,
 ) -> ViajeEliminadoOut | ViajeEliminadoDetalleOut:
-    snapshot = _normalizar_snapshot_json(fila.get('snapshot_json'))
-
-    origen = _coalescer_texto(snapshot.get('origen'), fila.get('carga_origen'))
-    destino = _coalescer_texto(snapshot.get('destino'), fila.get('carga_destino'))
-    tipo_carga = _coalescer_texto(
-        snapshot.get('tipo_carga'),
-        fila.get('carga_tipo_carga'),
-    )
-
-    valor = _obtener_valor_entero(snapshot.get('valor'))
-    if valor == 0:
-        valor = _obtener_valor_entero(fila.get('carga_valor'))
-
-    estado = _resolver_estado_viaje(
-        snapshot.get('estado'),
-        fila.get('carga_activo'),
-        fila.get('carga_estado'),
-    )
-
-    fecha_publicacion = (
-        _parsear_fecha_iso(snapshot.get('fecha_publicacion'))
-        or _parsear_fecha_iso(fila.get('carga_created_at'))
-    )
-
     eliminado_por = _coalescer_texto(
         fila.get('eliminado_por_nombre'),
         fila.get('eliminado_por_email'),
@@ -343,18 +388,30 @@ def _serializar_viaje_eliminado_desde_fila(
         'observacion': str(fila['observacion']) if fila.get('observacion') else None,
         'eliminado_por': eliminado_por,
         'eliminado_en': _normalizar_fecha(fila.get('eliminado_en')),
-        'origen': origen,
-        'destino': destino,
-        'valor': valor,
+        'origen': _coalescer_texto(fila.get('origen')),
+        'destino': _coalescer_texto(fila.get('destino')),
+        'valor': _obtener_valor_entero(fila.get('valor')),
     }
 
     if not incluir_snapshot:
         return ViajeEliminadoOut(**base_data)
 
+    snapshot = _normalizar_snapshot_json(fila.get('snapshot_json'))
+    # Las fechas del snapshot se interpretan aqui: un valor invalido cae a la
+    # fecha de la carga en vez de hacer fallar la consulta completa.
+    fecha_publicacion = (
+        _parsear_fecha_iso(fila.get('snapshot_fecha_publicacion'))
+        or _parsear_fecha_iso(fila.get('carga_created_at'))
+    )
+
     return ViajeEliminadoDetalleOut(
         **base_data,
-        tipo_carga=tipo_carga,
-        estado=estado,
+        tipo_carga=_coalescer_texto(fila.get('tipo_carga')),
+        estado=_resolver_estado_viaje(
+            fila.get('snapshot_estado'),
+            fila.get('carga_activo'),
+            fila.get('carga_estado'),
+        ),
         fecha_publicacion=fecha_publicacion,
         snapshot_json=snapshot or None,
     )
@@ -369,21 +426,66 @@ def _obtener_viaje_no_eliminado(
         .filter(
             models.Cargo.id == viaje_id,
             models.Cargo.estado == 'publicado',
-            text(
-                """
-                NOT EXISTS (
-                    SELECT 1
-                    FROM conexion_carga.carga_eliminada ce
-                    WHERE ce.carga_id = conexion_carga.carga.id
-                )
-                """
-            ),
+            _filtro_no_eliminado(db),
         )
         .first()
     )
     return viaje
 
 
+def _validar_causal_eliminacion(
+    db: Session,
+    *,
+    causal_id: int,
+    observacion: str | None,
+) -> str:
+    causal = db.execute(
+        text(
+            """
+            SELECT id, nombre, activo
+            FROM conexion_carga.causales_eliminacion
+            WHERE id = :causal_id
+            LIMIT 1
+            """
+        ),
+        {'causal_id': causal_id},
+    ).mappings().first()
+
+    if not causal or not bool(causal['activo']):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail='La causal seleccionada no existe o se encuentra inactiva.',
+        )
+
+    observacion = (observacion or '').strip()
+    causal_nombre = str(causal['nombre'] or '').strip()
+    causal_es_otro = _es_causal_observacion_libre(causal_nombre)
+
+    if causal_es_otro and len(observacion) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail='La observación es obligatoria.',
+        )
+
+    if causal_es_otro and len(observacion) < MINIMO_OBSERVACION_OTRO:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=(
+                f'La observación debe tener mínimo {MINIMO_OBSERVACION_OTRO} caracteres.'
+            ),
+        )
+
+    if observacion and len(observacion) > MAXIMO_OBSERVACION:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=(
+                f'La observación no debe superar {MAXIMO_OBSERVACION} caracteres.'
+            ),
+        )
+
+    return observacion
+
+
 @router.get('/causales-eliminacion', response_model=list[CausalEliminacionOut])
 def obtener_causales_eliminacion(
     db: Session = Depends(get_db),
@@ -443,15 +545,7 @@ def obtener_viajes_admin(
 
     query = db.query(models.Cargo).filter(
         models.Cargo.estado == 'publicado',
-        text(
-            """
-            NOT EXISTS (
-                SELECT 1
-                FROM conexion_carga.carga_eliminada ce
-                WHERE ce.carga_id = conexion_carga.carga.id
-            )
-            """
-        ),
+        _filtro_no_eliminado(db),
     )
 
     if estado == 'activo':
@@ -497,48 +591,16 @@ def obtener_sugerencias_empresas_viajes_admin(
     db: Session = Depends(get_db),
     _: models.User = Depends(_asegurar_usuario_admin),
 ):
-    termino = ' '.join(str(q or '').split())
+    return indice_empresas.buscar(db, q, limit)
 
-    filas = db.execute(
-        text(
-            """
-            WITH empresas_normalizadas AS (
-                SELECT
-                    MIN(REGEXP_REPLACE(TRIM(company_name), '\\s+', ' ', 'g')) AS nombre
-                FROM conexion_carga.users
-                WHERE NULLIF(TRIM(company_name), '') IS NOT NULL
-                  AND (
-                        :termino = ''
-                        OR REGEXP_REPLACE(TRIM(company_name), '\\s+', ' ', 'g') ILIKE :termino_like
-                  )
-                GROUP BY LOWER(REGEXP_REPLACE(TRIM(company_name), '\\s+', ' ', 'g'))
-            )
-            SELECT nombre
-            FROM empresas_normalizadas
-            ORDER BY LOWER(nombre) ASC
-            LIMIT :limit
-            """
-        ),
-        {
-            'termino': termino,
-            'termino_like': f'%{termino}%',
-            'limit': limit,
-        },
-    ).scalars().all()
 
-    return [str(nombre).strip() for nombre in filas if str(nombre or '').strip()]
-
-
-@router.get('/viajes/exportacion', response_model=list[ViajeAdminExportOut])
-def exportar_viajes_admin(
-    q: str = Query(default='', max_length=255),
-    estado: FiltroEstadoViajeAdmin = Query(
-        default='todos',
-        pattern='^(activo|inactivo|todos)$',
-    ),
-    db: Session = Depends(get_db),
-    _: models.User = Depends(_asegurar_usuario_admin),
-):
+def _iterar_exportacion_viajes(
+    db: Session,
+    *,
+    q: str,
+    estado: FiltroEstadoViajeAdmin,
+) -> Iterator[ViajeAdminExportOut]:
+    """Filas de la exportacion leidas por lotes con un cursor del servidor."""
     _asegurar_tablas_eliminacion(db)
     _sincronizar_vigencia_publicaciones(db)
 
@@ -547,15 +609,7 @@ def exportar_viajes_admin(
 
     query = db.query(models.Cargo).filter(
         models.Cargo.estado == 'publicado',
-        text(
-            """
-            NOT EXISTS (
-                SELECT 1
-                FROM conexion_carga.carga_eliminada ce
-                WHERE ce.carga_id = conexion_carga.carga.id
-            )
-            """
-        ),
+        _filtro_no_eliminado(db),
     )
 
     if estado == 'activo':
@@ -578,8 +632,17 @@ def exportar_viajes_admin(
             )
         )
 
-    viajes = query.order_by(models.Cargo.created_at.desc()).all()
+    viajes = iter(
+        query.order_by(models.Cargo.created_at.desc()).yield_per(FILAS_LOTE_EXPORTACION)
+    )
+    while lote := list(islice(viajes, FILAS_LOTE_EXPORTACION)):
+        yield from _filas_exportacion_viajes(db, lote)
+
 
+def _filas_exportacion_viajes(
+    db: Session,
+    viajes: list[models.Cargo],
+) -> Iterator[ViajeAdminExportOut]:
     usuarios_por_id = {
         str(row.id): row
         for row in db.query(
@@ -593,7 +656,6 @@ def exportar_viajes_admin(
         .all()
     }
 
-    resultados: list[ViajeAdminExportOut] = []
     for viaje in viajes:
         publicador = usuarios_por_id.get(str(viaje.comercial_id))
         usuario = _resolver_usuario_publicador(
@@ -621,21 +683,39 @@ def exportar_viajes_admin(
             publicador.company_name if publicador else None,
         )
 
-        resultados.append(
-            ViajeAdminExportOut(
-                id_viaje=str(viaje.id),
-                usuario=usuario,
-                empresa=empresa,
-                origen=viaje.origen,
-                destino=viaje.destino,
-                estado='Activo' if bool(viaje.activo) else 'Inactivo',
-                tipo_carga=viaje.tipo_carga,
-                valor=_obtener_valor_entero(viaje.valor),
-                fecha_creacion=viaje.created_at,
-            )
+        yield ViajeAdminExportOut(
+            id_viaje=str(viaje.id),
+            usuario=usuario,
+            empresa=empresa,
+            origen=viaje.origen,
+            destino=viaje.destino,
+            estado='Activo' if bool(viaje.activo) else 'Inactivo',
+            tipo_carga=viaje.tipo_carga,
+            valor=_obtener_valor_entero(viaje.valor),
+            fecha_creacion=viaje.created_at,
         )
 
-    return resultados
+
+def _obtener_exportacion_viajes(
+    db: Session,
+    *,
+    q: str,
+    estado: FiltroEstadoViajeAdmin,
+) -> list[ViajeAdminExportOut]:
+    return list(_iterar_exportacion_viajes(db, q=q, estado=estado))
+
+
+@router.get('/viajes/exportacion', response_model=list[ViajeAdminExportOut])
+def exportar_viajes_admin(
+    q: str = Query(default='', max_length=255),
+    estado: FiltroEstadoViajeAdmin = Query(
+        default='todos',
+        pattern='^(activo|inactivo|todos)$',
+    ),
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    return _obtener_exportacion_viajes(db, q=q, estado=estado)
 
 
 @router.get('/viajes/{viaje_id}', response_model=ViajeAdminOut)
@@ -732,6 +812,8 @@ def actualizar_viaje_admin(
 
     try:
         db.add(viaje)
+        if 'origen' in cambios or 'destino' in cambios:
+            guardar_ruta_normalizada(db, viaje.id, viaje.origen, viaje.destino)
         db.commit()
         db.refresh(viaje)
     except IntegrityError:
@@ -760,54 +842,114 @@ def eliminar_viaje_admin(
             detail='Viaje no encontrado o ya eliminado.',
         )
 
-    causal = db.execute(
-        text(
-            """
-            SELECT id, nombre, activo
-            FROM conexion_carga.causales_eliminacion
-            WHERE id = :causal_id
-            LIMIT 1
-            """
-        ),
-        {'causal_id': payload.causal_id},
-    ).mappings().first()
+    observacion = _validar_causal_eliminacion(
+        db,
+        causal_id=payload.causal_id,
+        observacion=payload.observacion,
+    )
 
-    if not causal or not bool(causal['activo']):
+    snapshot_json = json.dumps(_snapshot_viaje(viaje))
+
+    try:
+        with registrar_cambio_resumen(db, [viaje.id]):
+            eliminado_id = db.execute(
+                text(
+                    """
+                    INSERT INTO conexion_carga.carga_eliminada (
+                        carga_id,
+                        causal_id,
+                        observacion,
+                        eliminado_por,
+                        eliminado_en,
+                        snapshot_json
+                    )
+                    VALUES (
+                        CAST(:carga_id AS uuid),
+                        :causal_id,
+                        :observacion,
+                        CAST(:eliminado_por AS uuid),
+                        NOW(),
+                        CAST(:snapshot_json AS jsonb)
+                    )
+                    RETURNING id
+                    """
+                ),
+                {
+                    'carga_id': str(viaje.id),
+                    'causal_id': int(payload.causal_id),
+                    'observacion': observacion or None,
+                    'eliminado_por': str(current.id),
+                    'snapshot_json': snapshot_json,
+                },
+            ).scalar()
+            marcar_cargas_eliminadas(db, [viaje.id])
+        db.commit()
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail='La causal seleccionada no existe o se encuentra inactiva.',
+            status_code=status.HTTP_409_CONFLICT,
+            detail='El viaje ya fue eliminado previamente.',
         )
 
-    observacion = (payload.observacion or '').strip()
-    causal_nombre = str(causal['nombre'] or '').strip()
-    causal_es_otro = _es_causal_observacion_libre(causal_nombre)
+    return EliminarViajeAdminOut(
+        ok=True,
+        message='Viaje eliminado correctamente con trazabilidad administrativa.',
+        carga_eliminada_id=str(eliminado_id),
+    )
 
-    if causal_es_otro and len(observacion) == 0:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail='La observación es obligatoria.',
-        )
 
-    if causal_es_otro and len(observacion) < MINIMO_OBSERVACION_OTRO:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail=(
-                f'La observación debe tener mínimo {MINIMO_OBSERVACION_OTRO} caracteres.'
-            ),
-        )
+@router.post('/viajes/eliminar-lote', response_model=EliminarViajesLoteAdminOut)
+def eliminar_viajes_lote_admin(
+    payload: EliminarViajesLoteAdminIn,
+    db: Session = Depends(get_db),
+    current: models.User = Depends(_asegurar_usuario_admin),
+):
+    _asegurar_tablas_eliminacion(db)
 
-    if observacion and len(observacion) > MAXIMO_OBSERVACION:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail=(
-                f'La observación no debe superar {MAXIMO_OBSERVACION} caracteres.'
-            ),
+    observacion = _validar_causal_eliminacion(
+        db,
+        causal_id=payload.causal_id,
+        observacion=payload.observacion,
+    )
+
+    viaje_ids = list(dict.fromkeys(str(viaje_id) for viaje_id in payload.viaje_ids))
+
+    filas = (
+        db.query(
+            models.Cargo,
+            literal_column(
+                """
+                EXISTS (
+                    SELECT 1
+                    FROM conexion_carga.carga_eliminada ce
+                    WHERE ce.carga_id = conexion_carga.carga.id
+                )
+                """
+            ).label('ya_eliminado'),
+        )
+        .filter(
+            models.Cargo.id.in_(viaje_ids),
+            models.Cargo.estado == 'publicado',
         )
+        .all()
+    )
 
-    snapshot_json = json.dumps(_snapshot_viaje(viaje))
+    encontrados = {str(fila.Cargo.id): fila for fila in filas}
+    por_eliminar = [
+        {
+            'carga_id': viaje_id,
+            'snapshot_json': _snapshot_viaje(encontrados[viaje_id].Cargo),
+        }
+        for viaje_id in viaje_ids
+        if viaje_id in encontrados and not encontrados[viaje_id].ya_eliminado
+    ]
 
-    try:
-        eliminado_id = db.execute(
+    eliminados_por_carga: dict[str, str] = {}
+    if por_eliminar:
+        ids_por_eliminar = [fila['carga_id'] for fila in por_eliminar]
+        resumen_antes = contribucion_cargas(db, ids_por_eliminar)
+
+        insertados = db.execute(
             text(
                 """
                 INSERT INTO conexion_carga.carga_eliminada (
@@ -818,37 +960,64 @@ def eliminar_viaje_admin(
                     eliminado_en,
                     snapshot_json
                 )
-                VALUES (
-                    CAST(:carga_id AS uuid),
+                SELECT
+                    x.carga_id,
                     :causal_id,
                     :observacion,
                     CAST(:eliminado_por AS uuid),
                     NOW(),
-                    CAST(:snapshot_json AS jsonb)
-                )
-                RETURNING id
+                    x.snapshot_json
+                FROM jsonb_to_recordset(CAST(:filas AS jsonb))
+                    AS x(carga_id uuid, snapshot_json jsonb)
+                ON CONFLICT DO NOTHING
+                RETURNING id, carga_id
                 """
             ),
             {
-                'carga_id': str(viaje.id),
                 'causal_id': int(payload.causal_id),
                 'observacion': observacion or None,
                 'eliminado_por': str(current.id),
-                'snapshot_json': snapshot_json,
+                'filas': json.dumps(por_eliminar),
             },
-        ).scalar()
-        db.commit()
-    except IntegrityError:
-        db.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail='El viaje ya fue eliminado previamente.',
+        ).mappings().all()
+
+        eliminados_por_carga = {
+            str(fila['carga_id']): str(fila['id']) for fila in insertados
+        }
+        marcar_cargas_eliminadas(db, eliminados_por_carga.keys())
+        ajustar_resumen_diario(db, resumen_antes, contribucion_cargas(db, ids_por_eliminar))
+
+    db.commit()
+
+    resultados: list[ResultadoEliminacionViajeOut] = []
+    for viaje_id in viaje_ids:
+        if viaje_id in eliminados_por_carga:
+            resultado = 'eliminado'
+        elif viaje_id in encontrados:
+            # Incluye los que otro proceso elimino entre la lectura y el INSERT.
+            resultado = 'ya_eliminado'
+        else:
+            resultado = 'no_encontrado'
+
+        resultados.append(
+            ResultadoEliminacionViajeOut(
+                viaje_id=viaje_id,
+                resultado=resultado,
+                carga_eliminada_id=eliminados_por_carga.get(viaje_id),
+            )
         )
 
-    return EliminarViajeAdminOut(
-        ok=True,
-        message='Viaje eliminado correctamente con trazabilidad administrativa.',
-        carga_eliminada_id=str(eliminado_id),
+    eliminados = len(eliminados_por_carga)
+    no_encontrados = sum(1 for r in resultados if r.resultado == 'no_encontrado')
+
+    return EliminarViajesLoteAdminOut(
+        ok=eliminados > 0,
+        message=f'Se eliminaron {eliminados} de {len(viaje_ids)} viajes con trazabilidad administrativa.',
+        total=len(viaje_ids),
+        eliminados=eliminados,
+        ya_eliminados=len(viaje_ids) - eliminados - no_encontrados,
+        no_encontrados=no_encontrados,
+        resultados=resultados,
     )
 
 
@@ -947,17 +1116,10 @@ def obtener_viajes_eliminados_admin(
                 ce.observacion,
                 ce.eliminado_por,
                 ce.eliminado_en,
-                ce.snapshot_json,
                 ca.nombre AS causal_nombre,
                 u.email AS eliminado_por_email,
                 NULLIF(CONCAT_WS(' ', u.first_name, u.last_name), '') AS eliminado_por_nombre,
-                c.origen AS carga_origen,
-                c.destino AS carga_destino,
-                c.valor AS carga_valor,
-                c.tipo_carga AS carga_tipo_carga,
-                c.activo AS carga_activo,
-                c.estado AS carga_estado,
-                c.created_at AS carga_created_at
+                {_PROYECCION_SNAPSHOT_ELIMINADO}
             {from_clause}
             {where_clause}
             ORDER BY ce.eliminado_en DESC
@@ -1065,17 +1227,12 @@ def exportar_viajes_eliminados_admin(
                 ce.observacion,
                 ce.eliminado_por,
                 ce.eliminado_en,
-                ce.snapshot_json,
                 ca.nombre AS causal_nombre,
                 eliminador.email AS eliminado_por_email,
                 NULLIF(CONCAT_WS(' ', eliminador.first_name, eliminador.last_name), '') AS eliminado_por_nombre,
-                c.origen AS carga_origen,
-                c.destino AS carga_destino,
-                c.valor AS carga_valor,
-                c.tipo_carga AS carga_tipo_carga,
-                c.activo AS carga_activo,
-                c.estado AS carga_estado,
-                c.created_at AS carga_created_at,
+                {_PROYECCION_SNAPSHOT_ELIMINADO},
+                ce.snapshot_json->>'comercial' AS snapshot_comercial,
+                ce.snapshot_json->>'empresa' AS snapshot_empresa,
                 c.comercial AS carga_comercial,
                 c.empresa AS carga_empresa,
                 NULLIF(CONCAT_WS(' ', publicador.first_name, publicador.last_name), '') AS publicador_nombre,
@@ -1091,32 +1248,29 @@ def exportar_viajes_eliminados_admin(
 
     resultados: list[ViajeEliminadoAdminExportOut] = []
     for fila in filas:
-        snapshot = _normalizar_snapshot_json(fila.get('snapshot_json'))
         usuario = _resolver_usuario_publicador(
-            snapshot.get('comercial'),
+            fila.get('snapshot_comercial'),
             fila.get('carga_comercial'),
             fila.get('publicador_nombre'),
             fila.get('publicador_email'),
         )
         empresa = _resolver_empresa_publicadora(
-            snapshot.get('empresa'),
+            fila.get('snapshot_empresa'),
             fila.get('carga_empresa'),
             fila.get('publicador_empresa'),
         )
-        fecha_creacion = _parsear_fecha_iso(snapshot.get('created_at'))
-        if fecha_creacion is None:
-            fecha_creacion = _parsear_fecha_iso(fila.get('carga_created_at'))
+        fecha_creacion = (
+            _parsear_fecha_iso(fila.get('snapshot_created_at'))
+            or _parsear_fecha_iso(fila.get('carga_created_at'))
+        )
 
         resultados.append(
             ViajeEliminadoAdminExportOut(
                 id_viaje=str(fila['carga_id']),
                 usuario=usuario,
                 empresa=empresa,
-                origen=_coalescer_texto(snapshot.get('origen'), fila.get('carga_origen')),
-                destino=_coalescer_texto(
-                    snapshot.get('destino'),
-                    fila.get('carga_destino'),
-                ),
+                origen=_coalescer_texto(fila.get('origen')),
+                destino=_coalescer_texto(fila.get('destino')),
                 causal_eliminacion=_normalizar_nombre_causal(
                     str(fila['causal_nombre'] or '')
                 ),
@@ -1129,6 +1283,35 @@ def exportar_viajes_eliminados_admin(
     return resultados
 
 
+@router.get(
+    '/viajes-eliminados/consistencia',
+    response_model=ConsistenciaEliminadosOut,
+)
+def verificar_consistencia_viajes_eliminados_admin(
+    corregir: bool = Query(default=False),
+    db: Session = Depends(get_db),
+    _: models.User = Depends(_asegurar_usuario_admin),
+):
+    _asegurar_tablas_eliminacion(db)
+
+    if not marca_eliminado_disponible(db):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=(
+                'La marca de eliminacion en carga no existe. '
+                'Ejecuta primero el script scripts_sql/03_carga_eliminado_flag.sql.'
+            ),
+        )
+
+    resultado = verificar_consistencia_eliminados(db, corregir=corregir)
+
+    return ConsistenciaEliminadosOut(
+        marcados_sin_registro=resultado['marcados_sin_registro'],
+        registros_sin_marca=resultado['registros_sin_marca'],
+        corregido=corregir,
+    )
+
+
 @router.get('/viajes-eliminados/{registro_id}', response_model=ViajeEliminadoDetalleOut)
 def obtener_detalle_viaje_eliminado_admin(
     registro_id: UUID,
@@ -1139,7 +1322,7 @@ def obtener_detalle_viaje_eliminado_admin(
 
     fila = db.execute(
         text(
-            """
+            f"""
             SELECT
                 ce.id,
                 ce.carga_id,
@@ -1151,13 +1334,7 @@ def obtener_detalle_viaje_eliminado_admin(
                 ca.nombre AS causal_nombre,
                 u.email AS eliminado_por_email,
                 NULLIF(CONCAT_WS(' ', u.first_name, u.last_name), '') AS eliminado_por_nombre,
-                c.origen AS carga_origen,
-                c.destino AS carga_destino,
-                c.valor AS carga_valor,
-                c.tipo_carga AS carga_tipo_carga,
-                c.activo AS carga_activo,
-                c.estado AS carga_estado,
-                c.created_at AS carga_created_at
+                {_PROYECCION_SNAPSHOT_ELIMINADO}
             FROM conexion_carga.carga_eliminada ce
             JOIN conexion_carga.causales_eliminacion ca
               ON ca.id = ce.causal_id
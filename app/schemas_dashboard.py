@@ -1,12 +1,13 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Literal
 
 from pydantic import BaseModel
 
 EstadoDashboard = Literal['publicados', 'activos', 'inactivos', 'eliminados']
 PeriodoDashboard = Literal['mes', 'semana', 'anual']
+GranularidadSerieDashboard = Literal['dia', 'semana', 'mes']
 
 
 class TarjetasResumenOut(BaseModel):
@@ -28,6 +29,22 @@ class ResumenDashboardOut(BaseModel):
     serie: List[PuntoSerieDashboardOut]
 
 
+class PuntoSerieRangoDashboardOut(BaseModel):
+    inicio: date
+    label: str
+    value: int
+
+
+class SerieRangoDashboardOut(BaseModel):
+    desde: date
+    hasta: date
+    granularidad: GranularidadSerieDashboard
+    estado: EstadoDashboard
+    zona_horaria: str
+    tarjetas: TarjetasResumenOut
+    serie: List[PuntoSerieRangoDashboardOut]
+
+
 class UltimoViajePublicadoOut(BaseModel):
     id: str
     origen: str
@@ -41,3 +58,31 @@ class TopHistoricoDashboardOut(BaseModel):
     label: str
     secondary_label: str | None = None
     total: int
+
+
+class ErrorWidgetDashboardOut(BaseModel):
+    widget: str
+    detalle: str
+
+
+class InicioDashboardOut(BaseModel):
+    resumen: ResumenDashboardOut | None = None
+    ultimos_viajes: List[UltimoViajePublicadoOut] | None = None
+    top_usuarios_publicadores: List[TopHistoricoDashboardOut] | None = None
+    top_rutas_publicadas: List[TopHistoricoDashboardOut] | None = None
+    top_empresas_publicadoras: List[TopHistoricoDashboardOut] | None = None
+    errores: List[ErrorWidgetDashboardOut] = []
+
+
+class SuscripcionDashboardEnVivoOut(BaseModel):
+    tipo: Literal['suscrito'] = 'suscrito'
+    desde: date
+    hasta: date
+    zona_horaria: str
+
+
+class DeltasTarjetasDashboardOut(BaseModel):
+    tipo: Literal['deltas_tarjetas'] = 'deltas_tarjetas'
+    desde: date
+    hasta: date
+    tarjetas: TarjetasResumenOut
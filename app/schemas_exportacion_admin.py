@@ -1,9 +1,15 @@
 from __future__ import annotations
 
-from datetime import datetime
-from typing import Optional
+from datetime import date, datetime
+from typing import Any, Literal, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from app.schemas_usuarios_admin import EstadoFiltroUsuarioAdmin, TipoFiltroUsuarioAdmin
+from app.schemas_viajes_admin import FiltroEstadoViajeAdmin
+
+EstadoTrabajoExportacion = Literal['pendiente', 'procesando', 'completado', 'fallido']
+TipoTrabajoExportacion = Literal['viajes', 'usuarios']
 
 
 class UsuarioAdminExportOut(BaseModel):
@@ -40,3 +46,31 @@ class ViajeEliminadoAdminExportOut(BaseModel):
     observacion: Optional[str] = None
     fecha_creacion_viaje: Optional[datetime] = None
     fecha_eliminacion: datetime
+
+
+class TrabajoExportacionViajesIn(BaseModel):
+    q: str = Field(default='', max_length=255)
+    estado: FiltroEstadoViajeAdmin = 'todos'
+
+
+class TrabajoExportacionUsuariosIn(BaseModel):
+    q: str = Field(default='', max_length=255)
+    estado: EstadoFiltroUsuarioAdmin = 'todos'
+    tipo: TipoFiltroUsuarioAdmin = 'todos'
+    fecha_desde: Optional[date] = None
+    fecha_hasta: Optional[date] = None
+
+
+class TrabajoExportacionOut(BaseModel):
+    id: str
+    tipo: TipoTrabajoExportacion
+    filtros: dict[str, Any]
+    estado: EstadoTrabajoExportacion
+    progreso: int = 0
+    filas_procesadas: int = 0
+    total_filas: Optional[int] = None
+    creado_en: datetime
+    actualizado_en: Optional[datetime] = None
+    finalizado_en: Optional[datetime] = None
+    error: Optional[str] = None
+    descarga_url: Optional[str] = None
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
+from uuid import UUID
 
 from pydantic import BaseModel, Field
 
@@ -24,6 +25,7 @@ class ListaUsuariosPuntosAdminOut(BaseModel):
     page: int
     page_size: int
     items: list[UsuarioPuntosAdminOut]
+    next_cursor: Optional[str] = None
 
 
 class ActualizarPuntosAdminIn(BaseModel):
@@ -57,3 +59,74 @@ class QuitarReferidoAdminOut(BaseModel):
     message: str
     parent_user: UsuarioPuntosAdminOut
     removed_referred_id: str
+
+
+class NivelArbolReferidosOut(BaseModel):
+    nivel: int
+    total: int
+    activos: int
+
+
+class ResumenArbolReferidosOut(BaseModel):
+    user_id: str
+    profundidad: int
+    total: int
+    truncado: bool
+    niveles: list[NivelArbolReferidosOut]
+
+
+class AjustePuntosMasivoItemIn(BaseModel):
+    user_id: Optional[UUID] = None
+    email: Optional[str] = Field(default=None, max_length=255)
+    points: int
+
+
+class AjustePuntosMasivoIn(BaseModel):
+    modo: Literal['fijar', 'sumar'] = 'fijar'
+    detalle: Optional[str] = Field(default=None, max_length=500)
+    items: list[AjustePuntosMasivoItemIn] = Field(min_length=1)
+
+
+class AjustePuntosMasivoOut(BaseModel):
+    ok: bool
+    message: str
+    modo: Literal['fijar', 'sumar']
+    filas: int
+    usuarios: int
+    actualizados: int
+    sin_cambios: int
+    no_encontradas: int
+    filas_no_encontradas: list[int] = []
+
+
+class MetricasAuditoriaPuntosOut(BaseModel):
+    modo: Literal['diferido', 'durable']
+    en_cola: int
+    capacidad: int
+    encolados: int
+    escritos: int
+    descartados: int
+    fallos_escritura: int
+    ultimo_vaciado: Optional[datetime] = None
+
+
+class MovimientoPuntosOut(BaseModel):
+    id: int
+    delta: int
+    saldo: int
+    origen: str
+    admin_user_id: Optional[str] = None
+    detalle: Optional[str] = None
+    creado_en: datetime
+
+
+class HistorialPuntosOut(BaseModel):
+    user_id: str
+    items: list[MovimientoPuntosOut]
+    next_cursor: Optional[int] = None
+
+
+class SaldoPuntosOut(BaseModel):
+    user_id: str
+    fecha: datetime
+    saldo: int
@@ -35,6 +35,7 @@ class ListaUsuariosAdminOut(BaseModel):
     page: int
     page_size: int
     items: list[UsuarioAdminOut]
+    next_cursor: Optional[str] = None
 
 
 class CrearUsuarioAdminIn(BaseModel):
@@ -77,3 +78,25 @@ class CambiarEstadoUsuarioAdminOut(BaseModel):
     ok: bool
     message: str
     user: UsuarioAdminOut
+
+
+USUARIOS_LOTE_MAXIMO = 1000
+
+
+class CambiarEstadoUsuariosLoteIn(BaseModel):
+    ids: list[UUID] = Field(min_length=1, max_length=USUARIOS_LOTE_MAXIMO)
+    active: bool
+
+
+class CambiarRolUsuariosLoteIn(BaseModel):
+    ids: list[UUID] = Field(min_length=1, max_length=USUARIOS_LOTE_MAXIMO)
+    is_admin: bool
+
+
+class CambioUsuariosLoteOut(BaseModel):
+    ok: bool
+    message: str
+    solicitados: int
+    actualizados: list[str]
+    sin_cambios: list[str]
+    no_encontrados: list[str]
@@ -76,6 +76,31 @@ class EliminarViajeAdminOut(BaseModel):
     carga_eliminada_id: str
 
 
+ResultadoEliminacionLote = Literal['eliminado', 'ya_eliminado', 'no_encontrado']
+
+
+class EliminarViajesLoteAdminIn(BaseModel):
+    viaje_ids: list[UUID] = Field(min_length=1, max_length=500)
+    causal_id: int = Field(ge=1)
+    observacion: Optional[str] = None
+
+
+class ResultadoEliminacionViajeOut(BaseModel):
+    viaje_id: str
+    resultado: ResultadoEliminacionLote
+    carga_eliminada_id: Optional[str] = None
+
+
+class EliminarViajesLoteAdminOut(BaseModel):
+    ok: bool
+    message: str
+    total: int
+    eliminados: int
+    ya_eliminados: int
+    no_encontrados: int
+    resultados: list[ResultadoEliminacionViajeOut]
+
+
 class ViajeEliminadoOut(BaseModel):
     id: str
     carga_id: str
@@ -101,3 +126,9 @@ class ViajeEliminadoDetalleOut(ViajeEliminadoOut):
     estado: Optional[str] = None
     fecha_publicacion: Optional[datetime] = None
     snapshot_json: Optional[dict[str, Any]] = None
+
+
+class ConsistenciaEliminadosOut(BaseModel):
+    marcados_sin_registro: int = 0
+    registros_sin_marca: int = 0
+    corregido: bool = False
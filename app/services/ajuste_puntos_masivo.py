@@ -0,0 +1,302 @@
+# app/services/ajuste_puntos_masivo.py
+"""
+Ajuste masivo de puntos (promociones) desde CSV o JSON.
+
+Las filas validadas se copian con COPY a una tabla temporal y, resueltos los
+correos, se aplican con una sola sentencia: bloquea a los usuarios, actualiza
+los puntos e inserta la auditoria y los movimientos del libro de todos los
+cambios. Toda la carga es una transaccion: si algo falla no se aplica
+ninguna fila.
+
+Modos:
+- fijar: los puntos quedan en el valor recibido (si un usuario se repite,
+  gana la ultima fila).
+- sumar: el valor recibido (puede ser negativo) se suma a los puntos
+  actuales; las filas repetidas se acumulan y el resultado no baja de 0.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import os
+from dataclasses import dataclass
+from typing import Iterable, Literal
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.estructura_bd import tabla_existe
+from app.services.libro_puntos import cte_movimientos_puntos
+
+ModoAjustePuntos = Literal['fijar', 'sumar']
+
+PUNTOS_MASIVO_MAX_FILAS = int(os.getenv('PUNTOS_MASIVO_MAX_FILAS', '50000'))
+PUNTOS_MAXIMOS = 1000000
+MAXIMO_ERRORES_REPORTADOS = 50
+MAXIMO_FILAS_NO_ENCONTRADAS = 100
+ACCION_AUDITORIA = 'ajuste_masivo'
+
+
+class AjustePuntosInvalidoError(ValueError):
+    def __init__(self, errores: list[str]) -> None:
+        super().__init__('; '.join(errores))
+        self.errores = errores
+
+
+@dataclass
+class FilaAjustePuntos:
+    fila: int
+    user_id: str | None
+    email: str | None
+    points: int
+
+
+def _validar_puntos(valor: object, modo: ModoAjustePuntos) -> int:
+    try:
+        puntos = int(str(valor).strip())
+    except ValueError:
+        raise ValueError('points debe ser un número entero') from None
+    minimo = 0 if modo == 'fijar' else -PUNTOS_MAXIMOS
+    if not minimo <= puntos <= PUNTOS_MAXIMOS:
+        raise ValueError(f'los puntos deben estar entre {minimo} y {PUNTOS_MAXIMOS}')
+    return puntos
+
+
+def validar_filas(
+    filas: Iterable[tuple[int, object, object, object]],
+    modo: ModoAjustePuntos,
+) -> list[FilaAjustePuntos]:
+    """Valida (fila, user_id, email, points); reune los errores en vez de cortar en el primero."""
+    validas: list[FilaAjustePuntos] = []
+    errores: list[str] = []
+
+    for numero, user_id, email, puntos in filas:
+        if len(validas) >= PUNTOS_MASIVO_MAX_FILAS:
+            raise AjustePuntosInvalidoError(
+                [f'La carga supera el máximo de {PUNTOS_MASIVO_MAX_FILAS} filas.']
+            )
+
+        user_id_texto = str(user_id).strip() if user_id not in (None, '') else None
+        email_texto = str(email).strip().lower() if email not in (None, '') else None
+        try:
+            if user_id_texto:
+                try:
+                    user_id_texto = str(UUID(user_id_texto))
+                except ValueError:
+                    raise ValueError('user_id no es un UUID válido') from None
+            elif not email_texto:
+                raise ValueError('se requiere user_id o email')
+            validas.append(
+                FilaAjustePuntos(
+                    fila=numero,
+                    user_id=user_id_texto,
+                    email=None if user_id_texto else email_texto,
+                    points=_validar_puntos(puntos, modo),
+                )
+            )
+        except (TypeError, ValueError) as exc:
+            if len(errores) < MAXIMO_ERRORES_REPORTADOS:
+                errores.append(f'Fila {numero}: {exc}.')
+
+    if errores:
+        raise AjustePuntosInvalidoError(errores)
+    if not validas:
+        raise AjustePuntosInvalidoError(['La carga no contiene filas.'])
+    return validas
+
+
+def leer_csv_ajuste(contenido: bytes, modo: ModoAjustePuntos) -> list[FilaAjustePuntos]:
+    """CSV con encabezado: `points` y `user_id` y/o `email`."""
+    try:
+        texto = contenido.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise AjustePuntosInvalidoError(['El archivo debe estar codificado en UTF-8.'])
+
+    lector = csv.DictReader(io.StringIO(texto))
+    columnas = {(columna or '').strip().lower() for columna in lector.fieldnames or []}
+    if 'points' not in columnas or not columnas & {'user_id', 'email'}:
+        raise AjustePuntosInvalidoError(
+            ['El CSV debe tener la columna points y al menos una de user_id o email.']
+        )
+
+    def _filas():
+        # La fila 1 es el encabezado.
+        for numero, registro in enumerate(lector, start=2):
+            valores = {(clave or '').strip().lower(): valor for clave, valor in registro.items()}
+            if not any((valor or '').strip() for valor in valores.values() if isinstance(valor, str)):
+                continue
+            yield numero, valores.get('user_id'), valores.get('email'), valores.get('points')
+
+    return validar_filas(_filas(), modo)
+
+
+def _copiar_a_tabla_temporal(db: Session, filas: list[FilaAjustePuntos]) -> None:
+    db.execute(
+        text(
+            """
+            CREATE TEMP TABLE ajuste_puntos_masivo (
+                fila INTEGER NOT NULL,
+                user_id UUID NULL,
+                email TEXT NULL,
+                points INTEGER NOT NULL
+            ) ON COMMIT DROP
+            """
+        )
+    )
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for fila in filas:
+        # En COPY csv un campo vacio sin comillas es NULL.
+        escritor.writerow([fila.fila, fila.user_id or '', fila.email or '', fila.points])
+    buffer.seek(0)
+
+    # Misma conexion (y transaccion) que la sesion.
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            'COPY ajuste_puntos_masivo (fila, user_id, email, points) FROM STDIN WITH (FORMAT csv)',
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def aplicar_ajuste_puntos(
+    db: Session,
+    filas: list[FilaAjustePuntos],
+    modo: ModoAjustePuntos,
+    *,
+    admin_user_id: UUID | str | None,
+    detalle: str | None,
+) -> dict[str, object]:
+    """Aplica el ajuste y hace commit; devuelve el resumen de la carga."""
+    try:
+        _copiar_a_tabla_temporal(db, filas)
+
+        db.execute(
+            text(
+                """
+                UPDATE ajuste_puntos_masivo s
+                SET user_id = u.id
+                FROM conexion_carga.users u
+                WHERE s.user_id IS NULL
+                  AND LOWER(u.email) = s.email
+                """
+            )
+        )
+
+        auditoria_cte = ''
+        if tabla_existe(db, 'auditoria_puntos_referidos'):
+            auditoria_cte = """
+                , auditoria AS (
+                    INSERT INTO conexion_carga.auditoria_puntos_referidos (
+                        user_id,
+                        admin_user_id,
+                        accion,
+                        puntos_anteriores,
+                        puntos_nuevos,
+                        detalle
+                    )
+                    SELECT
+                        id,
+                        CAST(:admin_user_id AS uuid),
+                        :accion,
+                        anteriores,
+                        nuevos,
+                        :detalle
+                    FROM actualizados
+                )
+            """
+
+        resultado = db.execute(
+            text(
+                f"""
+                WITH agregado AS (
+                    SELECT
+                        s.user_id,
+                        SUM(s.points) AS suma,
+                        (ARRAY_AGG(s.points ORDER BY s.fila DESC))[1] AS ultimo
+                    FROM ajuste_puntos_masivo s
+                    WHERE s.user_id IS NOT NULL
+                    GROUP BY s.user_id
+                ),
+                actual AS (
+                    SELECT
+                        u.id,
+                        COALESCE(u.points, 0) AS anteriores,
+                        CASE
+                            WHEN :modo = 'sumar'
+                                THEN LEAST(GREATEST(COALESCE(u.points, 0) + a.suma, 0), {PUNTOS_MAXIMOS})
+                            ELSE a.ultimo
+                        END AS nuevos
+                    FROM conexion_carga.users u
+                    JOIN agregado a
+                      ON a.user_id = u.id
+                    FOR UPDATE OF u
+                ),
+                actualizados AS (
+                    UPDATE conexion_carga.users u
+                    SET points = a.nuevos
+                    FROM actual a
+                    WHERE u.id = a.id
+                      AND a.nuevos <> a.anteriores
+                    RETURNING u.id, a.anteriores, a.nuevos
+                )
+                {auditoria_cte}
+                {cte_movimientos_puntos(db, 'actualizados')}
+                SELECT
+                    (SELECT COUNT(*) FROM actual) AS usuarios,
+                    (SELECT COUNT(*) FROM actualizados) AS actualizados,
+                    (
+                        SELECT COALESCE(
+                            ARRAY_AGG(s.fila ORDER BY s.fila),
+                            CAST(ARRAY[] AS integer[])
+                        )
+                        FROM (
+                            SELECT s.fila
+                            FROM ajuste_puntos_masivo s
+                            LEFT JOIN conexion_carga.users u
+                              ON u.id = s.user_id
+                            WHERE u.id IS NULL
+                            ORDER BY s.fila
+                            LIMIT :maximo_no_encontradas
+                        ) s
+                    ) AS filas_no_encontradas,
+                    (
+                        SELECT COUNT(*)
+                        FROM ajuste_puntos_masivo s
+                        LEFT JOIN conexion_carga.users u
+                          ON u.id = s.user_id
+                        WHERE u.id IS NULL
+                    ) AS no_encontradas
+                """
+            ),
+            {
+                'modo': modo,
+                'admin_user_id': str(admin_user_id) if admin_user_id else None,
+                'accion': ACCION_AUDITORIA,
+                'origen': ACCION_AUDITORIA,
+                'detalle': detalle,
+                'maximo_no_encontradas': MAXIMO_FILAS_NO_ENCONTRADAS,
+            },
+        ).mappings().one()
+
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    usuarios = int(resultado['usuarios'] or 0)
+    actualizados = int(resultado['actualizados'] or 0)
+    return {
+        'modo': modo,
+        'filas': len(filas),
+        'usuarios': usuarios,
+        'actualizados': actualizados,
+        'sin_cambios': usuarios - actualizados,
+        'no_encontradas': int(resultado['no_encontradas'] or 0),
+        'filas_no_encontradas': list(resultado['filas_no_encontradas'] or []),
+    }
@@ -0,0 +1,198 @@
+# app/services/arbol_referidos.py
+"""
+Arbol de referidos de un usuario (todos los niveles) para revision de fraude.
+
+El subarbol se recorre con un CTE recursivo sobre users.referred_by_id
+(indice ix_users_referred_by_id, scripts_sql/07_users_contadores_referidos.sql)
+acotado por profundidad y cantidad de nodos. Cada rama lleva la ruta de ids
+recorrida para cortar ciclos creados al editar referred_by_id.
+
+Los nodos se transmiten como NDJSON con una sesion propia y cursor del lado
+del servidor; el resumen por nivel se cachea por usuario.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from datetime import date, datetime
+from typing import Iterator
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.services.cache_resultados import CacheResultados
+
+ARBOL_REFERIDOS_PROFUNDIDAD_MAXIMA = int(os.getenv('ARBOL_REFERIDOS_PROFUNDIDAD_MAXIMA', '10'))
+ARBOL_REFERIDOS_NODOS_MAXIMOS = int(os.getenv('ARBOL_REFERIDOS_NODOS_MAXIMOS', '10000'))
+FILAS_POR_LOTE = 500
+
+_cache_resumen_arbol = CacheResultados(
+    'arbol_referidos',
+    ttl_segundos=int(os.getenv('ARBOL_REFERIDOS_CACHE_TTL_SEGUNDOS', '300')),
+    stale_segundos=int(os.getenv('ARBOL_REFERIDOS_CACHE_STALE_SEGUNDOS', '900')),
+)
+
+# Sin ORDER BY: PostgreSQL deja de iterar el CTE al alcanzar el LIMIT externo.
+_CTE_ARBOL = """
+    WITH RECURSIVE arbol AS (
+        SELECT
+            u.id,
+            u.referred_by_id,
+            1 AS nivel,
+            ARRAY[CAST(:raiz AS uuid), u.id] AS ruta
+        FROM conexion_carga.users u
+        WHERE u.referred_by_id = CAST(:raiz AS uuid)
+          AND u.id <> CAST(:raiz AS uuid)
+
+        UNION ALL
+
+        SELECT
+            h.id,
+            h.referred_by_id,
+            a.nivel + 1,
+            a.ruta || h.id
+        FROM arbol a
+        JOIN conexion_carga.users h
+          ON h.referred_by_id = a.id
+        WHERE a.nivel < :profundidad
+          AND NOT h.id = ANY(a.ruta)
+    ),
+    acotado AS (
+        SELECT id, referred_by_id, nivel
+        FROM arbol
+        LIMIT :limite
+    )
+"""
+
+
+def _params_arbol(raiz: UUID | str, profundidad: int, limite: int) -> dict[str, object]:
+    return {
+        'raiz': str(raiz),
+        'profundidad': profundidad,
+        # Un nodo extra indica que el arbol se trunco.
+        'limite': limite + 1,
+    }
+
+
+def _calcular_resumen_arbol(
+    db: Session,
+    raiz: UUID | str,
+    profundidad: int,
+    limite: int,
+) -> dict[str, object]:
+    filas = db.execute(
+        text(
+            f"""
+            {_CTE_ARBOL}
+            SELECT
+                a.nivel,
+                COUNT(*) AS total,
+                COUNT(*) FILTER (WHERE u.active IS TRUE) AS activos
+            FROM acotado a
+            JOIN conexion_carga.users u
+              ON u.id = a.id
+            GROUP BY a.nivel
+            ORDER BY a.nivel
+            """
+        ),
+        _params_arbol(raiz, profundidad, limite),
+    ).mappings().all()
+
+    niveles = [
+        {'nivel': int(fila['nivel']), 'total': int(fila['total']), 'activos': int(fila['activos'])}
+        for fila in filas
+    ]
+    total = sum(nivel['total'] for nivel in niveles)
+    truncado = total > limite
+    if truncado:
+        # El nodo sobrante pertenece al ultimo nivel recorrido.
+        niveles[-1]['total'] -= 1
+        total -= 1
+
+    return {
+        'user_id': str(raiz),
+        'profundidad': profundidad,
+        'total': total,
+        'truncado': truncado,
+        'niveles': niveles,
+    }
+
+
+def obtener_resumen_arbol(
+    db: Session,
+    raiz: UUID | str,
+    profundidad: int,
+    limite: int,
+) -> tuple[dict[str, object], float]:
+    """Tamano del subarbol por nivel (cacheado); devuelve (resumen, edad)."""
+    return _cache_resumen_arbol.obtener(
+        db,
+        (str(raiz), profundidad, limite),
+        lambda sesion: _calcular_resumen_arbol(sesion, raiz, profundidad, limite),
+    )
+
+
+def _valor_json(valor: object) -> object:
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _linea(evento: dict[str, object]) -> bytes:
+    return (json.dumps(evento, default=_valor_json, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def iterar_arbol_ndjson(
+    raiz: UUID | str,
+    profundidad: int,
+    limite: int,
+    resumen: dict[str, object],
+) -> Iterator[bytes]:
+    """
+    Lineas NDJSON: el resumen, un `nodo` por referido (en el orden del
+    recorrido, nivel a nivel) y un `fin`.
+    Usa su propia sesion: la del request se cierra antes de terminar el envio.
+    """
+    yield _linea({'tipo': 'resumen', **resumen})
+
+    db = SessionLocal()
+    enviados = 0
+    truncado = False
+    try:
+        resultado = db.execute(
+            text(
+                f"""
+                {_CTE_ARBOL}
+                SELECT
+                    a.id,
+                    a.referred_by_id AS parent_id,
+                    a.nivel,
+                    u.email,
+                    u.first_name,
+                    u.last_name,
+                    u.active,
+                    u.created_at
+                FROM acotado a
+                JOIN conexion_carga.users u
+                  ON u.id = a.id
+                """
+            ),
+            _params_arbol(raiz, profundidad, limite),
+            execution_options={'stream_results': True, 'yield_per': FILAS_POR_LOTE},
+        ).mappings()
+
+        for fila in resultado:
+            if enviados >= limite:
+                truncado = True
+                break
+            enviados += 1
+            yield _linea({'tipo': 'nodo', **fila})
+
+        resultado.close()
+    finally:
+        db.close()
+
+    yield _linea({'tipo': 'fin', 'nodos': enviados, 'truncado': truncado})
@@ -0,0 +1,258 @@
+# app/services/auditoria_puntos.py
+"""
+Sumidero de auditoria de puntos (conexion_carga.auditoria_puntos_referidos).
+
+Modo `diferido` (por defecto): cada evento se adjunta a la sesion y, solo si
+esta hace commit, pasa a una cola acotada en memoria. Un hilo la vacia por
+lotes (al llegar a AUDITORIA_PUNTOS_LOTE eventos o cada
+AUDITORIA_PUNTOS_INTERVALO_SEGUNDOS) con un solo INSERT por lote. Con la cola
+llena los eventos se descartan y se cuentan; al apagar se vacia lo pendiente.
+Si la tabla tiene created_at, cada evento guarda la hora del cambio (no la
+del vaciado), asi que el orden de la auditoria coincide con el del libro de
+puntos.
+
+Modo `durable` (AUDITORIA_PUNTOS_MODO=durable): el INSERT se hace en la misma
+transaccion que el cambio de puntos, como antes.
+
+Sin la tabla de auditoria los eventos se ignoran en ambos modos.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any
+from uuid import UUID
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.services.estructura_bd import columna_existe, tabla_existe
+
+logger = logging.getLogger(__name__)
+
+TABLA_AUDITORIA = 'auditoria_puntos_referidos'
+AUDITORIA_PUNTOS_MODO = os.getenv('AUDITORIA_PUNTOS_MODO', 'diferido').strip().lower()
+AUDITORIA_PUNTOS_MAX_COLA = int(os.getenv('AUDITORIA_PUNTOS_MAX_COLA', '10000'))
+AUDITORIA_PUNTOS_LOTE = int(os.getenv('AUDITORIA_PUNTOS_LOTE', '500'))
+AUDITORIA_PUNTOS_INTERVALO_SEGUNDOS = float(os.getenv('AUDITORIA_PUNTOS_INTERVALO_SEGUNDOS', '2'))
+
+_CLAVE_PENDIENTES = 'auditoria_puntos_pendientes'
+
+_COLUMNAS_EVENTO = (
+    ('user_id', 'uuid'),
+    ('admin_user_id', 'uuid'),
+    ('accion', 'text'),
+    ('puntos_anteriores', 'integer'),
+    ('puntos_nuevos', 'integer'),
+    ('detalle', 'text'),
+)
+
+
+def _sql_insertar_lote(con_fecha_evento: bool):
+    columnas = list(_COLUMNAS_EVENTO)
+    if con_fecha_evento:
+        columnas.append(('created_at', 'timestamptz'))
+
+    return text(
+        f"""
+        INSERT INTO conexion_carga.auditoria_puntos_referidos (
+            {', '.join(nombre for nombre, _ in columnas)}
+        )
+        SELECT {', '.join(f'x.{nombre}' for nombre, _ in columnas)}
+        FROM jsonb_to_recordset(CAST(:eventos AS jsonb)) AS x(
+            {', '.join(f'{nombre} {tipo}' for nombre, tipo in columnas)}
+        )
+        """
+    )
+
+
+_SQL_INSERTAR_LOTE = {
+    True: _sql_insertar_lote(con_fecha_evento=True),
+    False: _sql_insertar_lote(con_fecha_evento=False),
+}
+
+
+def _insertar_eventos(db: Session, eventos: list[dict[str, Any]]) -> None:
+    # La hora del evento solo se escribe si la tabla tiene created_at; si no,
+    # se omite y cada fila queda con lo que defina la tabla.
+    con_fecha_evento = columna_existe(db, TABLA_AUDITORIA, 'created_at')
+    db.execute(_SQL_INSERTAR_LOTE[con_fecha_evento], {'eventos': json.dumps(eventos)})
+
+
+def _ahora_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class SumideroAuditoriaPuntos:
+    def __init__(
+        self,
+        *,
+        durable: bool,
+        capacidad: int,
+        lote: int,
+        intervalo_segundos: float,
+    ) -> None:
+        self.durable = durable
+        self._capacidad = capacidad
+        self._lote = lote
+        self._intervalo_segundos = intervalo_segundos
+        self._cola: deque[dict[str, Any]] = deque()
+        self._condicion = threading.Condition()
+        self._hilo: threading.Thread | None = None
+        self._detenido = False
+        self._encolados = 0
+        self._escritos = 0
+        self._descartados = 0
+        self._fallos_escritura = 0
+        self._ultimo_vaciado: str | None = None
+
+    def registrar(
+        self,
+        db: Session,
+        *,
+        user_id: UUID | str,
+        admin_user_id: UUID | str | None,
+        accion: str,
+        puntos_anteriores: int,
+        puntos_nuevos: int,
+        detalle: str | None,
+    ) -> None:
+        evento = {
+            'user_id': str(user_id),
+            'admin_user_id': str(admin_user_id) if admin_user_id else None,
+            'accion': accion,
+            'puntos_anteriores': puntos_anteriores,
+            'puntos_nuevos': puntos_nuevos,
+            'detalle': detalle,
+            'created_at': _ahora_iso(),
+        }
+
+        if self.durable:
+            if tabla_existe(db, TABLA_AUDITORIA):
+                _insertar_eventos(db, [evento])
+            return
+
+        # Se encola al hacer commit: un cambio revertido no deja auditoria.
+        db.info.setdefault(_CLAVE_PENDIENTES, []).append(evento)
+
+    def encolar(self, eventos: list[dict[str, Any]]) -> None:
+        with self._condicion:
+            for evento in eventos:
+                if self._detenido or len(self._cola) >= self._capacidad:
+                    self._descartados += 1
+                    continue
+                self._cola.append(evento)
+                self._encolados += 1
+
+            if self._hilo is None and not self._detenido:
+                self._hilo = threading.Thread(
+                    target=self._trabajar,
+                    name='auditoria-puntos',
+                    daemon=True,
+                )
+                self._hilo.start()
+            if len(self._cola) >= self._lote:
+                self._condicion.notify()
+
+    def metricas(self) -> dict[str, Any]:
+        with self._condicion:
+            return {
+                'modo': 'durable' if self.durable else 'diferido',
+                'en_cola': len(self._cola),
+                'capacidad': self._capacidad,
+                'encolados': self._encolados,
+                'escritos': self._escritos,
+                'descartados': self._descartados,
+                'fallos_escritura': self._fallos_escritura,
+                'ultimo_vaciado': self._ultimo_vaciado,
+            }
+
+    def detener(self, timeout_segundos: float = 10.0) -> None:
+        """Deja de aceptar eventos y escribe lo pendiente."""
+        with self._condicion:
+            self._detenido = True
+            hilo = self._hilo
+            self._condicion.notify_all()
+
+        if hilo is not None:
+            hilo.join(timeout_segundos)
+
+    def _tomar_lote(self) -> list[dict[str, Any]]:
+        with self._condicion:
+            if not self._detenido and len(self._cola) < self._lote:
+                self._condicion.wait(self._intervalo_segundos)
+            return [self._cola.popleft() for _ in range(min(self._lote, len(self._cola)))]
+
+    def _trabajar(self) -> None:
+        while True:
+            lote = self._tomar_lote()
+            if lote:
+                if not self._escribir(lote):
+                    self._devolver(lote)
+                    with self._condicion:
+                        if self._detenido:
+                            # Sin BD al apagar: no reintentar indefinidamente.
+                            self._descartados += len(self._cola)
+                            self._cola.clear()
+                            return
+                    time.sleep(self._intervalo_segundos)
+                continue
+
+            with self._condicion:
+                if self._detenido and not self._cola:
+                    self._hilo = None
+                    return
+
+    def _escribir(self, lote: list[dict[str, Any]]) -> bool:
+        db = SessionLocal()
+        try:
+            if tabla_existe(db, TABLA_AUDITORIA):
+                _insertar_eventos(db, lote)
+                db.commit()
+            with self._condicion:
+                self._escritos += len(lote)
+                self._ultimo_vaciado = _ahora_iso()
+            return True
+        except Exception:
+            db.rollback()
+            logger.exception('No fue posible escribir %s eventos de auditoria de puntos', len(lote))
+            with self._condicion:
+                self._fallos_escritura += 1
+            return False
+        finally:
+            db.close()
+
+    def _devolver(self, lote: list[dict[str, Any]]) -> None:
+        with self._condicion:
+            espacio = max(self._capacidad - len(self._cola), 0)
+            self._descartados += max(len(lote) - espacio, 0)
+            # Se conservan los mas antiguos, al frente de la cola.
+            for evento in reversed(lote[:espacio]):
+                self._cola.appendleft(evento)
+
+
+sumidero_auditoria_puntos = SumideroAuditoriaPuntos(
+    durable=AUDITORIA_PUNTOS_MODO == 'durable',
+    capacidad=AUDITORIA_PUNTOS_MAX_COLA,
+    lote=AUDITORIA_PUNTOS_LOTE,
+    intervalo_segundos=AUDITORIA_PUNTOS_INTERVALO_SEGUNDOS,
+)
+
+
+@event.listens_for(SessionLocal, 'after_commit')
+def _encolar_auditoria_confirmada(session: Session) -> None:
+    pendientes = session.info.pop(_CLAVE_PENDIENTES, None)
+    if pendientes:
+        sumidero_auditoria_puntos.encolar(pendientes)
+
+
+@event.listens_for(SessionLocal, 'after_soft_rollback')
+def _descartar_auditoria_revertida(session: Session, transaccion) -> None:
+    session.info.pop(_CLAVE_PENDIENTES, None)
@@ -0,0 +1,50 @@
+# app/services/busqueda_usuarios.py
+"""
+Filtro de texto libre sobre conexion_carga.users.
+
+Con scripts_sql/10_users_busqueda_trigram.sql se filtra con un solo LIKE sobre
+la columna generada users.busqueda (indice GIN de trigramas), sin distinguir
+tildes ni mayusculas. Sin el script se usan los ILIKE por campo de siempre.
+"""
+
+from __future__ import annotations
+
+from sqlalchemy.orm import Session
+
+from app.services.estructura_bd import columna_existe
+from app.services.normalizacion import normalizar_busqueda_usuario
+
+
+def busqueda_usuarios_disponible(db: Session) -> bool:
+    return columna_existe(db, 'users', 'busqueda')
+
+
+def _escapar_like(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def filtro_busqueda_usuarios(
+    db: Session,
+    termino: str,
+    alias: str = 'u',
+) -> tuple[str, dict[str, object]]:
+    """Condicion SQL y parametros para buscar `termino` en los usuarios."""
+    if busqueda_usuarios_disponible(db):
+        return (
+            f'{alias}.busqueda LIKE :q_busqueda',
+            {'q_busqueda': f'%{_escapar_like(normalizar_busqueda_usuario(termino))}%'},
+        )
+
+    return (
+        f"""
+        (
+            COALESCE({alias}.email, '') ILIKE :q_like
+            OR COALESCE({alias}.first_name, '') ILIKE :q_like
+            OR COALESCE({alias}.last_name, '') ILIKE :q_like
+            OR COALESCE({alias}.phone, '') ILIKE :q_like
+            OR COALESCE({alias}.company_name, '') ILIKE :q_like
+            OR COALESCE({alias}.first_name || ' ' || {alias}.last_name, '') ILIKE :q_like
+        )
+        """,
+        {'q_like': f'%{termino}%'},
+    )
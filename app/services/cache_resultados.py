@@ -0,0 +1,152 @@
+# app/services/cache_resultados.py
+"""
+Cache en memoria de resultados calculados desde BD, compartida por todas las
+peticiones del proceso.
+
+- Dentro del TTL se sirve el valor guardado.
+- Vencido pero dentro de la ventana `stale`, se sirve el valor anterior y se
+  recalcula en segundo plano con su propia sesion (stale-while-revalidate).
+- Sin valor utilizable, solo la primera peticion calcula; las concurrentes
+  para la misma clave esperan ese resultado (single-flight).
+- Con `db=None` la sesion se abre solo si hay que calcular; `configurar_sesion`
+  se aplica a toda sesion propia de la cache (p. ej. statement_timeout).
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+CalculoResultado = Callable[[Session], Any]
+ConfiguracionSesion = Callable[[Session], None]
+
+
+@dataclass
+class _Entrada:
+    valor: Any
+    calculado_en: float
+
+
+class CacheResultados:
+    def __init__(
+        self,
+        nombre: str,
+        ttl_segundos: int,
+        stale_segundos: int,
+        max_entradas: int = 256,
+        espera_maxima_segundos: float = 30.0,
+        configurar_sesion: ConfiguracionSesion | None = None,
+    ) -> None:
+        self._nombre = nombre
+        self._ttl_segundos = ttl_segundos
+        self._stale_segundos = stale_segundos
+        self._max_entradas = max_entradas
+        self._espera_maxima_segundos = espera_maxima_segundos
+        self._configurar_sesion = configurar_sesion
+        self._lock = threading.Lock()
+        self._entradas: dict[Hashable, _Entrada] = {}
+        self._en_curso: dict[Hashable, threading.Event] = {}
+        self._refrescando: set[Hashable] = set()
+
+    @property
+    def habilitada(self) -> bool:
+        return self._ttl_segundos > 0
+
+    def obtener(
+        self,
+        db: Session | None,
+        clave: Hashable,
+        calcular: CalculoResultado,
+        espera_maxima_segundos: float | None = None,
+    ) -> tuple[Any, float]:
+        """
+        Devuelve (valor, edad en segundos) para `clave`. `espera_maxima_segundos`
+        reemplaza el limite de espera por el calculo de otra peticion.
+        """
+        if not self.habilitada:
+            return self._calcular(db, calcular), 0.0
+
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                edad = time.monotonic() - entrada.calculado_en
+                if edad < self._ttl_segundos:
+                    return entrada.valor, edad
+
+                if edad < self._ttl_segundos + self._stale_segundos:
+                    if clave not in self._refrescando:
+                        self._refrescando.add(clave)
+                        threading.Thread(
+                            target=self._refrescar,
+                            args=(clave, calcular),
+                            name=f'cache-{self._nombre}',
+                            daemon=True,
+                        ).start()
+                    return entrada.valor, edad
+
+            evento = self._en_curso.get(clave)
+            es_lider = evento is None
+            if es_lider:
+                evento = threading.Event()
+                self._en_curso[clave] = evento
+
+        if not es_lider:
+            if espera_maxima_segundos is None:
+                espera_maxima_segundos = self._espera_maxima_segundos
+            evento.wait(espera_maxima_segundos)
+            with self._lock:
+                entrada = self._entradas.get(clave)
+            if entrada is not None:
+                return entrada.valor, time.monotonic() - entrada.calculado_en
+            # El calculo lider fallo o tardo demasiado: calcular sin cachear.
+            return self._calcular(db, calcular), 0.0
+
+        try:
+            valor = self._calcular(db, calcular)
+            self._guardar(clave, valor)
+            return valor, 0.0
+        finally:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+            evento.set()
+
+    def invalidar(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+
+    def _guardar(self, clave: Hashable, valor: Any) -> None:
+        with self._lock:
+            self._entradas[clave] = _Entrada(valor=valor, calculado_en=time.monotonic())
+            if len(self._entradas) > self._max_entradas:
+                mas_antigua = min(self._entradas, key=lambda k: self._entradas[k].calculado_en)
+                self._entradas.pop(mas_antigua, None)
+
+    def _calcular(self, db: Session | None, calcular: CalculoResultado) -> Any:
+        if db is not None:
+            return calcular(db)
+
+        db = SessionLocal()
+        try:
+            if self._configurar_sesion is not None:
+                self._configurar_sesion(db)
+            return calcular(db)
+        finally:
+            db.close()
+
+    def _refrescar(self, clave: Hashable, calcular: CalculoResultado) -> None:
+        try:
+            self._guardar(clave, self._calcular(None, calcular))
+        except Exception:
+            logger.exception('No fue posible refrescar la cache %s para %r', self._nombre, clave)
+        finally:
+            with self._lock:
+                self._refrescando.discard(clave)
@@ -0,0 +1,198 @@
+# app/services/contadores_publicacion.py
+"""
+Contadores historicos de viajes publicados por usuario y por empresa
+(scripts_sql/06_contadores_publicacion.sql).
+
+Cuentan todos los viajes con estado 'publicado', incluidos los eliminados
+administrativamente, igual que los rankings historicos del dashboard. Se
+incrementan en la transaccion que crea el viaje; la eliminacion no los cambia
+porque la carga se conserva. La empresa de un viaje sin `empresa` propia se
+toma del company_name actual del publicador: si este cambia, la tarea de
+reconciliacion mueve el conteo en su siguiente ejecucion.
+"""
+
+from __future__ import annotations
+
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.estructura_bd import tabla_existe
+from app.services.tareas_periodicas import ejecutar_con_bloqueo
+
+TABLA_USUARIOS = 'dashboard_publicaciones_usuario'
+TABLA_EMPRESAS = 'dashboard_publicaciones_empresa'
+
+_EXPRESION_EMPRESA = "COALESCE(NULLIF(TRIM(c.empresa), ''), NULLIF(TRIM(u.company_name), ''))"
+
+
+def contadores_publicacion_disponibles(db: Session) -> bool:
+    return tabla_existe(db, TABLA_USUARIOS) and tabla_existe(db, TABLA_EMPRESAS)
+
+
+def registrar_publicacion_contadores(db: Session, carga_id: UUID | str) -> None:
+    """Suma la carga a los contadores de su publicador y su empresa (sin commit)."""
+    if not contadores_publicacion_disponibles(db):
+        return
+
+    db.execute(
+        text(
+            f"""
+            WITH publicada AS (
+                SELECT
+                    c.comercial_id,
+                    c.created_at,
+                    {_EXPRESION_EMPRESA} AS empresa
+                FROM conexion_carga.carga c
+                LEFT JOIN conexion_carga.users u
+                  ON u.id = c.comercial_id
+                WHERE c.id = CAST(:carga_id AS uuid)
+                  AND c.estado = 'publicado'
+            ),
+            por_usuario AS (
+                INSERT INTO conexion_carga.dashboard_publicaciones_usuario AS t (
+                    usuario_id,
+                    total,
+                    primera_publicacion,
+                    actualizado_en
+                )
+                SELECT comercial_id, 1, created_at, NOW()
+                FROM publicada
+                ON CONFLICT (usuario_id) DO UPDATE
+                SET
+                    total = t.total + 1,
+                    primera_publicacion = LEAST(t.primera_publicacion, EXCLUDED.primera_publicacion),
+                    actualizado_en = NOW()
+            )
+            INSERT INTO conexion_carga.dashboard_publicaciones_empresa AS t (
+                empresa,
+                total,
+                primera_publicacion,
+                actualizado_en
+            )
+            SELECT empresa, 1, created_at, NOW()
+            FROM publicada
+            WHERE empresa IS NOT NULL
+            ON CONFLICT (empresa) DO UPDATE
+            SET
+                total = t.total + 1,
+                primera_publicacion = LEAST(t.primera_publicacion, EXCLUDED.primera_publicacion),
+                actualizado_en = NOW()
+            """
+        ),
+        {'carga_id': str(carga_id)},
+    )
+
+
+def reconciliar_contadores_publicacion(db: Session) -> dict[str, int]:
+    """
+    Recalcula ambos contadores desde conexion_carga.carga, corrige las filas
+    con diferencias y hace commit. Devuelve cuantas filas se corrigieron.
+    """
+    usuarios = db.execute(
+        text(
+            """
+            WITH fuente AS (
+                SELECT
+                    c.comercial_id AS usuario_id,
+                    COUNT(*) AS total,
+                    MIN(c.created_at) AS primera_publicacion
+                FROM conexion_carga.carga c
+                WHERE c.estado = 'publicado'
+                GROUP BY c.comercial_id
+            ),
+            diferencias AS (
+                SELECT
+                    COALESCE(f.usuario_id, t.usuario_id) AS usuario_id,
+                    COALESCE(f.total, 0) AS total,
+                    f.primera_publicacion
+                FROM fuente f
+                FULL JOIN conexion_carga.dashboard_publicaciones_usuario t
+                  ON t.usuario_id = f.usuario_id
+                WHERE (COALESCE(f.total, 0), f.primera_publicacion)
+                      IS DISTINCT FROM (COALESCE(t.total, 0), t.primera_publicacion)
+            )
+            INSERT INTO conexion_carga.dashboard_publicaciones_usuario (
+                usuario_id,
+                total,
+                primera_publicacion,
+                actualizado_en
+            )
+            SELECT usuario_id, total, primera_publicacion, NOW()
+            FROM diferencias
+            ON CONFLICT (usuario_id) DO UPDATE
+            SET
+                total = EXCLUDED.total,
+                primera_publicacion = EXCLUDED.primera_publicacion,
+                actualizado_en = NOW()
+            RETURNING usuario_id
+            """
+        )
+    ).scalars().all()
+
+    empresas = db.execute(
+        text(
+            f"""
+            WITH fuente AS (
+                SELECT
+                    {_EXPRESION_EMPRESA} AS empresa,
+                    COUNT(*) AS total,
+                    MIN(c.created_at) AS primera_publicacion
+                FROM conexion_carga.carga c
+                LEFT JOIN conexion_carga.users u
+                  ON u.id = c.comercial_id
+                WHERE c.estado = 'publicado'
+                  AND {_EXPRESION_EMPRESA} IS NOT NULL
+                GROUP BY 1
+            ),
+            diferencias AS (
+                SELECT
+                    COALESCE(f.empresa, t.empresa) AS empresa,
+                    COALESCE(f.total, 0) AS total,
+                    f.primera_publicacion
+                FROM fuente f
+                FULL JOIN conexion_carga.dashboard_publicaciones_empresa t
+                  ON t.empresa = f.empresa
+                WHERE (COALESCE(f.total, 0), f.primera_publicacion)
+                      IS DISTINCT FROM (COALESCE(t.total, 0), t.primera_publicacion)
+            )
+            INSERT INTO conexion_carga.dashboard_publicaciones_empresa (
+                empresa,
+                total,
+                primera_publicacion,
+                actualizado_en
+            )
+            SELECT empresa, total, primera_publicacion, NOW()
+            FROM diferencias
+            ON CONFLICT (empresa) DO UPDATE
+            SET
+                total = EXCLUDED.total,
+                primera_publicacion = EXCLUDED.primera_publicacion,
+                actualizado_en = NOW()
+            RETURNING empresa
+            """
+        )
+    ).scalars().all()
+
+    # Empresas renombradas quedan en cero: no aportan al ranking.
+    db.execute(
+        text(
+            """
+            DELETE FROM conexion_carga.dashboard_publicaciones_empresa
+            WHERE total <= 0
+            """
+        )
+    )
+    db.commit()
+
+    return {'usuarios': len(usuarios), 'empresas': len(empresas)}
+
+
+def _reconciliar_si_disponible(db: Session) -> None:
+    if contadores_publicacion_disponibles(db):
+        reconciliar_contadores_publicacion(db)
+
+
+def tarea_reconciliacion_contadores_publicacion() -> None:
+    ejecutar_con_bloqueo('reconciliacion_contadores_publicacion', _reconciliar_si_disponible)
@@ -0,0 +1,171 @@
+# app/services/contadores_referidos.py
+"""
+Contadores de referidos denormalizados en conexion_carga.users
+(scripts_sql/07_users_contadores_referidos.sql).
+
+- referred_count: usuarios cuyo referred_by_id apunta al usuario.
+- referred_active_count: los mismos, solo los activos (verificados).
+
+Igual que el resumen del dashboard, las escrituras miden la contribucion de
+los usuarios afectados antes y despues del cambio y suman la diferencia al
+referidor en su propia transaccion (incrementos, seguros ante escrituras
+concurrentes). Una tarea periodica corrige derivas, p. ej. las de
+ON DELETE SET NULL. Sin el script los ajustes son no-op y las consultas
+siguen contando sobre users.
+"""
+
+from __future__ import annotations
+
+import json
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.estructura_bd import columna_existe
+from app.services.tareas_periodicas import ejecutar_con_bloqueo
+
+COLUMNAS_REFERIDOS = ('referred_count', 'referred_active_count')
+
+# (referidor_id, columna) -> cantidad
+ContribucionReferidos = Counter
+
+
+def contadores_referidos_disponibles(db: Session) -> bool:
+    return columna_existe(db, 'users', 'referred_count')
+
+
+def contribucion_referidos(db: Session, usuario_ids: Iterable[UUID | str]) -> ContribucionReferidos:
+    """Lo que aportan hoy los usuarios indicados a los contadores de sus referidores."""
+    ids = [str(usuario_id) for usuario_id in usuario_ids if usuario_id]
+    if not ids or not contadores_referidos_disponibles(db):
+        return Counter()
+
+    filas = db.execute(
+        text(
+            """
+            SELECT referred_by_id, active
+            FROM conexion_carga.users
+            WHERE id = ANY(CAST(:ids AS uuid[]))
+              AND referred_by_id IS NOT NULL
+            """
+        ),
+        {'ids': ids},
+    ).mappings().all()
+
+    contribucion: ContribucionReferidos = Counter()
+    for fila in filas:
+        referidor_id = str(fila['referred_by_id'])
+        contribucion[(referidor_id, 'referred_count')] += 1
+        if fila['active']:
+            contribucion[(referidor_id, 'referred_active_count')] += 1
+
+    return contribucion
+
+
+def ajustar_contadores_referidos(
+    db: Session,
+    antes: ContribucionReferidos,
+    despues: ContribucionReferidos,
+) -> None:
+    """Suma `despues - antes` a los referidores dentro de la transaccion actual (sin commit)."""
+    deltas: dict[str, dict[str, int]] = {}
+    for clave in set(antes) | set(despues):
+        delta = despues[clave] - antes[clave]
+        if not delta:
+            continue
+        referidor_id, columna = clave
+        deltas.setdefault(referidor_id, dict.fromkeys(COLUMNAS_REFERIDOS, 0))[columna] += delta
+
+    if not deltas:
+        return
+
+    db.execute(
+        text(
+            """
+            UPDATE conexion_carga.users u
+            SET
+                referred_count = GREATEST(u.referred_count + x.referred_count, 0),
+                referred_active_count = GREATEST(
+                    u.referred_active_count + x.referred_active_count,
+                    0
+                )
+            FROM jsonb_to_recordset(CAST(:filas AS jsonb))
+                AS x(id uuid, referred_count integer, referred_active_count integer)
+            WHERE u.id = x.id
+            """
+        ),
+        {
+            'filas': json.dumps(
+                [{'id': referidor_id, **columnas} for referidor_id, columnas in deltas.items()]
+            ),
+        },
+    )
+
+
+@contextmanager
+def registrar_cambio_referidos(
+    db: Session,
+    usuario_ids: Iterable[UUID | str],
+) -> Iterator[None]:
+    """
+    Envuelve cambios de referred_by_id/active de usuarios existentes y ajusta
+    los contadores de sus referidores (hace flush, no commit).
+    """
+    ids = [str(usuario_id) for usuario_id in usuario_ids if usuario_id]
+    antes = contribucion_referidos(db, ids)
+    yield
+    db.flush()
+    ajustar_contadores_referidos(db, antes, contribucion_referidos(db, ids))
+
+
+def registrar_usuarios_nuevos_referidos(db: Session, usuario_ids: Iterable[UUID | str]) -> None:
+    """Suma usuarios recien insertados (ya con flush) a sus referidores (sin commit)."""
+    ajustar_contadores_referidos(db, Counter(), contribucion_referidos(db, usuario_ids))
+
+
+def reconciliar_contadores_referidos(db: Session) -> int:
+    """Recalcula ambos contadores desde users; devuelve los usuarios corregidos."""
+    corregidos = db.execute(
+        text(
+            """
+            WITH fuente AS (
+                SELECT
+                    referred_by_id AS id,
+                    COUNT(*) AS referred_count,
+                    COUNT(*) FILTER (WHERE active IS TRUE) AS referred_active_count
+                FROM conexion_carga.users
+                WHERE referred_by_id IS NOT NULL
+                GROUP BY referred_by_id
+            )
+            UPDATE conexion_carga.users u
+            SET
+                referred_count = COALESCE(f.referred_count, 0),
+                referred_active_count = COALESCE(f.referred_active_count, 0)
+            FROM conexion_carga.users base
+            LEFT JOIN fuente f
+              ON f.id = base.id
+            WHERE u.id = base.id
+              AND (u.referred_count, u.referred_active_count)
+                  IS DISTINCT FROM (
+                      COALESCE(f.referred_count, 0),
+                      COALESCE(f.referred_active_count, 0)
+                  )
+            RETURNING u.id
+            """
+        )
+    ).scalars().all()
+    db.commit()
+    return len(corregidos)
+
+
+def _reconciliar_si_disponible(db: Session) -> None:
+    if contadores_referidos_disponibles(db):
+        reconciliar_contadores_referidos(db)
+
+
+def tarea_reconciliacion_contadores_referidos() -> None:
+    ejecutar_con_bloqueo('reconciliacion_contadores_referidos', _reconciliar_si_disponible)
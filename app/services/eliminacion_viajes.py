@@ -0,0 +1,135 @@
+# app/services/eliminacion_viajes.py
+"""
+Marca denormalizada carga.eliminado / carga.eliminado_en.
+
+Si scripts_sql/03_carga_eliminado_flag.sql aun no se ejecuto, los filtros
+vuelven al anti-join NOT EXISTS sobre carga_eliminada.
+"""
+
+from __future__ import annotations
+
+from typing import Iterable
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.estructura_bd import columna_existe
+from app.services.tareas_periodicas import ejecutar_con_bloqueo
+
+
+def marca_eliminado_disponible(db: Session) -> bool:
+    return columna_existe(db, 'carga', 'eliminado')
+
+
+def condicion_no_eliminado_sql(db: Session, alias: str = 'conexion_carga.carga') -> str:
+    if marca_eliminado_disponible(db):
+        return f'{alias}.eliminado = FALSE'
+
+    return f"""
+        NOT EXISTS (
+            SELECT 1
+            FROM conexion_carga.carga_eliminada ce
+            WHERE ce.carga_id = {alias}.id
+        )
+    """
+
+
+def marcar_cargas_eliminadas(db: Session, carga_ids: Iterable[UUID | str]) -> None:
+    """Marca las cargas dentro de la transaccion actual (sin commit)."""
+    ids = [str(carga_id) for carga_id in carga_ids]
+    if not ids or not marca_eliminado_disponible(db):
+        return
+
+    db.execute(
+        text(
+            """
+            UPDATE conexion_carga.carga
+            SET
+                eliminado = TRUE,
+                eliminado_en = NOW()
+            WHERE id = ANY(CAST(:ids AS uuid[]))
+            """
+        ),
+        {'ids': ids},
+    )
+
+
+def verificar_consistencia_eliminados(db: Session, *, corregir: bool = False) -> dict[str, int]:
+    """
+    Compara carga.eliminado con carga_eliminada. Con `corregir=True` alinea la
+    marca con el historial (que es la fuente de verdad) y hace commit.
+    """
+    resumen = db.execute(
+        text(
+            """
+            SELECT
+                (
+                    SELECT COUNT(*)
+                    FROM conexion_carga.carga c
+                    WHERE c.eliminado = TRUE
+                      AND NOT EXISTS (
+                            SELECT 1
+                            FROM conexion_carga.carga_eliminada ce
+                            WHERE ce.carga_id = c.id
+                      )
+                ) AS marcados_sin_registro,
+                (
+                    SELECT COUNT(*)
+                    FROM conexion_carga.carga c
+                    JOIN conexion_carga.carga_eliminada ce
+                      ON ce.carga_id = c.id
+                    WHERE c.eliminado = FALSE
+                ) AS registros_sin_marca
+            """
+        )
+    ).mappings().first()
+
+    marcados_sin_registro = int(resumen['marcados_sin_registro'] or 0)
+    registros_sin_marca = int(resumen['registros_sin_marca'] or 0)
+
+    if corregir and (marcados_sin_registro or registros_sin_marca):
+        db.execute(
+            text(
+                """
+                UPDATE conexion_carga.carga c
+                SET
+                    eliminado = FALSE,
+                    eliminado_en = NULL
+                WHERE c.eliminado = TRUE
+                  AND NOT EXISTS (
+                        SELECT 1
+                        FROM conexion_carga.carga_eliminada ce
+                        WHERE ce.carga_id = c.id
+                  )
+                """
+            )
+        )
+        db.execute(
+            text(
+                """
+                UPDATE conexion_carga.carga c
+                SET
+                    eliminado = TRUE,
+                    eliminado_en = ce.eliminado_en
+                FROM conexion_carga.carga_eliminada ce
+                WHERE ce.carga_id = c.id
+                  AND c.eliminado = FALSE
+                """
+            )
+        )
+        db.commit()
+
+    return {
+        'marcados_sin_registro': marcados_sin_registro,
+        'registros_sin_marca': registros_sin_marca,
+    }
+
+
+def _corregir_consistencia_eliminados(db: Session) -> None:
+    if marca_eliminado_disponible(db):
+        verificar_consistencia_eliminados(db, corregir=True)
+
+
+def tarea_consistencia_eliminados() -> None:
+    ejecutar_con_bloqueo('consistencia_eliminados', _corregir_consistencia_eliminados)
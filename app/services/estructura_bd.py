@@ -0,0 +1,63 @@
+# app/services/estructura_bd.py
+"""
+Deteccion de estructuras opcionales de BD (tablas/columnas creadas por los
+scripts de scripts_sql/). Solo se cachean los resultados positivos: una vez
+aplicado un script la estructura no desaparece, y mientras no exista se sigue
+verificando para no exigir reinicio tras migrar.
+"""
+
+from __future__ import annotations
+
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+ESQUEMA = 'conexion_carga'
+
+_existentes: set[tuple[str, str | None]] = set()
+_lock = threading.Lock()
+
+
+def tabla_existe(db: Session, tabla: str) -> bool:
+    clave = (tabla, None)
+    if clave in _existentes:
+        return True
+
+    existe = bool(
+        db.execute(
+            text('SELECT to_regclass(:nombre) IS NOT NULL'),
+            {'nombre': f'{ESQUEMA}.{tabla}'},
+        ).scalar()
+    )
+    if existe:
+        with _lock:
+            _existentes.add(clave)
+    return existe
+
+
+def columna_existe(db: Session, tabla: str, columna: str) -> bool:
+    clave = (tabla, columna)
+    if clave in _existentes:
+        return True
+
+    existe = bool(
+        db.execute(
+            text(
+                """
+                SELECT EXISTS (
+                    SELECT 1
+                    FROM information_schema.columns
+                    WHERE table_schema = :esquema
+                      AND table_name = :tabla
+                      AND column_name = :columna
+                )
+                """
+            ),
+            {'esquema': ESQUEMA, 'tabla': tabla, 'columna': columna},
+        ).scalar()
+    )
+    if existe:
+        with _lock:
+            _existentes.add(clave)
+    return existe
@@ -0,0 +1,152 @@
+# app/services/eventos_dashboard.py
+"""
+Difusion en vivo de deltas de contadores del dashboard admin.
+
+Las escrituras publican los deltas por dia con pg_notify dentro de su
+transaccion, de modo que solo se entregan si hacen commit y llegan a todos
+los workers. Cada worker mantiene un hilo con LISTEN (solo mientras tenga
+clientes conectados) que acumula los deltas en la suscripcion de cada
+cliente; el WebSocket los envia agrupados como maximo una vez por intervalo.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import select
+import threading
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import engine
+
+logger = logging.getLogger(__name__)
+
+CANAL_DASHBOARD = 'dashboard_contadores'
+COLUMNAS_DELTA = ('activos', 'inactivos', 'eliminados')
+# pg_notify admite payloads de hasta ~8000 bytes.
+_MAXIMO_DIAS_POR_AVISO = 100
+
+
+def notificar_deltas_dashboard(db: Session, deltas: dict[date, dict[str, int]]) -> None:
+    """Publica los deltas en la transaccion actual (se entregan al hacer commit)."""
+    filas = [{'dia': dia.isoformat(), **columnas} for dia, columnas in sorted(deltas.items())]
+    for inicio in range(0, len(filas), _MAXIMO_DIAS_POR_AVISO):
+        db.execute(
+            text('SELECT pg_notify(:canal, :payload)'),
+            {
+                'canal': CANAL_DASHBOARD,
+                'payload': json.dumps(
+                    filas[inicio:inicio + _MAXIMO_DIAS_POR_AVISO],
+                    separators=(',', ':'),
+                ),
+            },
+        )
+
+
+class SuscripcionDashboard:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pendientes: dict[date, dict[str, int]] = {}
+
+    def acumular(self, filas: list[dict]) -> None:
+        with self._lock:
+            for fila in filas:
+                dia = date.fromisoformat(fila['dia'])
+                acumulado = self._pendientes.setdefault(dia, dict.fromkeys(COLUMNAS_DELTA, 0))
+                for columna in COLUMNAS_DELTA:
+                    acumulado[columna] += int(fila.get(columna) or 0)
+
+    def tomar(self) -> dict[date, dict[str, int]]:
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, {}
+        return pendientes
+
+
+class DifusorDashboard:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._suscripciones: set[SuscripcionDashboard] = set()
+        self._hilo: threading.Thread | None = None
+        self._detener = threading.Event()
+
+    def suscribir(self) -> SuscripcionDashboard:
+        suscripcion = SuscripcionDashboard()
+        with self._lock:
+            self._suscripciones.add(suscripcion)
+            if self._hilo is None and not self._detener.is_set():
+                self._hilo = threading.Thread(
+                    target=self._escuchar,
+                    name='dashboard-listen',
+                    daemon=True,
+                )
+                self._hilo.start()
+        return suscripcion
+
+    def desuscribir(self, suscripcion: SuscripcionDashboard) -> None:
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    def detener(self) -> None:
+        self._detener.set()
+
+    def _repartir(self, payload: str) -> None:
+        try:
+            filas = json.loads(payload)
+        except ValueError:
+            logger.warning('Aviso de dashboard con payload invalido: %r', payload)
+            return
+
+        with self._lock:
+            suscripciones = list(self._suscripciones)
+        for suscripcion in suscripciones:
+            suscripcion.acumular(filas)
+
+    def _sin_suscriptores(self) -> bool:
+        # Se decide bajo el lock para que `suscribir` no quede sin hilo.
+        with self._lock:
+            if self._suscripciones:
+                return False
+            self._hilo = None
+            return True
+
+    def _escuchar(self) -> None:
+        while not self._detener.is_set():
+            conexion = None
+            try:
+                # Conexion dedicada: se separa del pool porque queda en LISTEN.
+                conexion = engine.raw_connection()
+                conexion.detach()
+                dbapi = conexion.driver_connection
+                dbapi.autocommit = True
+                with dbapi.cursor() as cursor:
+                    cursor.execute(f'LISTEN {CANAL_DASHBOARD}')
+
+                while not self._detener.is_set():
+                    if select.select([dbapi], [], [], 1.0) == ([], [], []):
+                        if self._sin_suscriptores():
+                            return
+                        continue
+
+                    dbapi.poll()
+                    while dbapi.notifies:
+                        self._repartir(dbapi.notifies.pop(0).payload)
+            except Exception:
+                logger.exception('Fallo la escucha de eventos del dashboard; reintentando')
+                if self._sin_suscriptores():
+                    return
+                self._detener.wait(5)
+            finally:
+                if conexion is not None:
+                    try:
+                        conexion.close()
+                    except Exception:
+                        pass
+
+        with self._lock:
+            self._hilo = None
+
+
+difusor_dashboard = DifusorDashboard()
@@ -0,0 +1,273 @@
+# app/services/exportaciones.py
+"""
+Trabajos de exportacion asincronos para el panel administrativo.
+
+Los trabajos se ejecutan en un pool de hilos acotado y dejan un CSV comprimido
+en exports/ (fuera de /uploads, que se sirve publicamente). El estado de cada
+trabajo se guarda como JSON junto al archivo, asi cualquier worker de uvicorn
+puede consultarlo y descargarlo. Las filas se escriben a medida que el
+productor las entrega, sin cargar todo el resultado en memoria.
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterable, Sized
+from uuid import uuid4
+
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+EXPORTS_DIR = Path(os.getenv('EXPORTS_DIR', str(BASE_DIR / 'exports')))
+EXPORTS_DIR.mkdir(parents=True, exist_ok=True)
+
+EXPORTACIONES_MAX_CONCURRENCIA = int(os.getenv('EXPORTACIONES_MAX_CONCURRENCIA', '2'))
+EXPORTACIONES_MAX_PENDIENTES = int(os.getenv('EXPORTACIONES_MAX_PENDIENTES', '20'))
+EXPORTACIONES_RETENCION_HORAS = int(os.getenv('EXPORTACIONES_RETENCION_HORAS', '24'))
+EXPORTACIONES_TIMEOUT_MINUTOS = int(os.getenv('EXPORTACIONES_TIMEOUT_MINUTOS', '30'))
+FILAS_POR_AVANCE = 500
+
+ProductorExportacion = Callable[[Session], Iterable[BaseModel]]
+
+
+class LimiteExportacionesError(Exception):
+    pass
+
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_pendientes = 0
+# Trabajos que un hilo de este proceso esta ejecutando.
+_en_ejecucion: set[str] = set()
+_HOST = socket.gethostname()
+
+
+def _ahora_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _ruta_estado(trabajo_id: str) -> Path:
+    return EXPORTS_DIR / f'{trabajo_id}.json'
+
+
+def ruta_archivo(trabajo_id: str) -> Path:
+    return EXPORTS_DIR / f'{trabajo_id}.csv.gz'
+
+
+def _obtener_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=max(1, EXPORTACIONES_MAX_CONCURRENCIA),
+                thread_name_prefix='exportacion',
+            )
+        return _pool
+
+
+def _guardar_estado(estado: dict[str, Any]) -> None:
+    estado['actualizado_en'] = _ahora_iso()
+    ruta = _ruta_estado(estado['id'])
+    temporal = ruta.with_suffix('.json.tmp')
+    temporal.write_text(json.dumps(estado, ensure_ascii=False), encoding='utf-8')
+    temporal.replace(ruta)
+
+
+def obtener_trabajo(trabajo_id: str) -> dict[str, Any] | None:
+    ruta = _ruta_estado(Path(trabajo_id).name)
+    if not ruta.exists():
+        return None
+
+    try:
+        return json.loads(ruta.read_text(encoding='utf-8'))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _valor_csv(valor: object) -> object:
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return valor
+
+
+def _ejecutar_trabajo(
+    estado: dict[str, Any],
+    productor: ProductorExportacion,
+) -> None:
+    global _pendientes
+
+    with _pool_lock:
+        _en_ejecucion.add(estado['id'])
+
+    db = SessionLocal()
+    try:
+        estado['estado'] = 'procesando'
+        estado['worker'] = {'host': _HOST, 'pid': os.getpid()}
+        _guardar_estado(estado)
+
+        filas = productor(db)
+        total = len(filas) if isinstance(filas, Sized) else None
+        estado['total_filas'] = total
+        _guardar_estado(estado)
+
+        ruta = ruta_archivo(estado['id'])
+        temporal = ruta.with_suffix('.tmp')
+        procesadas = 0
+        with gzip.open(temporal, 'wt', encoding='utf-8', newline='') as archivo:
+            writer = csv.writer(archivo)
+            encabezados: list[str] | None = None
+
+            for procesadas, fila in enumerate(filas, start=1):
+                datos = fila.model_dump()
+                if encabezados is None:
+                    encabezados = list(datos.keys())
+                    writer.writerow(encabezados)
+
+                writer.writerow([_valor_csv(datos[campo]) for campo in encabezados])
+
+                if procesadas % FILAS_POR_AVANCE == 0:
+                    estado['filas_procesadas'] = procesadas
+                    if total:
+                        estado['progreso'] = int(procesadas * 100 / total)
+                    _guardar_estado(estado)
+
+        temporal.replace(ruta)
+
+        estado['estado'] = 'completado'
+        estado['filas_procesadas'] = procesadas
+        estado['total_filas'] = procesadas
+        estado['progreso'] = 100
+        estado['archivo'] = ruta.name
+        estado['finalizado_en'] = _ahora_iso()
+        _guardar_estado(estado)
+    except Exception as exc:
+        logger.exception('Fallo la exportacion %s', estado['id'])
+        estado['estado'] = 'fallido'
+        estado['error'] = str(getattr(exc, 'detail', None) or exc) or 'Error desconocido.'
+        estado['finalizado_en'] = _ahora_iso()
+        _guardar_estado(estado)
+    finally:
+        db.close()
+        with _pool_lock:
+            _pendientes = max(0, _pendientes - 1)
+            _en_ejecucion.discard(estado['id'])
+
+
+def crear_trabajo(
+    *,
+    tipo: str,
+    filtros: dict[str, Any],
+    creado_por: str,
+    productor: ProductorExportacion,
+) -> dict[str, Any]:
+    global _pendientes
+
+    with _pool_lock:
+        if _pendientes >= EXPORTACIONES_MAX_PENDIENTES:
+            raise LimiteExportacionesError()
+        _pendientes += 1
+
+    estado: dict[str, Any] = {
+        'id': uuid4().hex,
+        'tipo': tipo,
+        'filtros': filtros,
+        'estado': 'pendiente',
+        'progreso': 0,
+        'filas_procesadas': 0,
+        'total_filas': None,
+        'creado_por': creado_por,
+        'creado_en': _ahora_iso(),
+        'finalizado_en': None,
+        'archivo': None,
+        'error': None,
+    }
+    _guardar_estado(estado)
+
+    try:
+        _obtener_pool().submit(_ejecutar_trabajo, estado, productor)
+    except RuntimeError:
+        with _pool_lock:
+            _pendientes = max(0, _pendientes - 1)
+        raise
+
+    return estado
+
+
+def _proceso_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Existe pero pertenece a otro usuario.
+        pass
+    return True
+
+
+def _worker_terminado(estado: dict[str, Any]) -> bool:
+    """
+    Si el hilo que procesaba el trabajo ya no existe. Un trabajo de otro host
+    no se puede verificar y se da por perdido solo por inactividad.
+    """
+    worker = estado.get('worker') or {}
+    if worker.get('host') != _HOST or not worker.get('pid'):
+        return True
+    if worker['pid'] == os.getpid():
+        with _pool_lock:
+            return estado['id'] not in _en_ejecucion
+    return not _proceso_vivo(int(worker['pid']))
+
+
+def limpiar_exportaciones_vencidas() -> None:
+    """
+    Elimina trabajos y archivos fuera de la ventana de retencion y marca como
+    fallidos los trabajos en proceso cuyo worker desaparecio (p. ej. por
+    reinicio) sin actualizar su estado en EXPORTACIONES_TIMEOUT_MINUTOS. Los
+    trabajos aun en cola no se marcan: se ejecutaran cuando haya un hilo libre.
+    """
+    ahora = time.time()
+    limite_retencion = ahora - EXPORTACIONES_RETENCION_HORAS * 3600
+    limite_huerfano = ahora - EXPORTACIONES_TIMEOUT_MINUTOS * 60
+
+    for ruta in EXPORTS_DIR.iterdir():
+        try:
+            modificado = ruta.stat().st_mtime
+        except OSError:
+            continue
+
+        if ruta.suffix == '.json' and modificado < limite_huerfano:
+            estado = obtener_trabajo(ruta.stem)
+            if estado and estado.get('estado') == 'procesando' and _worker_terminado(estado):
+                estado['estado'] = 'fallido'
+                estado['error'] = 'La exportacion se interrumpio antes de finalizar.'
+                estado['finalizado_en'] = _ahora_iso()
+                _guardar_estado(estado)
+                continue
+
+        if modificado < limite_retencion:
+            ruta.unlink(missing_ok=True)
+
+
+def detener_exportaciones() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,390 @@
+# app/services/importacion_usuarios.py
+"""
+Importacion masiva de usuarios desde CSV (alta de empresas aliadas).
+
+El archivo se lee fila a fila y se procesa en lotes de
+IMPORTACION_USUARIOS_LOTE filas. Por cada lote:
+
+1. Valida las filas con las reglas de la creacion individual.
+2. Descarta los correos repetidos dentro del archivo y, con una sola consulta
+   sobre ux_users_email_lower (scripts_sql/11_users_email_normalizado.sql),
+   los que ya existen.
+3. Calcula los hashes bcrypt en un pool de procesos.
+4. Copia el lote con COPY a una tabla temporal y lo inserta con un solo
+   INSERT ... ON CONFLICT DO NOTHING, que cubre altas concurrentes.
+5. Hace commit y emite una linea NDJSON con el avance.
+
+Cada lote es una transaccion: si la importacion se corta, los lotes
+anteriores quedan creados y al repetir el archivo se reportan como
+duplicados.
+"""
+
+from __future__ import annotations
+
+import csv
+import importlib
+import io
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.schemas_usuarios_admin import CrearUsuarioAdminIn
+from app.services.indice_empresas import indice_empresas
+from app.services.normalizacion import normalizar_email
+
+logger = logging.getLogger(__name__)
+
+IMPORTACION_USUARIOS_LOTE = int(os.getenv('IMPORTACION_USUARIOS_LOTE', '500'))
+IMPORTACION_USUARIOS_MAX_FILAS = int(os.getenv('IMPORTACION_USUARIOS_MAX_FILAS', '20000'))
+IMPORTACION_USUARIOS_PROCESOS = int(
+    os.getenv('IMPORTACION_USUARIOS_PROCESOS', str(os.cpu_count() or 2))
+)
+MAXIMO_ERRORES_POR_LOTE = 20
+
+COLUMNAS_OBLIGATORIAS = ('email', 'first_name', 'last_name', 'password')
+COLUMNAS_OPCIONALES = ('phone', 'is_company', 'company_name', 'is_driver', 'is_premium', 'active')
+COLUMNAS_BOOLEANAS = ('is_company', 'is_driver', 'is_premium', 'active')
+_VALORES_BOOLEANOS = {'si': 'true', 'sí': 'true', 's': 'true', 'x': 'true', 'n': 'false'}
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+class ImportacionUsuariosInvalidaError(ValueError):
+    pass
+
+
+def _hashear_contrasenas(contrasenas: list[str]) -> list[str]:
+    """Se ejecuta en los procesos del pool."""
+    # Import diferido: app.security debe importarse despues de app.crud.
+    importlib.import_module('app.crud')
+    get_password_hash = importlib.import_module('app.security').get_password_hash
+
+    return [get_password_hash(contrasena) for contrasena in contrasenas]
+
+
+def _obtener_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: el servidor tiene hilos propios que fork no duplicaria.
+            _pool = ProcessPoolExecutor(
+                max_workers=max(1, IMPORTACION_USUARIOS_PROCESOS),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def detener_importaciones() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _hashear_en_paralelo(contrasenas: list[str]) -> list[str]:
+    if not contrasenas:
+        return []
+
+    procesos = max(1, IMPORTACION_USUARIOS_PROCESOS)
+    tamano = -(-len(contrasenas) // procesos)
+    partes = [contrasenas[i:i + tamano] for i in range(0, len(contrasenas), tamano)]
+    return [hash_ for parte in _obtener_pool().map(_hashear_contrasenas, partes) for hash_ in parte]
+
+
+def abrir_csv_importacion(archivo: IO[bytes]) -> csv.DictReader:
+    """Lector por filas del CSV; valida el encabezado."""
+    lector = csv.DictReader(io.TextIOWrapper(archivo, encoding='utf-8-sig', newline=''))
+    try:
+        columnas = {(columna or '').strip().lower() for columna in lector.fieldnames or []}
+    except UnicodeDecodeError:
+        raise ImportacionUsuariosInvalidaError('El archivo debe estar codificado en UTF-8.') from None
+
+    faltantes = [columna for columna in COLUMNAS_OBLIGATORIAS if columna not in columnas]
+    if faltantes:
+        raise ImportacionUsuariosInvalidaError(
+            f"Faltan columnas en el CSV: {', '.join(faltantes)}."
+        )
+    return lector
+
+
+def _validar_fila(numero: int, registro: dict[str, object]) -> CrearUsuarioAdminIn:
+    valores = {
+        (clave or '').strip().lower(): str(valor).strip()
+        for clave, valor in registro.items()
+        if isinstance(valor, str)
+    }
+    datos = {
+        columna: valores[columna]
+        for columna in COLUMNAS_OBLIGATORIAS + COLUMNAS_OPCIONALES
+        if valores.get(columna)
+    }
+    for columna in COLUMNAS_BOOLEANAS:
+        if columna in datos:
+            datos[columna] = _VALORES_BOOLEANOS.get(datos[columna].lower(), datos[columna])
+
+    try:
+        fila = CrearUsuarioAdminIn.model_validate(datos)
+    except ValidationError as exc:
+        error = exc.errors()[0]
+        campo = '.'.join(str(parte) for parte in error.get('loc', ())) or 'fila'
+        mensaje = str(error.get('msg') or 'valor inválido').rstrip('.')
+        raise ValueError(f'Fila {numero}: {campo}: {mensaje}.') from None
+
+    if not fila.first_name.strip() or not fila.last_name.strip():
+        raise ValueError(f'Fila {numero}: los nombres y apellidos son obligatorios.')
+    return fila
+
+
+def _emails_existentes(db: Session, emails: list[str]) -> set[str]:
+    return set(
+        db.execute(
+            text(
+                """
+                SELECT LOWER(email)
+                FROM conexion_carga.users
+                WHERE LOWER(email) = ANY(:emails)
+                """
+            ),
+            {'emails': emails},
+        ).scalars()
+    )
+
+
+def _copiar_lote(db: Session, filas: list[tuple[int, CrearUsuarioAdminIn]], hashes: list[str]) -> None:
+    db.execute(
+        text(
+            """
+            CREATE TEMP TABLE importacion_usuarios (
+                fila INTEGER NOT NULL,
+                email TEXT NOT NULL,
+                password_hash TEXT NOT NULL,
+                first_name TEXT NOT NULL,
+                last_name TEXT NOT NULL,
+                phone TEXT NULL,
+                is_company BOOLEAN NOT NULL,
+                company_name TEXT NULL,
+                is_driver BOOLEAN NOT NULL,
+                is_premium BOOLEAN NOT NULL,
+                active BOOLEAN NOT NULL
+            ) ON COMMIT DROP
+            """
+        )
+    )
+
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for (numero, fila), password_hash in zip(filas, hashes):
+        company_name = (fila.company_name or '').strip() if fila.is_company else ''
+        # En COPY csv un campo vacio sin comillas es NULL.
+        escritor.writerow(
+            [
+                numero,
+                normalizar_email(fila.email),
+                password_hash,
+                fila.first_name.strip(),
+                fila.last_name.strip(),
+                (fila.phone or '').strip(),
+                fila.is_company,
+                company_name,
+                fila.is_driver,
+                fila.is_premium,
+                fila.active,
+            ]
+        )
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.copy_expert(
+            """
+            COPY importacion_usuarios (
+                fila, email, password_hash, first_name, last_name, phone,
+                is_company, company_name, is_driver, is_premium, active
+            ) FROM STDIN WITH (FORMAT csv)
+            """,
+            buffer,
+        )
+    finally:
+        cursor.close()
+
+
+def _insertar_lote(db: Session) -> list[dict[str, object]]:
+    return [
+        dict(fila)
+        for fila in db.execute(
+            text(
+                """
+                INSERT INTO conexion_carga.users (
+                    email,
+                    password_hash,
+                    first_name,
+                    last_name,
+                    phone,
+                    is_company,
+                    company_name,
+                    active,
+                    points,
+                    is_premium,
+                    is_driver,
+                    created_at
+                )
+                SELECT
+                    email,
+                    password_hash,
+                    first_name,
+                    last_name,
+                    phone,
+                    is_company,
+                    company_name,
+                    active,
+                    0,
+                    is_premium,
+                    is_driver,
+                    NOW()
+                FROM importacion_usuarios
+                ORDER BY fila
+                ON CONFLICT DO NOTHING
+                RETURNING id, email, company_name
+                """
+            )
+        ).mappings()
+    ]
+
+
+def _procesar_lote(
+    db: Session,
+    registros: list[tuple[int, dict[str, object]]],
+    vistos: set[str],
+) -> dict[str, object]:
+    validas: list[tuple[int, CrearUsuarioAdminIn]] = []
+    errores: list[str] = []
+    invalidas = 0
+    duplicadas = 0
+
+    for numero, registro in registros:
+        try:
+            fila = _validar_fila(numero, registro)
+        except ValueError as exc:
+            invalidas += 1
+            if len(errores) < MAXIMO_ERRORES_POR_LOTE:
+                errores.append(str(exc))
+            continue
+
+        email = normalizar_email(fila.email)
+        if email in vistos:
+            duplicadas += 1
+            continue
+        vistos.add(email)
+        validas.append((numero, fila))
+
+    existentes = (
+        _emails_existentes(db, [normalizar_email(fila.email) for _, fila in validas])
+        if validas
+        else set()
+    )
+    nuevas = [(numero, fila) for numero, fila in validas if normalizar_email(fila.email) not in existentes]
+    duplicadas += len(validas) - len(nuevas)
+
+    creados: list[dict[str, object]] = []
+    if nuevas:
+        hashes = _hashear_en_paralelo([fila.password for _, fila in nuevas])
+        try:
+            _copiar_lote(db, nuevas, hashes)
+            creados = _insertar_lote(db)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        for creado in creados:
+            indice_empresas.registrar_usuario(creado['id'], creado['company_name'])
+
+    return {
+        'filas': len(registros),
+        'creados': len(creados),
+        # Incluye las altas concurrentes que ON CONFLICT descarto.
+        'duplicados': duplicadas + len(nuevas) - len(creados),
+        'invalidos': invalidas,
+        'errores': errores,
+    }
+
+
+def _linea(evento: dict[str, object]) -> bytes:
+    return (json.dumps(evento, default=str, separators=(',', ':')) + '\n').encode('utf-8')
+
+
+def iterar_importacion_ndjson(lector: csv.DictReader) -> Iterator[bytes]:
+    """
+    Lineas NDJSON: un `lote` por lote procesado y un `fin` con los totales
+    (o un `error` si la importacion se interrumpe).
+    Usa su propia sesion: la del request se cierra antes de terminar el envio.
+    """
+    db = SessionLocal()
+    vistos: set[str] = set()
+    totales = {'filas': 0, 'creados': 0, 'duplicados': 0, 'invalidos': 0}
+    numero_lote = 0
+    registros: list[tuple[int, dict[str, object]]] = []
+
+    def _cerrar_lote() -> bytes:
+        nonlocal numero_lote
+        numero_lote += 1
+        resultado = _procesar_lote(db, registros, vistos)
+        registros.clear()
+        for clave in totales:
+            totales[clave] += int(resultado[clave])
+        return _linea({'tipo': 'lote', 'lote': numero_lote, **resultado})
+
+    try:
+        # La fila 1 es el encabezado.
+        for numero, registro in enumerate(lector, start=2):
+            if not any(str(valor or '').strip() for valor in registro.values() if isinstance(valor, str)):
+                continue
+            if totales['filas'] + len(registros) >= IMPORTACION_USUARIOS_MAX_FILAS:
+                if registros:
+                    yield _cerrar_lote()
+                yield _linea(
+                    {
+                        'tipo': 'error',
+                        'detalle': (
+                            f'El archivo supera el máximo de {IMPORTACION_USUARIOS_MAX_FILAS} filas; '
+                            'las filas restantes no se importaron.'
+                        ),
+                        **totales,
+                    }
+                )
+                return
+
+            registros.append((numero, registro))
+            if len(registros) >= IMPORTACION_USUARIOS_LOTE:
+                yield _cerrar_lote()
+
+        if registros:
+            yield _cerrar_lote()
+    except UnicodeDecodeError:
+        yield _linea({'tipo': 'error', 'detalle': 'El archivo debe estar codificado en UTF-8.', **totales})
+        return
+    except Exception:
+        logger.exception('Importacion de usuarios interrumpida en el lote %s', numero_lote)
+        yield _linea(
+            {
+                'tipo': 'error',
+                'detalle': f'No fue posible completar la importación (lote {numero_lote}).',
+                **totales,
+            }
+        )
+        return
+    finally:
+        db.close()
+
+    yield _linea({'tipo': 'fin', 'lotes': numero_lote, **totales})
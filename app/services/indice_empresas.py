@@ -0,0 +1,159 @@
+# app/services/indice_empresas.py
+"""
+Indice en memoria de nombres de empresa para las sugerencias del panel admin.
+
+Las claves se normalizan (minusculas, sin tildes, espacios colapsados) y se
+guardan en una lista ordenada: los prefijos se resuelven con bisect y las
+coincidencias internas con un recorrido de las claves. El indice se carga
+desde BD la primera vez, se actualiza de forma incremental cuando se crean o
+editan usuarios en este proceso y se recarga completo cada
+EMPRESAS_INDICE_TTL_SEGUNDOS para recoger cambios de otros workers.
+"""
+
+from __future__ import annotations
+
+import bisect
+import os
+import threading
+import time
+from collections import Counter
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.normalizacion import normalizar_clave_busqueda, normalizar_espacios
+
+EMPRESAS_INDICE_TTL_SEGUNDOS = int(os.getenv('EMPRESAS_INDICE_TTL_SEGUNDOS', '300'))
+
+
+class IndiceEmpresas:
+    def __init__(self, ttl_segundos: int) -> None:
+        self._ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self._claves: list[str] = []
+        self._variantes: dict[str, Counter[str]] = {}
+        self._nombre_por_usuario: dict[str, str] = {}
+        self._cargado_en: float | None = None
+        # Cambios registrados mientras hay recargas en curso: la consulta de la
+        # recarga puede no verlos, asi que se aplican tambien al indice nuevo.
+        self._recargas_en_curso = 0
+        self._cambios_en_recarga: dict[str, str] = {}
+
+    def _agregar(self, usuario_id: str, nombre: str) -> None:
+        clave = normalizar_clave_busqueda(nombre)
+        variantes = self._variantes.get(clave)
+        if variantes is None:
+            variantes = Counter()
+            self._variantes[clave] = variantes
+            bisect.insort(self._claves, clave)
+
+        variantes[nombre] += 1
+        self._nombre_por_usuario[usuario_id] = nombre
+
+    def _quitar(self, usuario_id: str) -> None:
+        nombre = self._nombre_por_usuario.pop(usuario_id, None)
+        if nombre is None:
+            return
+
+        clave = normalizar_clave_busqueda(nombre)
+        variantes = self._variantes.get(clave)
+        if variantes is None:
+            return
+
+        variantes[nombre] -= 1
+        if variantes[nombre] <= 0:
+            del variantes[nombre]
+
+        if not variantes:
+            del self._variantes[clave]
+            posicion = bisect.bisect_left(self._claves, clave)
+            if posicion < len(self._claves) and self._claves[posicion] == clave:
+                self._claves.pop(posicion)
+
+    def recargar(self, db: Session) -> None:
+        with self._lock:
+            self._recargas_en_curso += 1
+
+        try:
+            filas = db.execute(
+                text(
+                    """
+                    SELECT id, company_name
+                    FROM conexion_carga.users
+                    WHERE NULLIF(TRIM(company_name), '') IS NOT NULL
+                    """
+                )
+            ).mappings().all()
+
+            nuevo = IndiceEmpresas(self._ttl_segundos)
+            for fila in filas:
+                nombre = normalizar_espacios(fila['company_name'])
+                if nombre:
+                    nuevo._agregar(str(fila['id']), nombre)
+
+            with self._lock:
+                for usuario_id, nombre in self._cambios_en_recarga.items():
+                    nuevo._quitar(usuario_id)
+                    if nombre:
+                        nuevo._agregar(usuario_id, nombre)
+
+                self._claves = nuevo._claves
+                self._variantes = nuevo._variantes
+                self._nombre_por_usuario = nuevo._nombre_por_usuario
+                self._cargado_en = time.monotonic()
+        finally:
+            with self._lock:
+                self._recargas_en_curso -= 1
+                if not self._recargas_en_curso:
+                    self._cambios_en_recarga.clear()
+
+    def _asegurar_cargado(self, db: Session) -> None:
+        cargado_en = self._cargado_en
+        if cargado_en is not None and time.monotonic() - cargado_en < self._ttl_segundos:
+            return
+        self.recargar(db)
+
+    def registrar_usuario(self, usuario_id: UUID | str, company_name: str | None) -> None:
+        """Actualiza el indice tras crear/editar un usuario (no-op si no se ha cargado)."""
+        nombre = normalizar_espacios(company_name)
+        with self._lock:
+            if self._recargas_en_curso:
+                self._cambios_en_recarga[str(usuario_id)] = nombre
+            if self._cargado_en is None:
+                return
+
+            self._quitar(str(usuario_id))
+            if nombre:
+                self._agregar(str(usuario_id), nombre)
+
+    def buscar(self, db: Session, termino: str, limit: int) -> list[str]:
+        self._asegurar_cargado(db)
+        clave_busqueda = normalizar_clave_busqueda(termino)
+
+        with self._lock:
+            claves = self._claves
+            if not clave_busqueda:
+                seleccion = claves[:limit]
+            else:
+                posicion = bisect.bisect_left(claves, clave_busqueda)
+                seleccion = []
+                while (
+                    posicion < len(claves)
+                    and len(seleccion) < limit
+                    and claves[posicion].startswith(clave_busqueda)
+                ):
+                    seleccion.append(claves[posicion])
+                    posicion += 1
+
+                if len(seleccion) < limit:
+                    for clave in claves:
+                        if clave_busqueda in clave and not clave.startswith(clave_busqueda):
+                            seleccion.append(clave)
+                            if len(seleccion) >= limit:
+                                break
+
+            return [min(self._variantes[clave]) for clave in seleccion]
+
+
+indice_empresas = IndiceEmpresas(EMPRESAS_INDICE_TTL_SEGUNDOS)
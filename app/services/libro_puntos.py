@@ -0,0 +1,382 @@
+# app/services/libro_puntos.py
+"""
+Libro de puntos (scripts_sql/09_libro_puntos.sql).
+
+Cada cambio de puntos agrega un movimiento (delta) de solo insercion y
+actualiza users.points en la misma sentencia, que queda como cache derivada
+del libro para el ranking. Los cambios de un usuario se serializan con
+FOR UPDATE sobre su fila, asi que sus movimientos quedan en orden de id.
+
+Una tarea periodica guarda snapshots del saldo por usuario; el saldo a una
+fecha y el historial se calculan con el ultimo snapshot anterior mas los
+movimientos posteriores. La misma tarea realinea users.points con el libro.
+
+Sin el script solo se actualiza users.points, como antes.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.estructura_bd import tabla_existe
+from app.services.tareas_periodicas import ejecutar_con_bloqueo
+
+logger = logging.getLogger(__name__)
+
+TABLA_MOVIMIENTOS = 'puntos_movimientos'
+TABLA_SNAPSHOTS = 'puntos_snapshots'
+# Movimientos nuevos que debe acumular un usuario para tomarle un snapshot.
+PUNTOS_SNAPSHOT_MIN_MOVIMIENTOS = int(os.getenv('PUNTOS_SNAPSHOT_MIN_MOVIMIENTOS', '20'))
+
+
+def libro_puntos_disponible(db: Session) -> bool:
+    return tabla_existe(db, TABLA_MOVIMIENTOS) and tabla_existe(db, TABLA_SNAPSHOTS)
+
+
+def cte_movimientos_puntos(db: Session, fuente: str) -> str:
+    """
+    CTE que registra en el libro los cambios de `fuente` (columnas id,
+    anteriores, nuevos) para sentencias de varios usuarios. Usa los parametros
+    :origen, :admin_user_id y :detalle; vacio si el libro no existe.
+    """
+    if not libro_puntos_disponible(db):
+        return ''
+
+    return f"""
+        , movimientos AS (
+            INSERT INTO conexion_carga.puntos_movimientos (
+                user_id,
+                delta,
+                origen,
+                admin_user_id,
+                detalle
+            )
+            SELECT
+                id,
+                nuevos - anteriores,
+                :origen,
+                CAST(:admin_user_id AS uuid),
+                :detalle
+            FROM {fuente}
+            WHERE nuevos <> anteriores
+        )
+    """
+
+
+def _aplicar_cambio(
+    db: Session,
+    user_id: UUID | str,
+    *,
+    saldo: int | None,
+    delta: int | None,
+    origen: str,
+    admin_user_id: UUID | str | None,
+    detalle: str | None,
+) -> tuple[int, int] | None:
+    fila = db.execute(
+        text(
+            f"""
+            WITH actual AS (
+                SELECT
+                    u.id,
+                    COALESCE(u.points, 0) AS anteriores,
+                    GREATEST(
+                        COALESCE(
+                            CAST(:saldo AS integer),
+                            COALESCE(u.points, 0) + COALESCE(CAST(:delta AS integer), 0)
+                        ),
+                        0
+                    ) AS nuevos
+                FROM conexion_carga.users u
+                WHERE u.id = CAST(:user_id AS uuid)
+                FOR UPDATE OF u
+            ),
+            actualizados AS (
+                UPDATE conexion_carga.users u
+                SET points = a.nuevos
+                FROM actual a
+                WHERE u.id = a.id
+                  AND a.nuevos <> a.anteriores
+                RETURNING u.id
+            )
+            {cte_movimientos_puntos(db, 'actual')}
+            SELECT anteriores, nuevos
+            FROM actual
+            """
+        ),
+        {
+            'user_id': str(user_id),
+            'saldo': saldo,
+            'delta': delta,
+            'origen': origen,
+            'admin_user_id': str(admin_user_id) if admin_user_id else None,
+            'detalle': detalle,
+        },
+    ).first()
+
+    if fila is None:
+        return None
+    return int(fila[0]), int(fila[1])
+
+
+def fijar_puntos(
+    db: Session,
+    user_id: UUID | str,
+    saldo: int,
+    *,
+    origen: str,
+    admin_user_id: UUID | str | None = None,
+    detalle: str | None = None,
+) -> tuple[int, int] | None:
+    """Deja los puntos en `saldo` (sin commit); devuelve (anteriores, nuevos)."""
+    return _aplicar_cambio(
+        db,
+        user_id,
+        saldo=saldo,
+        delta=None,
+        origen=origen,
+        admin_user_id=admin_user_id,
+        detalle=detalle,
+    )
+
+
+def sumar_puntos(
+    db: Session,
+    user_id: UUID | str,
+    delta: int,
+    *,
+    origen: str,
+    admin_user_id: UUID | str | None = None,
+    detalle: str | None = None,
+) -> tuple[int, int] | None:
+    """Suma `delta` sin bajar de 0 (sin commit); devuelve (anteriores, nuevos)."""
+    return _aplicar_cambio(
+        db,
+        user_id,
+        saldo=None,
+        delta=delta,
+        origen=origen,
+        admin_user_id=admin_user_id,
+        detalle=detalle,
+    )
+
+
+def saldo_en_fecha(db: Session, user_id: UUID | str, fecha: datetime) -> int:
+    return int(
+        db.execute(
+            text(
+                """
+                WITH snapshot AS (
+                    SELECT ultimo_movimiento_id, saldo
+                    FROM conexion_carga.puntos_snapshots
+                    WHERE user_id = CAST(:user_id AS uuid)
+                      AND hasta <= :fecha
+                    ORDER BY hasta DESC, ultimo_movimiento_id DESC
+                    LIMIT 1
+                )
+                SELECT
+                    COALESCE((SELECT saldo FROM snapshot), 0)
+                    + COALESCE(
+                        (
+                            SELECT SUM(m.delta)
+                            FROM conexion_carga.puntos_movimientos m
+                            WHERE m.user_id = CAST(:user_id AS uuid)
+                              AND m.id > COALESCE((SELECT ultimo_movimiento_id FROM snapshot), 0)
+                              AND m.creado_en <= :fecha
+                        ),
+                        0
+                    )
+                """
+            ),
+            {'user_id': str(user_id), 'fecha': fecha},
+        ).scalar()
+        or 0
+    )
+
+
+def _saldo_tras_movimiento(db: Session, user_id: UUID | str, movimiento_id: int) -> int:
+    return int(
+        db.execute(
+            text(
+                """
+                WITH snapshot AS (
+                    SELECT ultimo_movimiento_id, saldo
+                    FROM conexion_carga.puntos_snapshots
+                    WHERE user_id = CAST(:user_id AS uuid)
+                      AND ultimo_movimiento_id <= :movimiento_id
+                    ORDER BY ultimo_movimiento_id DESC
+                    LIMIT 1
+                )
+                SELECT
+                    COALESCE((SELECT saldo FROM snapshot), 0)
+                    + COALESCE(
+                        (
+                            SELECT SUM(m.delta)
+                            FROM conexion_carga.puntos_movimientos m
+                            WHERE m.user_id = CAST(:user_id AS uuid)
+                              AND m.id > COALESCE((SELECT ultimo_movimiento_id FROM snapshot), 0)
+                              AND m.id <= :movimiento_id
+                        ),
+                        0
+                    )
+                """
+            ),
+            {'user_id': str(user_id), 'movimiento_id': movimiento_id},
+        ).scalar()
+        or 0
+    )
+
+
+def historial_puntos(
+    db: Session,
+    user_id: UUID | str,
+    limite: int,
+    antes_de: int | None = None,
+) -> list[dict[str, object]]:
+    """Movimientos del mas reciente al mas antiguo, con el saldo tras cada uno."""
+    filas = db.execute(
+        text(
+            """
+            SELECT id, delta, origen, admin_user_id, detalle, creado_en
+            FROM conexion_carga.puntos_movimientos
+            WHERE user_id = CAST(:user_id AS uuid)
+              AND (CAST(:antes_de AS bigint) IS NULL OR id < CAST(:antes_de AS bigint))
+            ORDER BY id DESC
+            LIMIT :limite
+            """
+        ),
+        {'user_id': str(user_id), 'antes_de': antes_de, 'limite': limite},
+    ).mappings().all()
+
+    if not filas:
+        return []
+
+    saldo = _saldo_tras_movimiento(db, user_id, int(filas[0]['id']))
+    movimientos: list[dict[str, object]] = []
+    for fila in filas:
+        movimientos.append({**fila, 'saldo': saldo})
+        saldo -= int(fila['delta'])
+    return movimientos
+
+
+def tomar_snapshots_puntos(db: Session) -> int:
+    """Snapshot para los usuarios con suficientes movimientos nuevos; hace commit."""
+    creados = db.execute(
+        text(
+            """
+            WITH ultimo AS (
+                SELECT DISTINCT ON (user_id)
+                    user_id,
+                    ultimo_movimiento_id,
+                    saldo
+                FROM conexion_carga.puntos_snapshots
+                ORDER BY user_id, ultimo_movimiento_id DESC
+            ),
+            cola AS (
+                SELECT
+                    m.user_id,
+                    SUM(m.delta) AS suma,
+                    MAX(m.id) AS ultimo_id
+                FROM conexion_carga.puntos_movimientos m
+                LEFT JOIN ultimo s
+                  ON s.user_id = m.user_id
+                WHERE m.id > COALESCE(s.ultimo_movimiento_id, 0)
+                GROUP BY m.user_id
+                HAVING COUNT(*) >= :minimo
+            )
+            INSERT INTO conexion_carga.puntos_snapshots (
+                user_id,
+                ultimo_movimiento_id,
+                saldo,
+                hasta
+            )
+            SELECT
+                c.user_id,
+                c.ultimo_id,
+                COALESCE(s.saldo, 0) + c.suma,
+                m.creado_en
+            FROM cola c
+            LEFT JOIN ultimo s
+              ON s.user_id = c.user_id
+            JOIN conexion_carga.puntos_movimientos m
+              ON m.id = c.ultimo_id
+            ON CONFLICT (user_id, ultimo_movimiento_id) DO NOTHING
+            RETURNING user_id
+            """
+        ),
+        {'minimo': PUNTOS_SNAPSHOT_MIN_MOVIMIENTOS},
+    ).scalars().all()
+    db.commit()
+    return len(creados)
+
+
+def realinear_puntos_usuarios(db: Session) -> int:
+    """
+    Corrige users.points donde difiere del libro; hace commit. La condicion
+    sobre el valor observado descarta las filas que un cambio concurrente ya
+    actualizo (junto con su movimiento).
+    """
+    corregidos = db.execute(
+        text(
+            """
+            WITH ultimo AS (
+                SELECT DISTINCT ON (user_id)
+                    user_id,
+                    ultimo_movimiento_id,
+                    saldo
+                FROM conexion_carga.puntos_snapshots
+                ORDER BY user_id, ultimo_movimiento_id DESC
+            ),
+            cola AS (
+                SELECT m.user_id, SUM(m.delta) AS suma
+                FROM conexion_carga.puntos_movimientos m
+                LEFT JOIN ultimo s
+                  ON s.user_id = m.user_id
+                WHERE m.id > COALESCE(s.ultimo_movimiento_id, 0)
+                GROUP BY m.user_id
+            ),
+            libro AS (
+                SELECT
+                    u.id,
+                    COALESCE(u.points, 0) AS observado,
+                    COALESCE(s.saldo, 0) + COALESCE(c.suma, 0) AS saldo
+                FROM conexion_carga.users u
+                LEFT JOIN ultimo s
+                  ON s.user_id = u.id
+                LEFT JOIN cola c
+                  ON c.user_id = u.id
+            )
+            UPDATE conexion_carga.users u
+            SET points = l.saldo
+            FROM libro l
+            WHERE u.id = l.id
+              AND l.saldo <> l.observado
+              AND COALESCE(u.points, 0) = l.observado
+            RETURNING u.id
+            """
+        )
+    ).scalars().all()
+    db.commit()
+
+    if corregidos:
+        logger.warning('users.points difería del libro de puntos en %s usuarios', len(corregidos))
+    return len(corregidos)
+
+
+def _mantener_libro_si_disponible(db: Session) -> None:
+    if libro_puntos_disponible(db):
+        tomar_snapshots_puntos(db)
+        realinear_puntos_usuarios(db)
+
+
+def tarea_mantenimiento_libro_puntos() -> None:
+    # El lock es de una conexion fija (ver ejecutar_con_bloqueo): si no se
+    # obtiene es porque otro worker esta corriendo el mantenimiento.
+    if not ejecutar_con_bloqueo('mantenimiento_libro_puntos', _mantener_libro_si_disponible):
+        logger.info('Mantenimiento del libro de puntos omitido: lo ejecuta otro proceso')
@@ -0,0 +1,52 @@
+# app/services/normalizacion.py
+"""
+Normalizadores de texto compartidos por indices y busquedas.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+
+
+def normalizar_espacios(valor: object) -> str:
+    return ' '.join(str(valor or '').split())
+
+
+def normalizar_email(valor: object) -> str:
+    """Forma guardada en users.email y usada en las busquedas por LOWER(email)."""
+    return str(valor or '').strip().lower()
+
+
+def normalizar_clave_busqueda(valor: object) -> str:
+    """Minusculas, sin tildes y con espacios colapsados."""
+    texto = unicodedata.normalize('NFKD', normalizar_espacios(valor))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return texto.casefold()
+
+
+_TRADUCCION_RUTA = str.maketrans('áéíóúÁÉÍÓÚñÑ', 'aeiouAEIOUnN')
+_SEPARADORES_RUTA = re.compile(r'[-_/]+')
+
+
+def normalizar_ruta(valor: object) -> str:
+    """
+    Clave de agrupacion de origen/destino. Replica la expresion SQL
+    TRIM(REGEXP_REPLACE(REGEXP_REPLACE(UPPER(TRANSLATE(v, 'áéíóúÁÉÍÓÚñÑ',
+    'aeiouAEIOUnN')), '[-_/]+', ' ', 'g'), '\\s+', ' ', 'g')) usada en
+    scripts_sql/05_carga_rutas_normalizadas.sql.
+    """
+    texto = str(valor or '').translate(_TRADUCCION_RUTA).upper()
+    return normalizar_espacios(_SEPARADORES_RUTA.sub(' ', texto))
+
+
+_TRADUCCION_BUSQUEDA_USUARIO = str.maketrans('áéíóúüñÁÉÍÓÚÜÑ', 'aeiouunAEIOUUN')
+
+
+def normalizar_busqueda_usuario(valor: object) -> str:
+    """
+    Termino comparable con users.busqueda: replica LOWER(TRANSLATE(v,
+    'áéíóúüñÁÉÍÓÚÜÑ', 'aeiouunAEIOUUN')) de
+    scripts_sql/10_users_busqueda_trigram.sql.
+    """
+    return str(valor or '').translate(_TRADUCCION_BUSQUEDA_USUARIO).lower()
@@ -0,0 +1,53 @@
+# app/services/paginacion_keyset.py
+"""
+Cursores opacos para paginacion por clave (keyset).
+
+El cursor guarda los valores de la clave de orden de la ultima fila enviada;
+la pagina siguiente filtra con una comparacion de filas contra esos valores,
+de modo que cualquier pagina cuesta lo mismo que la primera.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from uuid import UUID
+
+
+class CursorInvalidoError(ValueError):
+    pass
+
+
+def _valor_json(valor: object) -> object:
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, UUID):
+        return str(valor)
+    raise TypeError(f'Valor no serializable en cursor: {valor!r}')
+
+
+def codificar_cursor(valores: list[object]) -> str:
+    contenido = json.dumps(valores, default=_valor_json, separators=(',', ':'))
+    return base64.urlsafe_b64encode(contenido.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor: str, cantidad: int) -> list[object]:
+    """Valores del cursor; lanza CursorInvalidoError si no tiene `cantidad` valores."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError) as exc:
+        raise CursorInvalidoError('Cursor invalido.') from exc
+
+    if not isinstance(valores, list) or len(valores) != cantidad:
+        raise CursorInvalidoError('Cursor invalido.')
+    return valores
+
+
+def fecha_hora_cursor(valor: object) -> datetime:
+    try:
+        return datetime.fromisoformat(str(valor))
+    except ValueError as exc:
+        raise CursorInvalidoError('Cursor invalido.') from exc
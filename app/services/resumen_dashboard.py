@@ -0,0 +1,279 @@
+# app/services/resumen_dashboard.py
+"""
+Resumen diario del dashboard admin (conexion_carga.dashboard_resumen_diario).
+
+Cada dia guarda los viajes publicados que siguen activos/inactivos (por fecha
+de publicacion) y los eliminados (por fecha de eliminacion). Las escrituras
+miden la contribucion de las cargas afectadas antes y despues del cambio y
+suman la diferencia dentro de su propia transaccion; una tarea periodica lo
+recalcula desde las tablas base para corregir derivas. Los mismos deltas se
+publican al canal en vivo del dashboard (app/services/eventos_dashboard.py).
+
+Los dias son fechas locales de DASHBOARD_ZONA_HORARIA (por defecto
+America/Bogota); las columnas timestamp de la BD se interpretan como UTC. Al
+cambiar la zona, la reconciliacion que corre al iniciar reescribe los dias.
+
+Sin scripts_sql/04_dashboard_resumen_diario.sql los ajustes son no-op (sin
+deltas en vivo) y el dashboard sigue consultando las tablas base.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, time, timezone
+from typing import Iterable, Iterator
+from uuid import UUID
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.eliminacion_viajes import condicion_no_eliminado_sql
+from app.services.estructura_bd import tabla_existe
+from app.services.eventos_dashboard import notificar_deltas_dashboard
+from app.services.tareas_periodicas import ejecutar_con_bloqueo
+
+TABLA_RESUMEN = 'dashboard_resumen_diario'
+COLUMNAS_RESUMEN = ('activos', 'inactivos', 'eliminados')
+
+DASHBOARD_ZONA_HORARIA = os.getenv('DASHBOARD_ZONA_HORARIA', 'America/Bogota')
+# Valida el nombre antes de incrustarlo en SQL.
+ZONA_DASHBOARD = ZoneInfo(DASHBOARD_ZONA_HORARIA)
+
+# (dia, columna) -> cantidad
+ContribucionResumen = Counter
+
+
+def resumen_diario_disponible(db: Session) -> bool:
+    return tabla_existe(db, TABLA_RESUMEN)
+
+
+def fecha_local_sql(columna: str, unidad: str | None = None) -> str:
+    """
+    Fecha local (zona del dashboard) de una columna timestamp guardada en UTC;
+    con `unidad` ('day', 'week', 'month') devuelve el inicio del bucket.
+    """
+    local = f"(({columna}) AT TIME ZONE 'UTC') AT TIME ZONE '{DASHBOARD_ZONA_HORARIA}'"
+    if unidad:
+        local = f"date_trunc('{unidad}', {local})"
+    return f'CAST({local} AS date)'
+
+
+def inicio_dia_utc(dia: date) -> datetime:
+    """Medianoche local de `dia` expresada como timestamp UTC sin zona."""
+    return (
+        datetime.combine(dia, time.min, tzinfo=ZONA_DASHBOARD)
+        .astimezone(timezone.utc)
+        .replace(tzinfo=None)
+    )
+
+
+def contribucion_cargas(db: Session, carga_ids: Iterable[UUID | str]) -> ContribucionResumen:
+    """Lo que aportan hoy las cargas indicadas al resumen diario."""
+    ids = [str(carga_id) for carga_id in carga_ids]
+    if not ids or not resumen_diario_disponible(db):
+        return Counter()
+
+    filas = db.execute(
+        text(
+            f"""
+            SELECT
+                {fecha_local_sql('c.created_at')} AS dia_publicacion,
+                CASE
+                    WHEN c.estado <> 'publicado' OR NOT ({condicion_no_eliminado_sql(db, 'c')}) THEN NULL
+                    WHEN c.activo IS TRUE THEN 'activos'
+                    WHEN c.activo IS FALSE THEN 'inactivos'
+                END AS columna,
+                (
+                    SELECT {fecha_local_sql('MIN(ce.eliminado_en)')}
+                    FROM conexion_carga.carga_eliminada ce
+                    WHERE ce.carga_id = c.id
+                ) AS dia_eliminacion
+            FROM conexion_carga.carga c
+            WHERE c.id = ANY(CAST(:ids AS uuid[]))
+            """
+        ),
+        {'ids': ids},
+    ).mappings().all()
+
+    contribucion: ContribucionResumen = Counter()
+    for fila in filas:
+        if fila['columna'] and fila['dia_publicacion']:
+            contribucion[(fila['dia_publicacion'], fila['columna'])] += 1
+        if fila['dia_eliminacion']:
+            contribucion[(fila['dia_eliminacion'], 'eliminados')] += 1
+
+    return contribucion
+
+
+def ajustar_resumen_diario(
+    db: Session,
+    antes: ContribucionResumen,
+    despues: ContribucionResumen,
+) -> None:
+    """
+    Suma `despues - antes` al resumen dentro de la transaccion actual (sin
+    commit) y publica los mismos deltas para los clientes en vivo.
+    """
+    deltas: dict[date, dict[str, int]] = {}
+    for clave in set(antes) | set(despues):
+        delta = despues[clave] - antes[clave]
+        if not delta:
+            continue
+        dia, columna = clave
+        deltas.setdefault(dia, dict.fromkeys(COLUMNAS_RESUMEN, 0))[columna] += delta
+
+    if not deltas or not resumen_diario_disponible(db):
+        return
+
+    db.execute(
+        text(
+            """
+            INSERT INTO conexion_carga.dashboard_resumen_diario AS r (
+                dia,
+                activos,
+                inactivos,
+                eliminados,
+                actualizado_en
+            )
+            SELECT
+                x.dia,
+                x.activos,
+                x.inactivos,
+                x.eliminados,
+                NOW()
+            FROM jsonb_to_recordset(CAST(:filas AS jsonb))
+                AS x(dia date, activos integer, inactivos integer, eliminados integer)
+            ON CONFLICT (dia) DO UPDATE
+            SET
+                activos = r.activos + EXCLUDED.activos,
+                inactivos = r.inactivos + EXCLUDED.inactivos,
+                eliminados = r.eliminados + EXCLUDED.eliminados,
+                actualizado_en = NOW()
+            """
+        ),
+        {
+            'filas': json.dumps(
+                [{'dia': dia.isoformat(), **columnas} for dia, columnas in deltas.items()]
+            ),
+        },
+    )
+    notificar_deltas_dashboard(db, deltas)
+
+
+@contextmanager
+def registrar_cambio_resumen(
+    db: Session,
+    carga_ids: Iterable[UUID | str],
+) -> Iterator[None]:
+    """
+    Envuelve una modificacion de cargas existentes y ajusta el resumen con la
+    diferencia de su contribucion (hace flush, no commit).
+    """
+    ids = [str(carga_id) for carga_id in carga_ids]
+    antes = contribucion_cargas(db, ids)
+    yield
+    db.flush()
+    ajustar_resumen_diario(db, antes, contribucion_cargas(db, ids))
+
+
+def registrar_vencimientos_resumen(db: Session, dias_publicacion: Iterable[date]) -> None:
+    """Mueve de activos a inactivos un viaje por cada dia de publicacion recibido."""
+    dias = Counter(dias_publicacion)
+    ajustar_resumen_diario(
+        db,
+        Counter({(dia, 'activos'): total for dia, total in dias.items()}),
+        Counter({(dia, 'inactivos'): total for dia, total in dias.items()}),
+    )
+
+
+def reconciliar_resumen_diario(db: Session) -> int:
+    """Recalcula el resumen desde las tablas base; devuelve los dias corregidos."""
+    corregidos = db.execute(
+        text(
+            f"""
+            WITH fuente AS (
+                SELECT
+                    t.dia,
+                    SUM(t.activos) AS activos,
+                    SUM(t.inactivos) AS inactivos,
+                    SUM(t.eliminados) AS eliminados
+                FROM (
+                    SELECT
+                        {fecha_local_sql('c.created_at')} AS dia,
+                        COUNT(*) FILTER (WHERE c.activo IS TRUE) AS activos,
+                        COUNT(*) FILTER (WHERE c.activo IS FALSE) AS inactivos,
+                        0 AS eliminados
+                    FROM conexion_carga.carga c
+                    WHERE c.estado = 'publicado'
+                      AND {condicion_no_eliminado_sql(db, 'c')}
+                    GROUP BY 1
+
+                    UNION ALL
+
+                    SELECT
+                        e.dia,
+                        0,
+                        0,
+                        COUNT(*)
+                    FROM (
+                        SELECT {fecha_local_sql('MIN(ce.eliminado_en)')} AS dia
+                        FROM conexion_carga.carga_eliminada ce
+                        GROUP BY ce.carga_id
+                    ) e
+                    GROUP BY e.dia
+                ) t
+                GROUP BY t.dia
+            ),
+            diferencias AS (
+                SELECT
+                    COALESCE(f.dia, r.dia) AS dia,
+                    COALESCE(f.activos, 0) AS activos,
+                    COALESCE(f.inactivos, 0) AS inactivos,
+                    COALESCE(f.eliminados, 0) AS eliminados
+                FROM fuente f
+                FULL JOIN conexion_carga.dashboard_resumen_diario r
+                  ON r.dia = f.dia
+                WHERE (
+                    COALESCE(f.activos, 0),
+                    COALESCE(f.inactivos, 0),
+                    COALESCE(f.eliminados, 0)
+                ) IS DISTINCT FROM (
+                    COALESCE(r.activos, 0),
+                    COALESCE(r.inactivos, 0),
+                    COALESCE(r.eliminados, 0)
+                )
+            )
+            INSERT INTO conexion_carga.dashboard_resumen_diario (
+                dia,
+                activos,
+                inactivos,
+                eliminados,
+                actualizado_en
+            )
+            SELECT dia, activos, inactivos, eliminados, NOW()
+            FROM diferencias
+            ON CONFLICT (dia) DO UPDATE
+            SET
+                activos = EXCLUDED.activos,
+                inactivos = EXCLUDED.inactivos,
+                eliminados = EXCLUDED.eliminados,
+                actualizado_en = NOW()
+            RETURNING dia
+            """
+        )
+    ).scalars().all()
+    db.commit()
+    return len(corregidos)
+
+
+def _reconciliar_si_disponible(db: Session) -> None:
+    if resumen_diario_disponible(db):
+        reconciliar_resumen_diario(db)
+
+
+def tarea_reconciliacion_resumen_diario() -> None:
+    ejecutar_con_bloqueo('reconciliacion_resumen_dashboard', _reconciliar_si_disponible)
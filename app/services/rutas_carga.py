@@ -0,0 +1,49 @@
+# app/services/rutas_carga.py
+"""
+Columnas carga.origen_norm / carga.destino_norm (scripts_sql/05_carga_rutas_normalizadas.sql).
+
+No se mapean en el modelo para no romper instalaciones sin el script; se
+escriben con un UPDATE dentro de la misma transaccion que crea o edita el viaje.
+"""
+
+from __future__ import annotations
+
+from uuid import UUID
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.services.estructura_bd import columna_existe
+from app.services.normalizacion import normalizar_ruta
+
+
+def rutas_normalizadas_disponibles(db: Session) -> bool:
+    return columna_existe(db, 'carga', 'origen_norm') and columna_existe(db, 'carga', 'destino_norm')
+
+
+def guardar_ruta_normalizada(
+    db: Session,
+    carga_id: UUID | str,
+    origen: object,
+    destino: object,
+) -> None:
+    """Actualiza las claves normalizadas de la carga (sin commit)."""
+    if not rutas_normalizadas_disponibles(db):
+        return
+
+    db.execute(
+        text(
+            """
+            UPDATE conexion_carga.carga
+            SET
+                origen_norm = :origen_norm,
+                destino_norm = :destino_norm
+            WHERE id = CAST(:carga_id AS uuid)
+            """
+        ),
+        {
+            'carga_id': str(carga_id),
+            'origen_norm': normalizar_ruta(origen),
+            'destino_norm': normalizar_ruta(destino),
+        },
+    )
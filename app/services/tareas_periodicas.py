@@ -0,0 +1,134 @@
+# app/services/tareas_periodicas.py
+"""
+Planificador minimo de tareas periodicas en hilos de fondo.
+
+Cada tarea corre en su propio hilo daemon. Las tareas que usan BD deben
+ejecutarse con `ejecutar_con_bloqueo`, que toma un advisory lock de Postgres
+para que solo un worker de uvicorn la ejecute a la vez.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+TAREAS_PERIODICAS_HABILITADAS = os.getenv('TAREAS_PERIODICAS_HABILITADAS', 'true').lower() in {
+    '1',
+    'true',
+    'si',
+    'yes',
+}
+
+
+@dataclass
+class _TareaPeriodica:
+    nombre: str
+    intervalo_segundos: float
+    funcion: Callable[[], None]
+    ejecutar_al_iniciar: bool = False
+    hilo: threading.Thread | None = field(default=None)
+
+
+_tareas: dict[str, _TareaPeriodica] = {}
+_detener = threading.Event()
+
+
+def registrar_tarea(
+    nombre: str,
+    intervalo_segundos: float,
+    funcion: Callable[[], None],
+    ejecutar_al_iniciar: bool = False,
+) -> None:
+    _tareas[nombre] = _TareaPeriodica(
+        nombre=nombre,
+        intervalo_segundos=max(1.0, float(intervalo_segundos)),
+        funcion=funcion,
+        ejecutar_al_iniciar=ejecutar_al_iniciar,
+    )
+
+
+def _ejecutar_tarea(tarea: _TareaPeriodica) -> None:
+    try:
+        tarea.funcion()
+    except Exception:
+        logger.exception('Fallo la tarea periodica %s', tarea.nombre)
+
+
+def _ciclo_tarea(tarea: _TareaPeriodica) -> None:
+    if tarea.ejecutar_al_iniciar:
+        _ejecutar_tarea(tarea)
+
+    while not _detener.wait(tarea.intervalo_segundos):
+        _ejecutar_tarea(tarea)
+
+
+def iniciar_tareas_periodicas() -> None:
+    if not TAREAS_PERIODICAS_HABILITADAS:
+        return
+
+    _detener.clear()
+    for tarea in _tareas.values():
+        if tarea.hilo and tarea.hilo.is_alive():
+            continue
+
+        tarea.hilo = threading.Thread(
+            target=_ciclo_tarea,
+            args=(tarea,),
+            name=f'tarea-{tarea.nombre}',
+            daemon=True,
+        )
+        tarea.hilo.start()
+
+
+def detener_tareas_periodicas() -> None:
+    _detener.set()
+
+
+def ejecutar_con_bloqueo(nombre: str, funcion: Callable[[Session], None]) -> bool:
+    """
+    Ejecuta `funcion` con una sesion propia si obtiene el advisory lock `nombre`.
+    Retorna False si otro proceso ya la esta ejecutando.
+
+    El lock es de sesion de Postgres: se toma y se libera en una misma
+    conexion fija, a la que se liga la sesion de `funcion` (sus commits no
+    la devuelven al pool).
+    """
+    with engine.connect() as conexion:
+        obtenido = bool(
+            conexion.execute(
+                text('SELECT pg_try_advisory_lock(hashtext(:nombre))'),
+                {'nombre': nombre},
+            ).scalar()
+        )
+        conexion.commit()
+        if not obtenido:
+            return False
+
+        db = SessionLocal(bind=conexion)
+        try:
+            funcion(db)
+        finally:
+            db.rollback()
+            db.close()
+            try:
+                conexion.execute(
+                    text('SELECT pg_advisory_unlock(hashtext(:nombre))'),
+                    {'nombre': nombre},
+                )
+                conexion.commit()
+            except Exception:
+                # Descartar la conexion cierra la sesion de Postgres y libera el lock.
+                conexion.invalidate()
+                raise
+
+        return True
@@ -0,0 +1,30 @@
+-- 03_carga_eliminado_flag.sql
+-- Marca denormalizada de eliminacion administrativa en conexion_carga.carga.
+-- Reemplaza el anti-join NOT EXISTS (carga_eliminada) en listados y dashboard.
+-- Requiere 02_eliminacion_controlada_viajes.sql. Es idempotente.
+
+BEGIN;
+
+ALTER TABLE conexion_carga.carga
+    ADD COLUMN IF NOT EXISTS eliminado BOOLEAN NOT NULL DEFAULT FALSE,
+    ADD COLUMN IF NOT EXISTS eliminado_en TIMESTAMP NULL;
+
+-- Backfill unico desde el historial de eliminacion.
+UPDATE conexion_carga.carga c
+SET
+    eliminado = TRUE,
+    eliminado_en = ce.eliminado_en
+FROM conexion_carga.carga_eliminada ce
+WHERE ce.carga_id = c.id
+  AND (c.eliminado IS DISTINCT FROM TRUE OR c.eliminado_en IS NULL);
+
+COMMIT;
+
+-- Indice parcial para listados admin y dashboard sobre viajes no eliminados.
+CREATE INDEX IF NOT EXISTS ix_carga_publicado_no_eliminado_created_at
+    ON conexion_carga.carga (created_at DESC)
+    WHERE estado = 'publicado' AND eliminado = FALSE;
+
+CREATE INDEX IF NOT EXISTS ix_carga_eliminado_en
+    ON conexion_carga.carga (eliminado_en)
+    WHERE eliminado = TRUE;
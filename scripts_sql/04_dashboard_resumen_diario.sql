@@ -0,0 +1,66 @@
+-- 04_dashboard_resumen_diario.sql
+-- Resumen diario precalculado para el dashboard administrativo.
+-- activos/inactivos: viajes publicados no eliminados, por dia de created_at.
+-- eliminados: viajes eliminados, por dia de eliminacion.
+-- Los dias son locales (America/Bogota): los timestamps se guardan en UTC y
+-- se convierten como fecha_local_sql en app/services/resumen_dashboard.py.
+-- Si se cambia DASHBOARD_ZONA_HORARIA, ajustar aqui la misma zona.
+-- La aplicacion lo ajusta en cada alta, vencimiento, republicacion y
+-- eliminacion, y lo reconcilia periodicamente.
+-- Requiere 02_eliminacion_controlada_viajes.sql. Es idempotente.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS conexion_carga.dashboard_resumen_diario (
+    dia DATE PRIMARY KEY,
+    activos INTEGER NOT NULL DEFAULT 0,
+    inactivos INTEGER NOT NULL DEFAULT 0,
+    eliminados INTEGER NOT NULL DEFAULT 0,
+    actualizado_en TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Carga inicial desde las tablas base.
+INSERT INTO conexion_carga.dashboard_resumen_diario (dia, activos, inactivos, eliminados)
+SELECT
+    t.dia,
+    SUM(t.activos),
+    SUM(t.inactivos),
+    SUM(t.eliminados)
+FROM (
+    SELECT
+        CAST((c.created_at AT TIME ZONE 'UTC') AT TIME ZONE 'America/Bogota' AS date) AS dia,
+        COUNT(*) FILTER (WHERE c.activo IS TRUE) AS activos,
+        COUNT(*) FILTER (WHERE c.activo IS FALSE) AS inactivos,
+        0 AS eliminados
+    FROM conexion_carga.carga c
+    WHERE c.estado = 'publicado'
+      AND NOT EXISTS (
+            SELECT 1
+            FROM conexion_carga.carga_eliminada ce
+            WHERE ce.carga_id = c.id
+      )
+    GROUP BY 1
+
+    UNION ALL
+
+    SELECT
+        e.dia,
+        0,
+        0,
+        COUNT(*)
+    FROM (
+        SELECT CAST((MIN(ce.eliminado_en) AT TIME ZONE 'UTC') AT TIME ZONE 'America/Bogota' AS date) AS dia
+        FROM conexion_carga.carga_eliminada ce
+        GROUP BY ce.carga_id
+    ) e
+    GROUP BY e.dia
+) t
+GROUP BY t.dia
+ON CONFLICT (dia) DO UPDATE
+SET
+    activos = EXCLUDED.activos,
+    inactivos = EXCLUDED.inactivos,
+    eliminados = EXCLUDED.eliminados,
+    actualizado_en = NOW();
+
+COMMIT;
@@ -0,0 +1,50 @@
+-- 05_carga_rutas_normalizadas.sql
+-- Claves normalizadas de origen/destino para el top de rutas del dashboard.
+-- La aplicacion las escribe al crear, republicar y editar viajes con
+-- app.services.normalizacion.normalizar_ruta, que replica esta expresion.
+-- Es idempotente; el backfill puede re-ejecutarse para filas sin clave.
+
+BEGIN;
+
+ALTER TABLE conexion_carga.carga
+    ADD COLUMN IF NOT EXISTS origen_norm VARCHAR NULL,
+    ADD COLUMN IF NOT EXISTS destino_norm VARCHAR NULL;
+
+UPDATE conexion_carga.carga c
+SET
+    origen_norm = TRIM(
+        REGEXP_REPLACE(
+            REGEXP_REPLACE(
+                UPPER(TRANSLATE(COALESCE(c.origen, ''), 'áéíóúÁÉÍÓÚñÑ', 'aeiouAEIOUnN')),
+                '[-_/]+',
+                ' ',
+                'g'
+            ),
+            '\s+',
+            ' ',
+            'g'
+        )
+    ),
+    destino_norm = TRIM(
+        REGEXP_REPLACE(
+            REGEXP_REPLACE(
+                UPPER(TRANSLATE(COALESCE(c.destino, ''), 'áéíóúÁÉÍÓÚñÑ', 'aeiouAEIOUnN')),
+                '[-_/]+',
+                ' ',
+                'g'
+            ),
+            '\s+',
+            ' ',
+            'g'
+        )
+    )
+WHERE c.origen_norm IS NULL
+   OR c.destino_norm IS NULL;
+
+COMMIT;
+
+-- Agrupacion por ruta resuelta con un index-only scan (incluye created_at
+-- para el desempate por primera publicacion).
+CREATE INDEX IF NOT EXISTS ix_carga_publicado_ruta_norm
+    ON conexion_carga.carga (origen_norm, destino_norm, created_at)
+    WHERE estado = 'publicado';
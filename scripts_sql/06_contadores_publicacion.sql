@@ -0,0 +1,59 @@
+-- 06_contadores_publicacion.sql
+-- Contadores historicos de viajes publicados por usuario y por empresa para
+-- los rankings del dashboard administrativo. La aplicacion los incrementa al
+-- crear viajes y una tarea periodica los reconcilia con conexion_carga.carga.
+-- Es idempotente.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS conexion_carga.dashboard_publicaciones_usuario (
+    usuario_id UUID PRIMARY KEY
+        REFERENCES conexion_carga.users (id) ON DELETE CASCADE,
+    total INTEGER NOT NULL DEFAULT 0,
+    primera_publicacion TIMESTAMP NULL,
+    actualizado_en TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS conexion_carga.dashboard_publicaciones_empresa (
+    empresa VARCHAR PRIMARY KEY,
+    total INTEGER NOT NULL DEFAULT 0,
+    primera_publicacion TIMESTAMP NULL,
+    actualizado_en TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO conexion_carga.dashboard_publicaciones_usuario (usuario_id, total, primera_publicacion)
+SELECT c.comercial_id, COUNT(*), MIN(c.created_at)
+FROM conexion_carga.carga c
+WHERE c.estado = 'publicado'
+GROUP BY c.comercial_id
+ON CONFLICT (usuario_id) DO UPDATE
+SET
+    total = EXCLUDED.total,
+    primera_publicacion = EXCLUDED.primera_publicacion,
+    actualizado_en = NOW();
+
+INSERT INTO conexion_carga.dashboard_publicaciones_empresa (empresa, total, primera_publicacion)
+SELECT
+    COALESCE(NULLIF(TRIM(c.empresa), ''), NULLIF(TRIM(u.company_name), '')),
+    COUNT(*),
+    MIN(c.created_at)
+FROM conexion_carga.carga c
+LEFT JOIN conexion_carga.users u
+  ON u.id = c.comercial_id
+WHERE c.estado = 'publicado'
+  AND COALESCE(NULLIF(TRIM(c.empresa), ''), NULLIF(TRIM(u.company_name), '')) IS NOT NULL
+GROUP BY 1
+ON CONFLICT (empresa) DO UPDATE
+SET
+    total = EXCLUDED.total,
+    primera_publicacion = EXCLUDED.primera_publicacion,
+    actualizado_en = NOW();
+
+COMMIT;
+
+-- Top-N leido directamente en orden del indice.
+CREATE INDEX IF NOT EXISTS ix_dashboard_publicaciones_usuario_top
+    ON conexion_carga.dashboard_publicaciones_usuario (total DESC, primera_publicacion ASC);
+
+CREATE INDEX IF NOT EXISTS ix_dashboard_publicaciones_empresa_top
+    ON conexion_carga.dashboard_publicaciones_empresa (total DESC, primera_publicacion ASC);
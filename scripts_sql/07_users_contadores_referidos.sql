@@ -0,0 +1,38 @@
+-- 07_users_contadores_referidos.sql
+-- Contadores de referidos denormalizados en conexion_carga.users para el
+-- ranking de puntos. La aplicacion los ajusta al crear, verificar, cambiar
+-- o retirar referidos y una tarea periodica los reconcilia.
+-- Es idempotente.
+
+BEGIN;
+
+ALTER TABLE conexion_carga.users
+    ADD COLUMN IF NOT EXISTS referred_count INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS referred_active_count INTEGER NOT NULL DEFAULT 0;
+
+-- Carga inicial desde users.
+UPDATE conexion_carga.users u
+SET
+    referred_count = COALESCE(f.referred_count, 0),
+    referred_active_count = COALESCE(f.referred_active_count, 0)
+FROM conexion_carga.users base
+LEFT JOIN (
+    SELECT
+        referred_by_id AS id,
+        COUNT(*) AS referred_count,
+        COUNT(*) FILTER (WHERE active IS TRUE) AS referred_active_count
+    FROM conexion_carga.users
+    WHERE referred_by_id IS NOT NULL
+    GROUP BY referred_by_id
+) f
+  ON f.id = base.id
+WHERE u.id = base.id
+  AND (u.referred_count, u.referred_active_count)
+      IS DISTINCT FROM (COALESCE(f.referred_count, 0), COALESCE(f.referred_active_count, 0));
+
+-- Busqueda de referidos directos y ajustes por referidor.
+CREATE INDEX IF NOT EXISTS ix_users_referred_by_id
+    ON conexion_carga.users (referred_by_id)
+    WHERE referred_by_id IS NOT NULL;
+
+COMMIT;
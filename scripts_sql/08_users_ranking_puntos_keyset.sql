@@ -0,0 +1,8 @@
+-- 08_users_ranking_puntos_keyset.sql
+-- Indice para la paginacion por cursor del ranking de puntos. El orden
+-- COALESCE(points, 0) DESC, created_at, LOWER(email), id se indexa con el
+-- puntaje negado para que la clave tenga un solo sentido y admita la
+-- comparacion de filas del cursor. Es idempotente.
+
+CREATE INDEX IF NOT EXISTS ix_users_ranking_puntos_keyset
+    ON conexion_carga.users ((-COALESCE(points, 0)), created_at, LOWER(email), id);
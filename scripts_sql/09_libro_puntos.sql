@@ -0,0 +1,53 @@
+-- 09_libro_puntos.sql
+-- Libro de puntos de solo insercion (movimientos) con snapshots por usuario.
+-- users.points queda como cache derivada: la aplicacion la actualiza junto
+-- con cada movimiento y una tarea periodica la realinea con el libro.
+-- El saldo a una fecha es el ultimo snapshot anterior mas los movimientos
+-- posteriores a el. Es idempotente.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS conexion_carga.puntos_movimientos (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL
+        REFERENCES conexion_carga.users (id) ON DELETE CASCADE,
+    delta INTEGER NOT NULL,
+    origen VARCHAR(60) NOT NULL,
+    admin_user_id UUID NULL,
+    detalle TEXT NULL,
+    creado_en TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+);
+
+CREATE INDEX IF NOT EXISTS ix_puntos_movimientos_usuario
+    ON conexion_carga.puntos_movimientos (user_id, id);
+
+CREATE INDEX IF NOT EXISTS ix_puntos_movimientos_usuario_fecha
+    ON conexion_carga.puntos_movimientos (user_id, creado_en);
+
+-- saldo: puntos del usuario tras el movimiento ultimo_movimiento_id
+-- (registrado en `hasta`).
+CREATE TABLE IF NOT EXISTS conexion_carga.puntos_snapshots (
+    user_id UUID NOT NULL
+        REFERENCES conexion_carga.users (id) ON DELETE CASCADE,
+    ultimo_movimiento_id BIGINT NOT NULL,
+    saldo INTEGER NOT NULL,
+    hasta TIMESTAMP NOT NULL,
+    tomado_en TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (user_id, ultimo_movimiento_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_puntos_snapshots_usuario_hasta
+    ON conexion_carga.puntos_snapshots (user_id, hasta);
+
+-- Saldo inicial: un movimiento por usuario con puntos y sin libro previo.
+INSERT INTO conexion_carga.puntos_movimientos (user_id, delta, origen, detalle, creado_en)
+SELECT u.id, u.points, 'saldo_inicial', 'Saldo al habilitar el libro de puntos.', NOW()
+FROM conexion_carga.users u
+WHERE COALESCE(u.points, 0) <> 0
+  AND NOT EXISTS (
+        SELECT 1
+        FROM conexion_carga.puntos_movimientos m
+        WHERE m.user_id = u.id
+  );
+
+COMMIT;
@@ -0,0 +1,25 @@
+-- 10_users_busqueda_trigram.sql
+-- Columna de busqueda de usuarios (correo, nombre completo, telefono y
+-- empresa) sin tildes y en minusculas, con indice GIN de trigramas para los
+-- filtros LIKE '%termino%' del listado de usuarios y el ranking de puntos.
+-- Los campos se separan con '|' para que un termino no combine dos campos
+-- (nombre y apellido van juntos, separados por espacio).
+-- Es idempotente.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE conexion_carga.users
+    ADD COLUMN IF NOT EXISTS busqueda TEXT GENERATED ALWAYS AS (
+        LOWER(TRANSLATE(
+            COALESCE(email, '') || '|'
+            || COALESCE(first_name, '') || ' ' || COALESCE(last_name, '') || '|'
+            || COALESCE(phone, '') || '|'
+            || COALESCE(company_name, ''),
+            'áéíóúüñÁÉÍÓÚÜÑ',
+            'aeiouunAEIOUUN'
+        ))
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS ix_users_busqueda_trgm
+    ON conexion_carga.users
+    USING gin (busqueda gin_trgm_ops);
@@ -0,0 +1,38 @@
+-- 11_users_email_normalizado.sql
+-- Correos en minusculas con unicidad sin distinguir mayusculas. Las busquedas
+-- por correo (login, registro, recuperacion de contraseña, verificacion y
+-- validaciones de duplicados) filtran por LOWER(email), que el indice unico
+-- sobre email no cubre; ux_users_email_lower las resuelve con un acceso por
+-- indice y ademas impide registrar el mismo correo con otras mayusculas.
+-- Si ya existen correos repetidos sin distinguir mayusculas el script se
+-- detiene y los lista para resolverlos a mano. Es idempotente.
+
+BEGIN;
+
+DO $$
+DECLARE
+    repetidos TEXT;
+BEGIN
+    SELECT STRING_AGG(correo, ', ' ORDER BY correo)
+    INTO repetidos
+    FROM (
+        SELECT LOWER(TRIM(email)) AS correo
+        FROM conexion_carga.users
+        GROUP BY LOWER(TRIM(email))
+        HAVING COUNT(*) > 1
+    ) r;
+
+    IF repetidos IS NOT NULL THEN
+        RAISE EXCEPTION 'Correos repetidos sin distinguir mayusculas: %', repetidos;
+    END IF;
+END
+$$;
+
+UPDATE conexion_carga.users
+SET email = LOWER(TRIM(email))
+WHERE email <> LOWER(TRIM(email));
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_users_email_lower
+    ON conexion_carga.users (LOWER(email));
+
+COMMIT;
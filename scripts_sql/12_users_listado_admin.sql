@@ -0,0 +1,31 @@
+-- 12_users_listado_admin.sql
+-- Indices del listado de usuarios de administracion (/api/admin/usuarios),
+-- ordenado por created_at DESC, id DESC y paginado por cursor sobre esa
+-- clave. Cubren el listado sin filtros y el filtro de estado (compuesto),
+-- y cada filtro de tipo (parciales, con el mismo predicado que la consulta).
+-- El rango de fechas se resuelve sobre created_at en cualquiera de ellos.
+-- Es idempotente.
+
+CREATE INDEX IF NOT EXISTS ix_users_admin_orden
+    ON conexion_carga.users (created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS ix_users_admin_estado
+    ON conexion_carga.users (active, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS ix_users_admin_empresa
+    ON conexion_carga.users (created_at DESC, id DESC)
+    WHERE is_company = TRUE;
+
+CREATE INDEX IF NOT EXISTS ix_users_admin_conductor
+    ON conexion_carga.users (created_at DESC, id DESC)
+    WHERE is_driver = TRUE;
+
+CREATE INDEX IF NOT EXISTS ix_users_admin_premium
+    ON conexion_carga.users (created_at DESC, id DESC)
+    WHERE is_premium = TRUE;
+
+CREATE INDEX IF NOT EXISTS ix_users_admin_usuario
+    ON conexion_carga.users (created_at DESC, id DESC)
+    WHERE is_company = FALSE
+      AND is_driver = FALSE
+      AND is_premium = FALSE;
@@ -0,0 +1,58 @@
+"""
+Fixtures de pruebas contra PostgreSQL.
+
+Las pruebas usan la BD de TEST_DATABASE_URL (con los scripts de scripts_sql/
+aplicados) y se omiten si no esta configurada. Cada prueba corre en una
+transaccion que se revierte al terminar.
+"""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# app.security se importa a traves de app.crud (importacion circular).
+import app.crud  # noqa: F401
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+
+
+@pytest.fixture(scope='session')
+def motor():
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL no esta configurada.')
+
+    motor = create_engine(TEST_DATABASE_URL)
+    yield motor
+    motor.dispose()
+
+
+@pytest.fixture
+def db(motor):
+    conexion = motor.connect()
+    transaccion = conexion.begin()
+    sesion = sessionmaker(bind=conexion, autoflush=False)()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+        transaccion.rollback()
+        conexion.close()
+
+
+@pytest.fixture
+def sentencias(motor):
+    """SQL enviado a la BD mientras dura la prueba."""
+    registradas: list[str] = []
+
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        registradas.append(statement)
+
+    event.listen(motor, 'before_cursor_execute', _registrar)
+    try:
+        yield registradas
+    finally:
+        event.remove(motor, 'before_cursor_execute', _registrar)
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import text
+
+from app.services.busqueda_usuarios import busqueda_usuarios_disponible, filtro_busqueda_usuarios
+
+
+@pytest.mark.parametrize('termino', ['transportes', 'Muñoz', '3001234567'])
+def test_busqueda_usa_indice_trigram(db, termino):
+    if not busqueda_usuarios_disponible(db):
+        pytest.skip('users.busqueda no existe (scripts_sql/10 sin aplicar).')
+
+    filtro, params = filtro_busqueda_usuarios(db, termino)
+    # Con pocas filas el planner prefiere el seq scan aunque el indice sirva.
+    db.execute(text('SET LOCAL enable_seqscan = off'))
+    plan = '\n'.join(
+        db.execute(
+            text(f'EXPLAIN SELECT u.id FROM conexion_carga.users u WHERE {filtro}'),
+            params,
+        ).scalars()
+    )
+
+    assert 'ix_users_busqueda_trgm' in plan, plan
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from app.routers.dashboard_admin import (
+    UNIDADES_SQL_GRANULARIDAD,
+    _calcular_resumen_dashboard,
+    _obtener_conteos_tablas_base,
+    _obtener_rango_periodo,
+)
+from app.services.eliminacion_viajes import condicion_no_eliminado_sql
+from app.services.resumen_dashboard import fecha_local_sql, inicio_dia_utc, resumen_diario_disponible
+
+DESDE = date(2023, 1, 1)
+HASTA = date(2026, 1, 1)
+
+
+@pytest.mark.parametrize('periodo', ['semana', 'mes', 'anual'])
+def test_resumen_dashboard_usa_una_sola_consulta(db, sentencias, periodo):
+    inicio, fin = _obtener_rango_periodo(periodo, date(2025, 6, 18))
+    # Primera llamada: deja en cache la deteccion de estructuras opcionales.
+    _calcular_resumen_dashboard(db, periodo, 'publicados', inicio, fin)
+    # Tarjetas y serie salen del mismo agregado por bucket. Sin el resumen
+    # diario (04) se suma la verificacion de su existencia, que no se cachea.
+    esperadas = 1 if resumen_diario_disponible(db) else 2
+
+    sentencias.clear()
+    _calcular_resumen_dashboard(db, periodo, 'publicados', inicio, fin)
+
+    assert len(sentencias) == esperadas, sentencias
+
+
+def _conteos_por_tabla(db, granularidad) -> dict:
+    """Un conteo separado por columna, como se calculaba antes del agregado unico."""
+    unidad = UNIDADES_SQL_GRANULARIDAD[granularidad]
+    params = {'inicio': inicio_dia_utc(DESDE), 'fin': inicio_dia_utc(HASTA)}
+    consultas = {
+        'activos': f"""
+            SELECT {fecha_local_sql('c.created_at', unidad)} AS bucket, COUNT(*) AS total
+            FROM conexion_carga.carga c
+            WHERE c.estado = 'publicado' AND c.activo IS TRUE
+              AND c.created_at >= :inicio AND c.created_at < :fin
+              AND {condicion_no_eliminado_sql(db, 'c')}
+            GROUP BY 1
+        """,
+        'inactivos': f"""
+            SELECT {fecha_local_sql('c.created_at', unidad)} AS bucket, COUNT(*) AS total
+            FROM conexion_carga.carga c
+            WHERE c.estado = 'publicado' AND c.activo IS FALSE
+              AND c.created_at >= :inicio AND c.created_at < :fin
+              AND {condicion_no_eliminado_sql(db, 'c')}
+            GROUP BY 1
+        """,
+        'eliminados': f"""
+            SELECT {fecha_local_sql('ce.eliminado_en', unidad)} AS bucket,
+                   COUNT(DISTINCT ce.carga_id) AS total
+            FROM conexion_carga.carga_eliminada ce
+            WHERE ce.eliminado_en >= :inicio AND ce.eliminado_en < :fin
+            GROUP BY 1
+        """,
+    }
+
+    conteos: dict = {}
+    for columna, consulta in consultas.items():
+        for bucket, total in db.execute(text(consulta), params):
+            conteo = conteos.setdefault(bucket, {'activos': 0, 'inactivos': 0, 'eliminados': 0})
+            conteo[columna] = int(total)
+    return conteos
+
+
+@pytest.mark.parametrize('granularidad', ['dia', 'semana', 'mes'])
+def test_conteos_tablas_base_en_una_consulta(db, sentencias, granularidad):
+    esperados = _conteos_por_tabla(db, granularidad)
+
+    sentencias.clear()
+    conteos = _obtener_conteos_tablas_base(db, DESDE, HASTA, granularidad)
+
+    assert len(sentencias) == 1, sentencias
+    assert conteos == esperados
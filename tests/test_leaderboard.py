@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import uuid
+
+from sqlalchemy import text
+
+from app.routers.users import _calcular_leaderboard
+from app.services.cache_resultados import CacheResultados
+from app.services.contadores_referidos import contadores_referidos_disponibles
+
+
+def _crear_usuarios(db, cantidad: int, referidos_por_usuario: int) -> None:
+    """`cantidad` usuarios con `referidos_por_usuario` referidos activos cada uno."""
+    prefijo = uuid.uuid4().hex[:12]
+    db.execute(
+        text(
+            """
+            WITH padres AS (
+                INSERT INTO conexion_carga.users (email, password_hash, first_name, last_name)
+                SELECT 'lb-' || :prefijo || '-' || g || '@prueba.local', 'x', 'Prueba', 'Leaderboard'
+                FROM generate_series(1, :cantidad) g
+                RETURNING id
+            )
+            INSERT INTO conexion_carga.users (
+                email, password_hash, first_name, last_name, referred_by_id
+            )
+            SELECT
+                'lb-' || :prefijo || '-' || p.id || '-' || r || '@prueba.local',
+                'x', 'Prueba', 'Referido', p.id
+            FROM padres p
+            CROSS JOIN generate_series(1, :referidos) r
+            """
+        ),
+        {'prefijo': prefijo, 'cantidad': cantidad, 'referidos': referidos_por_usuario},
+    )
+
+
+def _contar_sentencias_leaderboard(db, sentencias) -> int:
+    sentencias.clear()
+    _calcular_leaderboard(db, None, 0)
+    return len(sentencias)
+
+
+def test_leaderboard_consultas_no_crecen_con_los_datos(db, sentencias):
+    # Sin la columna de contadores (07) se suma su verificacion, que no se cachea.
+    esperadas = 1 if contadores_referidos_disponibles(db) else 2
+
+    _crear_usuarios(db, cantidad=2, referidos_por_usuario=1)
+    con_pocos = _contar_sentencias_leaderboard(db, sentencias)
+
+    _crear_usuarios(db, cantidad=40, referidos_por_usuario=5)
+    con_muchos = _contar_sentencias_leaderboard(db, sentencias)
+
+    assert con_pocos == con_muchos == esperadas
+
+
+def test_leaderboard_cacheado_no_consulta_bd(db, sentencias):
+    cache = CacheResultados('leaderboard-prueba', ttl_segundos=60, stale_segundos=0)
+    clave = ('leaderboard', 100, 0)
+
+    def calcular(sesion):
+        return _calcular_leaderboard(sesion, 100, 0)
+
+    primero, _ = cache.obtener(db, clave, calcular)
+
+    sentencias.clear()
+    segundo, _ = cache.obtener(db, clave, calcular)
+
+    assert sentencias == []
+    assert segundo == primero